@@ -0,0 +1,112 @@
+/*
+ * Клиентские колбэки дашборда (см. dashboard.py).
+ *
+ * summaryStats — сводная статистика по данным из summary-data, без запроса к серверу.
+ * missingSummaryRows — запрашивает у сервера значения стран, которых еще нет в summary-data.
+ * routeTab — переключение вкладок: вкладку, уже показанную при том же выборе
+ *   стран, лет и версии данных, берет из кэша tab-cache, иначе отправляет
+ *   запрос серверу через tab-request.
+ * rememberTab — кладет показанную вкладку в tab-cache, вытесняя давно не показанные.
+ */
+
+function tabKey(tab, countries, years, version) {
+    // Совпадает с ключом dashboard.tab_request
+    const selected = Array.from(new Set(countries || [])).sort();
+    return JSON.stringify([tab, selected, years[0], years[1], version]);
+}
+
+function formatMean(sum, count) {
+    return count ? (sum / count).toFixed(2) : 'nan';
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    dashboard: {
+        summaryStats: function(countries, years, data) {
+            const noUpdate = window.dash_clientside.no_update;
+            const selected = Array.from(new Set(countries || []));
+            // Пока значения новых стран не получены, статистика не пересчитывается
+            if (!data || selected.some(function(name) { return !(name in data.rows); })) {
+                return [noUpdate, noUpdate, noUpdate];
+            }
+            const first = Math.max(years[0], data.year_min) - data.year_min;
+            const last = Math.min(years[1], data.year_max) - data.year_min;
+
+            const means = data.columns.map(function(column, i) {
+                let sum = 0;
+                let count = 0;
+                selected.forEach(function(name) {
+                    if (!data.rows[name]) {
+                        return;
+                    }
+                    const row = data.rows[name][i];
+                    for (let year = first; year <= last; year++) {
+                        if (row[year] !== null) {
+                            sum += row[year];
+                            count++;
+                        }
+                    }
+                });
+                return formatMean(sum, count);
+            });
+
+            return [
+                'Средний процент интернет-пользователей: ' + means[0] + '%',
+                'Среднее количество мобильных подписок: ' + means[1],
+                'Среднее количество широкополосных подписок: ' + means[2]
+            ];
+        },
+
+        missingSummaryRows: function(countries, data) {
+            if (!data) {
+                return window.dash_clientside.no_update;
+            }
+            const missing = Array.from(new Set(countries || [])).filter(function(name) {
+                return !(name in data.rows);
+            });
+            if (!missing.length) {
+                return window.dash_clientside.no_update;
+            }
+            return {entities: missing, year_min: data.year_min, year_max: data.year_max};
+        },
+
+        routeTab: function() {
+            // Входы: клики по вкладкам, data-version; состояния: страны, годы, tab-state, tab-cache
+            const args = Array.prototype.slice.call(arguments);
+            const countries = args[args.length - 4];
+            const years = args[args.length - 3];
+            const tabState = args[args.length - 2];
+            const cache = args[args.length - 1];
+            const version = args[args.length - 5];
+            const noUpdate = window.dash_clientside.no_update;
+
+            let tab = window.dash_clientside.callback_context.triggered_id;
+            if (!tab || tab === 'data-version') {
+                tab = (tabState && tabState.tab) || 'tab-1';
+            }
+            const key = tabKey(tab, countries, years, version);
+            const children = cache && cache.entries && cache.entries[key];
+            if (children) {
+                return [children, {tab: tab, key: key}, noUpdate];
+            }
+            return [noUpdate, noUpdate, {tab: tab, countries: countries, years: years, key: key}];
+        },
+
+        rememberTab: function(children, tabState, cache) {
+            const noUpdate = window.dash_clientside.no_update;
+            // Кэшируются только готовые графики, не индикатор фонового построения
+            if (!cache || !cache.limit || !tabState || !tabState.key || !Array.isArray(children) ||
+                    !children.length || !children[0] || children[0].type !== 'Graph') {
+                return noUpdate;
+            }
+            const key = tabState.key;
+            const entries = Object.assign({}, cache.entries);
+            const order = cache.order.filter(function(item) { return item !== key; });
+            entries[key] = children;
+            order.push(key);
+            while (order.length > cache.limit) {
+                delete entries[order.shift()];
+            }
+            return {limit: cache.limit, order: order, entries: entries};
+        }
+    }
+});
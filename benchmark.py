@@ -0,0 +1,993 @@
+"""
+Этот модуль содержит бенчмарки производительности загрузки данных и дашборда.
+
+Пример запуска:
+    python benchmark.py ingest --scale 1 10 100
+    python benchmark.py filter --scale 10 100 1000
+    python benchmark.py modes --scale 1 10 100
+    python benchmark.py startup --repeat 3
+    python benchmark.py storage --scale 1 10 100
+    python benchmark.py dtypes --scale 1 10 100
+    python benchmark.py session
+    python benchmark.py cube --scale 1 10 100
+    python benchmark.py metrics --scale 1 10 100
+    python benchmark.py search --scale 1 10 100 200
+    python benchmark.py suite --countries 1000 --years 40 --json results.json
+
+Ключ --json записывает результаты любой команды в JSON вместе с коммитом
+и параметрами запуска, чтобы сравнивать их между коммитами.
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+import columnar
+import connector
+import ddl
+import dtypes
+import metrics
+import search
+from cube import PrefixCube
+from store import DuckDBStore, EntityStore
+
+SOURCE_CSV = 'source/Final_cleaned.csv'
+
+def make_scaled_csv(scale, path, source=SOURCE_CSV):
+    """
+    Создает CSV в формате исходного файла, увеличенный в scale раз.
+
+    Копии получают уникальные названия стран, чтобы ключ (Entity, Year)
+    оставался уникальным.
+    """
+    data = pd.read_csv(source)
+    copies = []
+    for i in range(scale):
+        copy = data.copy()
+        if i:
+            copy['Entity'] = copy['Entity'] + f' #{i}'
+        copies.append(copy)
+    pd.concat(copies, ignore_index=True).to_csv(path, index=False)
+    return path
+
+def load_data_rowwise(file_path, db_path):
+    """
+    Прежняя реализация ddl.load_data: pandas, apply и INSERT для каждой строки.
+    Используется только как базовая линия для сравнения.
+    """
+    data = pd.read_csv(file_path)
+    data['Year'] = data['Year'].astype('int64')
+    data['Cellular Subscription'] = data['Cellular Subscription'].astype('float64')
+    data['Internet Users(%)'] = data['Internet Users(%)'].astype('float64')
+    data['No. of Internet Users'] = data['No. of Internet Users'].astype('int64')
+    data['Broadband Subscription'] = data['Broadband Subscription'].astype('float64')
+    data = data.rename(columns=ddl.SOURCE_COLUMNS)[ddl.TABLE_COLUMNS]
+    data['No_of_Internet_Users'] = data['No_of_Internet_Users'].apply(lambda x: min(x, ddl.MAX_INTERNET_USERS))
+
+    conn = duckdb.connect(db_path)
+    for _, row in data.iterrows():
+        try:
+            conn.execute("""
+            INSERT INTO Final_cleaned (Entity, Code, Year, Cellular_Subscription, Internet_Users_Percent, No_of_Internet_Users, Broadband_Subscription)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, row.tolist())
+        except duckdb.ConversionException as e:
+            print(f"Ошибка вставки строки: {row}")
+            print(f"Ошибка: {e}")
+    conn.close()
+
+def _time_load(loader, csv_path, workdir):
+    db_path = os.path.join(workdir, f'bench_{loader.__name__}.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    ddl.create_tables(db_path)
+    started = time.perf_counter()
+    loader(csv_path, db_path)
+    seconds = time.perf_counter() - started
+    conn = duckdb.connect(db_path)
+    rows = conn.execute("SELECT count(*) FROM Final_cleaned").fetchone()[0]
+    conn.close()
+    return rows, seconds
+
+def bench_ingest(scales, baseline_max_rows=100_000):
+    """
+    Сравнивает пропускную способность (строк/с) ddl.load_data
+    и построчной загрузки на данных разного размера.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in scales:
+            csv_path = make_scaled_csv(scale, os.path.join(workdir, f'scaled_{scale}.csv'))
+            rows, seconds = _time_load(ddl.load_data, csv_path, workdir)
+            result = {'scale': scale, 'rows': rows, 'bulk_seconds': seconds,
+                      'bulk_rows_per_sec': rows / seconds}
+            if rows <= baseline_max_rows:
+                _, seconds = _time_load(load_data_rowwise, csv_path, workdir)
+                result['rowwise_seconds'] = seconds
+                result['rowwise_rows_per_sec'] = rows / seconds
+                result['speedup'] = result['rowwise_seconds'] / result['bulk_seconds']
+            results.append(result)
+    return results
+
+def make_scaled_frame(scale, source=SOURCE_CSV):
+    """
+    Возвращает DataFrame в схеме Final_cleaned, увеличенный в scale раз
+    за счет копий стран с новыми названиями.
+    """
+    data = pd.read_csv(source).rename(columns=ddl.SOURCE_COLUMNS)
+    names = data['Entity'].unique()
+    entity = pd.Categorical(data['Entity'], categories=names).codes
+    copy = np.repeat(np.arange(scale), len(data))
+    categories = np.array([name if i == 0 else f'{name} #{i}' for i in range(scale) for name in names], dtype=object)
+    frame = {
+        'Entity': categories[copy * len(names) + np.tile(entity, scale)],
+    }
+    for column in ddl.TABLE_COLUMNS[1:]:
+        frame[column] = np.tile(data[column].to_numpy(), scale)
+    return pd.DataFrame(frame)
+
+def _time_calls(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+def bench_filter(scales, countries=5, year_range=(2000, 2020), repeat=20):
+    """
+    Сравнивает фильтрацию из колбэков дашборда: булева маска по всему
+    DataFrame против выборки срезами из EntityStore.
+    """
+    results = []
+    for scale in scales:
+        df = make_scaled_frame(scale)
+        started = time.perf_counter()
+        store = EntityStore(df)
+        build_seconds = time.perf_counter() - started
+        selected = list(df['Entity'].unique()[::max(1, df['Entity'].nunique() // countries)][:countries])
+
+        def mask():
+            return df[(df['Entity'].isin(selected)) & (df['Year'].between(year_range[0], year_range[1]))]
+
+        def indexed():
+            return store.filter(selected, year_range)
+
+        assert len(mask()) == len(indexed())
+        mask_seconds = _time_calls(mask, repeat)
+        store_seconds = _time_calls(indexed, repeat)
+        results.append({'scale': scale, 'rows': len(df), 'selected_rows': len(indexed()),
+                        'store_build_seconds': build_seconds,
+                        'mask_ms': mask_seconds * 1000, 'store_ms': store_seconds * 1000,
+                        'speedup': mask_seconds / store_seconds})
+    return results
+
+def bench_modes(scales, countries=5, year_range=(2000, 2020), repeat=20):
+    """
+    Сравнивает режимы данных дашборда: EntityStore в памяти воркера
+    и DuckDBStore с фильтрацией и агрегацией в DuckDB.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in scales:
+            df = make_scaled_frame(scale)
+            db_path = os.path.join(workdir, f'modes_{scale}.db')
+            conn = duckdb.connect(db_path)
+            conn.execute("CREATE TABLE Final_cleaned AS SELECT * FROM df")
+            conn.close()
+            selected = list(df['Entity'].unique()[::max(1, df['Entity'].nunique() // countries)][:countries])
+            metrics = ['Internet_Users_Percent', 'Cellular_Subscription', 'Broadband_Subscription']
+            connector.configure(db_path, read_only=True)
+
+            result = {'scale': scale, 'rows': len(df)}
+            stores = {}
+            for mode, factory in (('memory', lambda: EntityStore(df)), ('pushdown', DuckDBStore)):
+                started = time.perf_counter()
+                stores[mode] = factory()
+                result[f'{mode}_startup_seconds'] = time.perf_counter() - started
+            del df
+            for mode, store in stores.items():
+                result[f'{mode}_bytes'] = store.nbytes
+                result[f'{mode}_filter_ms'] = 1000 * _time_calls(
+                    lambda: store.filter(selected, year_range, ['Internet_Users_Percent']), repeat)
+                result[f'{mode}_mean_ms'] = 1000 * _time_calls(
+                    lambda: store.mean(selected, year_range, metrics), repeat)
+                result[f'{mode}_aggregate_ms'] = 1000 * _time_calls(
+                    lambda: store.aggregate(selected, year_range, {'Cellular_Subscription': 'sum'}), repeat)
+            results.append(result)
+            connector.configure()
+    return results
+
+# Замеры запуска выполняются в отдельном процессе, чтобы модули не были уже импортированы
+STARTUP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import dashboard
+imported = time.perf_counter()
+dashboard.warm()
+warmed = time.perf_counter()
+client = dashboard.server.test_client()
+assert client.get('/_dash-layout').status_code == 200
+layout = time.perf_counter()
+dashboard.build_tab_figure('tab-1', ['Afghanistan', 'Albania'], [2000, 2020])
+figure = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - started,
+    'warm_seconds': warmed - imported,
+    'first_layout_seconds': layout - warmed,
+    'first_figure_seconds': figure - layout,
+}))
+"""
+
+def bench_startup(repeat=3):
+    """
+    Измеряет время запуска дашборда: импорт модуля, загрузку данных (warm),
+    первый запрос макета и построение первого графика.
+    """
+    results = []
+    for run in range(repeat):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], capture_output=True,
+                                text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        results.append(dict({'run': run + 1}, **json.loads(output.stdout.strip().splitlines()[-1])))
+    return results
+
+# Загрузка данных в отдельном процессе: время и прирост резидентной памяти,
+# анонимной (своей у каждого воркера) и файловой (общей через страничный кэш)
+STORAGE_SCRIPT = """
+import json, sys, time
+import duckdb, numpy, pandas, pyarrow
+import columnar, ddl
+from store import EntityStore
+
+def rss():
+    fields = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('RssAnon', 'RssFile')):
+                name, value = line.split(':')
+                fields[name] = int(value.split()[0]) * 1024
+    return fields
+
+source, path = sys.argv[1], sys.argv[2]
+before = rss()
+started = time.perf_counter()
+if source == 'csv':
+    store = EntityStore(pandas.read_csv(path).rename(columns=ddl.SOURCE_COLUMNS))
+elif source == 'duckdb':
+    conn = duckdb.connect(path, read_only=True)
+    store = EntityStore(conn.execute('SELECT * FROM Final_cleaned').df())
+    conn.close()
+else:
+    store = EntityStore.from_arrow(columnar.read_table(path))
+seconds = time.perf_counter() - started
+# Обращение ко всем строкам, чтобы страницы файла были прочитаны
+store.mean(store.entity_names(), [store.year_min, store.year_max], list(store.columns)[1:])
+after = rss()
+print(json.dumps({'seconds': seconds,
+                  'rss_anon': after['RssAnon'] - before['RssAnon'],
+                  'rss_file': after['RssFile'] - before['RssFile']}))
+"""
+
+def bench_storage(scales):
+    """
+    Сравнивает загрузку данных в память воркера из CSV, из DuckDB
+    и из отображенного в память файла Arrow (columnar.py): время загрузки
+    и прирост резидентной памяти процесса.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in scales:
+            csv_path = make_scaled_csv(scale, os.path.join(workdir, f'scaled_{scale}.csv'))
+            db_path = os.path.join(workdir, f'storage_{scale}.db')
+            ddl.create_tables(db_path)
+            ddl.load_data(csv_path, db_path)
+            arrow_dir = os.path.join(workdir, f'columnar_{scale}')
+            conn = duckdb.connect(db_path)
+            table = columnar.export_snapshot(conn, arrow_dir)
+            conn.close()
+
+            result = {'scale': scale, 'rows': table.num_rows,
+                      'arrow_file_bytes': os.path.getsize(os.path.join(arrow_dir, columnar.ARROW_FILE))}
+            for source, path in (('csv', csv_path), ('duckdb', db_path), ('arrow', arrow_dir)):
+                output = subprocess.run([sys.executable, '-c', STORAGE_SCRIPT, source, path],
+                                        capture_output=True, text=True, check=True,
+                                        cwd=os.path.dirname(os.path.abspath(__file__)))
+                measured = json.loads(output.stdout.strip().splitlines()[-1])
+                result[f'{source}_seconds'] = measured['seconds']
+                result[f'{source}_rss_anon_bytes'] = measured['rss_anon']
+                result[f'{source}_rss_file_bytes'] = measured['rss_file']
+            results.append(result)
+    return results
+
+def bench_dtypes(scales):
+    """
+    Измеряет объем Final_cleaned, прочитанной из DuckDB, до и после
+    приведения к компактным типам (dtypes.optimize_frame), и объем
+    EntityStore, построенного из каждого варианта.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in scales:
+            csv_path = make_scaled_csv(scale, os.path.join(workdir, f'scaled_{scale}.csv'))
+            db_path = os.path.join(workdir, f'dtypes_{scale}.db')
+            ddl.create_tables(db_path)
+            ddl.load_data(csv_path, db_path)
+            conn = duckdb.connect(db_path)
+            loaded = conn.execute("SELECT * FROM Final_cleaned").df()
+            conn.close()
+
+            started = time.perf_counter()
+            compact = dtypes.optimize_frame(loaded)
+            seconds = time.perf_counter() - started
+            report = dtypes.memory_report(loaded, compact)
+            results.append({
+                'scale': scale,
+                'rows': len(loaded),
+                'frame_before_bytes': report['before_bytes'],
+                'frame_after_bytes': report['after_bytes'],
+                'frame_ratio': report['ratio'],
+                'optimize_seconds': seconds,
+                'store_before_bytes': EntityStore(loaded).nbytes,
+                'store_after_bytes': EntityStore(compact).nbytes,
+            })
+    return results
+
+def bench_cube(scales, countries=(5, 50), year_range=(2000, 2020), repeat=20):
+    """
+    Сравнивает сводную статистику (средние трех показателей) и суммы по
+    странам для вкладки с агрегатами: булева маска по DataFrame, срезы
+    EntityStore и индекс префиксных сумм (cube.py).
+    """
+    summary = ['Internet_Users_Percent', 'Cellular_Subscription', 'Broadband_Subscription']
+    aggregations = {'Cellular_Subscription': 'sum'}
+    results = []
+    for scale in scales:
+        df = make_scaled_frame(scale)
+        store = EntityStore(df)
+        started = time.perf_counter()
+        cube = PrefixCube(store.entities, store._entity_codes, store.years,
+                          {column: store.columns[column] for column in summary}, store.year_min, store.year_max)
+        build_seconds = time.perf_counter() - started
+        for count in countries:
+            selected = list(df['Entity'].unique()[::max(1, df['Entity'].nunique() // count)][:count])
+
+            def mask_mean():
+                rows = df[(df['Entity'].isin(selected)) & (df['Year'].between(year_range[0], year_range[1]))]
+                return rows[summary].mean()
+
+            def mask_sum():
+                rows = df[(df['Entity'].isin(selected)) & (df['Year'].between(year_range[0], year_range[1]))]
+                return rows.groupby('Entity', as_index=False).agg(aggregations)
+
+            assert np.allclose(mask_mean().to_numpy(), list(cube.mean(selected, year_range, summary).values()))
+            assert np.allclose(mask_sum()['Cellular_Subscription'],
+                               cube.aggregate(selected, year_range, aggregations)['Cellular_Subscription'])
+            timings = {
+                'mask_mean_ms': _time_calls(mask_mean, repeat),
+                'store_mean_ms': _time_calls(lambda: store.mean(selected, year_range, summary), repeat),
+                'cube_mean_ms': _time_calls(lambda: cube.mean(selected, year_range, summary), repeat),
+                'mask_sum_ms': _time_calls(mask_sum, repeat),
+                'store_sum_ms': _time_calls(lambda: store.aggregate(selected, year_range, aggregations), repeat),
+                'cube_sum_ms': _time_calls(lambda: cube.aggregate(selected, year_range, aggregations), repeat),
+            }
+            result = {'scale': scale, 'rows': len(df), 'countries': count,
+                      'cube_build_seconds': build_seconds, 'cube_bytes': cube.nbytes}
+            result.update({name: seconds * 1000 for name, seconds in timings.items()})
+            result['mean_speedup'] = timings['mask_mean_ms'] / timings['cube_mean_ms']
+            result['sum_speedup'] = timings['mask_sum_ms'] / timings['cube_sum_ms']
+            results.append(result)
+    return results
+
+def metrics_per_entity(df):
+    """
+    Прирост к предыдущему году и CAGR числа пользователей циклом по странам,
+    как строились графики до metrics.py (для сравнения в bench_metrics).
+    """
+    parts = []
+    for _, rows in df.groupby('Entity', observed=True, sort=True):
+        rows = rows.sort_values('Year').set_index('Year')
+        users = rows['No_of_Internet_Users'].astype(float).reindex(
+            range(rows.index.min(), rows.index.max() + 1))
+        previous = users.shift(1)
+        base = users.shift(metrics.CAGR_YEARS)
+        growth = ((users - previous) * 100 / previous).where(previous > 0)
+        cagr = ((users / base) ** (1 / metrics.CAGR_YEARS) - 1).where(base > 0) * 100
+        parts.append(pd.DataFrame({'Users_Growth_YoY': growth, 'Users_CAGR': cagr}).loc[rows.index])
+    return pd.concat(parts)
+
+def bench_metrics(scales, baseline_max_rows=1_000_000):
+    """
+    Измеряет расчет производных показателей (metrics.compute_metrics) по всем
+    странам и сравнивает его с расчетом двух из них циклом по странам.
+    """
+    results = []
+    for scale in scales:
+        df = make_scaled_frame(scale)
+        # Как при загрузке в базу (ddl.load_data), число пользователей ограничено сверху
+        df['No_of_Internet_Users'] = df['No_of_Internet_Users'].clip(upper=ddl.MAX_INTERNET_USERS)
+        df = dtypes.optimize_frame(df)
+        started = time.perf_counter()
+        derived = metrics.compute_metrics(df)
+        seconds = time.perf_counter() - started
+        result = {'scale': scale, 'rows': len(df), 'entities': df['Entity'].nunique(),
+                  'vectorized_seconds': seconds, 'rows_per_sec': len(df) / seconds}
+        if len(df) <= baseline_max_rows:
+            started = time.perf_counter()
+            baseline = metrics_per_entity(df)
+            result['per_entity_seconds'] = time.perf_counter() - started
+            result['speedup'] = result['per_entity_seconds'] / seconds
+            assert np.allclose(baseline['Users_CAGR'].to_numpy(dtype=float),
+                               derived['Users_CAGR'].to_numpy(dtype=float), rtol=1e-4, equal_nan=True)
+        results.append(result)
+    return results
+
+# Запросы поиска стран: начала названий и слов, коды, опечатки
+SEARCH_QUERIES = ['a', 'un', 'united', 'korea', 'usa', 'rus', 'afganistan', "cote d", 'saint #1', 'germny #12']
+
+def bench_search(scales, limit=search.DEFAULT_LIMIT, repeat=200):
+    """
+    Сравнивает выпадающий список стран со всеми вариантами (объем макета
+    и фильтрация подстрокой по всему списку, как в браузере) с поиском
+    по индексу search.py, возвращающим limit лучших совпадений.
+    """
+    results = []
+    for scale in scales:
+        df = make_scaled_frame(scale)
+        store = EntityStore(df)
+        summary = store.entity_summary()
+        started = time.perf_counter()
+        index = search.SearchIndex.from_summary(summary)
+        build_seconds = time.perf_counter() - started
+        labels = store.entity_names()
+        options = [{'label': name, 'value': name} for name in labels]
+
+        def substring(query):
+            return [name for name in labels if query.lower() in name.lower()]
+
+        for query in SEARCH_QUERIES:
+            results.append({
+                'scale': scale,
+                'entities': len(index),
+                'query': query,
+                'build_seconds': build_seconds,
+                'all_options_bytes': len(json.dumps(options, ensure_ascii=False)),
+                'top_options_bytes': len(json.dumps([{'label': name, 'value': name}
+                                                     for name in index.search(query, limit)], ensure_ascii=False)),
+                'substring_matches': len(substring(query)),
+                'substring_ms': _time_calls(lambda: substring(query), max(1, repeat // 20)) * 1000,
+                'index_ms': _time_calls(lambda: index.search(query, limit), repeat) * 1000,
+                'top': ', '.join(index.search(query, 3)),
+            })
+    return results
+
+# Сценарий работы пользователя с дашбордом в отдельном процессе: события
+# отправляются на сервер теми же запросами, что и из браузера. Решение
+# браузера (посчитать сводку у себя, взять вкладку из кэша) повторяет
+# логику assets/dashboard.js
+SESSION_SCRIPT = """
+import json, os, time
+from collections import OrderedDict
+import dashboard
+
+client = dashboard.server.test_client()
+client.get('/')
+store, version = dashboard.get_snapshot()
+clientside = dashboard.CLIENTSIDE_SUMMARY
+limit = dashboard.CLIENT_TAB_CACHE_ENTRIES
+tab_cache = OrderedDict()
+countries, years, tab = list(dashboard.DEFAULT_COUNTRIES), [dashboard.DEFAULT_START_YEAR, store.year_max], 'tab-1'
+# Страны, значения которых браузер уже получил вместе с макетом или запросом
+summary_rows = set(countries)
+summary_output = next((d['output'] for d in client.get('/_dash-dependencies').get_json()
+                       if d['output'].startswith('summary-data.data@')), None)
+seconds = 0.0
+response_bytes = 0
+
+def post(output, outputs, inputs, state=()):
+    global seconds, response_bytes
+    body = {'output': output,
+            'outputs': [{'id': i, 'property': p} for i, p in outputs],
+            'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in inputs],
+            'state': [{'id': i, 'property': p, 'value': v} for i, p, v in state],
+            'changedPropIds': [f'{inputs[0][0]}.{inputs[0][1]}']}
+    started = time.perf_counter()
+    response = client.post('/_dash-update-component', json=body)
+    seconds += time.perf_counter() - started
+    response_bytes += len(response.data)
+
+def summary():
+    missing = sorted(set(countries) - summary_rows)
+    if clientside and missing:
+        post(summary_output, [('summary-data', summary_output.split('.', 1)[1])],
+             [('summary-request', 'data', {'entities': missing, 'year_min': store.year_min,
+                                           'year_max': store.year_max})])
+        summary_rows.update(missing)
+    if not clientside:
+        post('..summary-internet.children...summary-mobile.children...summary-broadband.children..',
+             [('summary-internet', 'children'), ('summary-mobile', 'children'), ('summary-broadband', 'children')],
+             [('country-dropdown', 'value', countries), ('year-slider', 'value', years), ('data-version', 'data', version)])
+
+def show_tab():
+    request = dashboard.tab_request(tab, countries, years, version)
+    if limit and request['key'] in tab_cache:
+        tab_cache.move_to_end(request['key'])
+        return
+    post('..tab-content.children...tab-state.data...heavy-request.data..',
+         [('tab-content', 'children'), ('tab-state', 'data'), ('heavy-request', 'data')],
+         [('tab-request', 'data', request)], [('tab-state', 'data', None)])
+    if limit:
+        tab_cache[request['key']] = True
+        while len(tab_cache) > limit:
+            tab_cache.popitem(last=False)
+
+# Открытие страницы
+summary()
+show_tab()
+# Выбор стран и перемещение ползунка лет
+for country in ['Albania', 'Brazil', 'India', 'Norway']:
+    countries.append(country)
+    summary()
+for start in range(1990, 2010):
+    years = [start, store.year_max]
+    summary()
+# Просмотр вкладок и возврат к уже открытым
+for tab in list(dashboard.tabs.TABS) * 2:
+    show_tab()
+years = [2005, store.year_max]
+summary()
+for tab in ['tab-1', 'tab-5', 'tab-7'] * 3:
+    show_tab()
+
+print(json.dumps({'requests': sum(client.get('/callback-stats').get_json().values()),
+                  'server_seconds': seconds, 'response_bytes': response_bytes,
+                  'layout_bytes': len(client.get('/_dash-layout').data)}))
+"""
+
+def bench_session():
+    """
+    Считает запросы колбэков к серверу за один сценарий работы пользователя
+    при расчетах на сервере и в браузере (сводная статистика и кэш вкладок,
+    см. assets/dashboard.js).
+    """
+    results = []
+    modes = (('server', {'CLIENTSIDE_SUMMARY': '0', 'CLIENT_TAB_CACHE_ENTRIES': '0'}),
+             ('clientside', {'CLIENTSIDE_SUMMARY': '1'}))
+    for mode, env in modes:
+        output = subprocess.run([sys.executable, '-c', SESSION_SCRIPT], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), env=dict(os.environ, **env))
+        results.append(dict({'mode': mode}, **json.loads(output.stdout.strip().splitlines()[-1])))
+    return results
+
+def make_synthetic_csv(path, countries, years, start_year=1980, missing=0.0, seed=0, source=SOURCE_CSV):
+    """
+    Создает CSV в формате исходного файла с синтетическими данными:
+    countries стран × years лет. Показатели растут по логистическим кривым
+    со случайными параметрами стран, доля missing значений пропущена.
+    Названия стран берутся из исходного файла (с номером копии, если стран
+    больше), чтобы карта находила страны по названию.
+
+    Returns:
+        str: Путь к созданному файлу.
+    """
+    rng = np.random.default_rng(seed)
+    names = pd.read_csv(source, usecols=['Entity', 'Code']).drop_duplicates('Entity')
+    copy, index = np.divmod(np.arange(countries), len(names))
+    entities = np.array([name if i == 0 else f'{name} #{i}'
+                         for name, i in zip(names['Entity'].to_numpy()[index], copy)], dtype=object)
+    codes = names['Code'].to_numpy()[index]
+
+    year = np.tile(np.arange(start_year, start_year + years), countries)
+    entity = np.repeat(np.arange(countries), years)
+
+    def curve(ceiling, spread):
+        midpoint = rng.normal(start_year + years * 0.6, years * spread, countries)[entity]
+        rate = rng.uniform(0.15, 0.5, countries)[entity]
+        values = ceiling * rng.uniform(0.6, 1.0, countries)[entity] / (1 + np.exp(-rate * (year - midpoint)))
+        return np.round(values + rng.normal(0, ceiling * 0.005, len(year)).clip(0), 4)
+
+    internet = curve(100, 0.15).clip(0, 100)
+    population = rng.lognormal(15, 2, countries).clip(1e4, 1.5e9)[entity]
+    frame = pd.DataFrame({
+        'Entity': entities[entity],
+        'Code': codes[entity],
+        'Year': year,
+        'Cellular Subscription': curve(130, 0.1),
+        'Internet Users(%)': internet,
+        'No. of Internet Users': np.round(internet / 100 * population).astype(np.int64),
+        'Broadband Subscription': curve(40, 0.12),
+    })
+    if missing:
+        for column in ['Cellular Subscription', 'Internet Users(%)', 'No. of Internet Users', 'Broadband Subscription']:
+            frame[column] = frame[column].mask(rng.random(len(frame)) < missing)
+    frame.to_csv(path, index=False)
+    return path
+
+# Замеры геттеров etl и колбэков дашборда в отдельном процессе, запущенном
+# в каталоге с базой: dashboard открывает my.db из текущего каталога
+SUITE_SCRIPT = """
+import json, os, sys, time
+import numpy as np
+
+sys.path.insert(0, sys.argv[1])
+countries_count, repeat = int(sys.argv[2]), int(sys.argv[3])
+import dashboard, etl, tabs
+
+started = time.perf_counter()
+dashboard.warm()
+warm_seconds = time.perf_counter() - started
+store, version = dashboard.get_snapshot()
+names = store.entity_names()
+selected = names[::max(1, len(names) // countries_count)][:countries_count]
+first, last = store.year_min, store.year_max
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+def summary(times):
+    times = np.array(times) * 1000
+    return {'median_ms': float(np.median(times)), 'min_ms': float(times.min()), 'max_ms': float(times.max())}
+
+results = {'warm_seconds': warm_seconds, 'rows': len(store), 'entities': len(names),
+           'selected_countries': len(selected), 'getters': {}, 'callbacks': {}}
+
+getters = {
+    'get_digital_divide_data': lambda: etl.get_digital_divide_data(selected, [first, last]),
+    'get_internet_growth_data': lambda: etl.get_internet_growth_data(selected, [first, last]),
+    'get_mobile_vs_broadband_data': lambda: etl.get_mobile_vs_broadband_data(selected, [first, last]),
+    'get_final_cleaned_data': lambda: etl.get_final_cleaned_data(selected, [first, last]),
+    'get_derived_metrics': lambda: etl.get_derived_metrics(selected, [first, last]),
+    'get_telecom_trends_data': etl.get_telecom_trends_data,
+}
+for name, getter in getters.items():
+    results['getters'][name] = summary([timed(getter) for _ in range(repeat)])
+
+# Каждый повтор берет новый диапазон лет, чтобы не попадать в кэш графиков;
+# warm — повтор того же запроса из кэша
+def ranges():
+    return [[first + i % max(1, last - first), last] for i in range(repeat)]
+
+results['callbacks']['update_summary_stats'] = dict(
+    summary([timed(lambda: dashboard.update_summary_stats(selected, years)) for years in ranges()]),
+    warm_ms=timed(lambda: dashboard.update_summary_stats(selected, [first, last])) * 1000)
+available = [tab for tab, spec in tabs.TABS.items() if spec.available]
+for tab in available:
+    cold = [timed(lambda: dashboard.update_content({'tab': tab, 'countries': selected, 'years': years}, None))
+            for years in ranges()]
+    results['callbacks'][tab] = dict(summary(cold), warm_ms=timed(
+        lambda: dashboard.update_content({'tab': tab, 'countries': selected, 'years': ranges()[-1]}, None)) * 1000)
+results['available_tabs'] = available
+results['year_range'] = [first, last]
+results['countries'] = selected
+print(json.dumps(results))
+"""
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _callback_body(output_ids, inputs, state=()):
+    return {
+        'output': '..' + '...'.join(output_ids) + '..',
+        'outputs': [dict(zip(('id', 'property'), output.split('.'))) for output in output_ids],
+        'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in inputs],
+        'state': [{'id': i, 'property': p, 'value': v} for i, p, v in state],
+        'changedPropIds': [f'{inputs[0][0]}.{inputs[0][1]}'],
+    }
+
+def load_requests(tabs_available, countries, year_range):
+    """
+    Запросы колбэков для нагрузочного теста: вкладки со всеми годами
+    и с половиной диапазона, сводная статистика.
+    """
+    bodies = []
+    middle = (year_range[0] + year_range[1]) // 2
+    for years in ([year_range[0], year_range[1]], [middle, year_range[1]]):
+        for tab in tabs_available:
+            request = {'tab': tab, 'countries': countries, 'years': years}
+            bodies.append(_callback_body(['tab-content.children', 'tab-state.data', 'heavy-request.data'],
+                                         [('tab-request', 'data', request)], [('tab-state', 'data', None)]))
+        bodies.append(_callback_body(
+            ['summary-internet.children', 'summary-mobile.children', 'summary-broadband.children'],
+            [('country-dropdown', 'value', countries), ('year-slider', 'value', years), ('data-version', 'data', None)]))
+    return [json.dumps(body).encode('utf-8') for body in bodies]
+
+def http_load(url, bodies, concurrency, duration):
+    """
+    Отправляет запросы колбэков из concurrency потоков в течение duration секунд.
+
+    Returns:
+        dict: Число запросов и ошибок, пропускная способность и перцентили задержки.
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        done, failed = [], 0
+        i = offset
+        while time.perf_counter() < deadline:
+            request = urllib.request.Request(f'{url}/_dash-update-component', data=bodies[i % len(bodies)],
+                                             headers={'Content-Type': 'application/json'})
+            i += 1
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                done.append(time.perf_counter() - started)
+            except OSError:
+                failed += 1
+        with lock:
+            latencies.extend(done)
+            errors.append(failed)
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    times = np.array(latencies) * 1000 if latencies else np.array([np.nan])
+    return {'requests': len(latencies), 'errors': sum(errors), 'throughput_rps': len(latencies) / elapsed,
+            'p50_ms': float(np.percentile(times, 50)), 'p90_ms': float(np.percentile(times, 90)),
+            'p99_ms': float(np.percentile(times, 99)), 'max_ms': float(np.max(times))}
+
+def _smaps(pid):
+    # Пропорциональная (PSS) и собственная память процесса, байт
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(('Pss:', 'Private_Clean:', 'Private_Dirty:')):
+                name, value = line.split(':')
+                fields[name] = int(value.split()[0]) * 1024
+    return {'pss': fields['Pss'], 'private': fields['Private_Clean'] + fields['Private_Dirty']}
+
+def gunicorn_memory(pid):
+    """
+    Память мастера gunicorn и его воркеров (Linux): суммарный PSS — сколько
+    занимает весь сервер с учетом общих страниц, и собственная память воркеров.
+    """
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        children = [int(child) for child in f.read().split()]
+    master = _smaps(pid)
+    workers = [_smaps(child) for child in children]
+    return {'pss_mb': (master['pss'] + sum(worker['pss'] for worker in workers)) / 2**20,
+            'worker_private_mb': sum(worker['private'] for worker in workers) / 2**20}
+
+def run_gunicorn_load(workdir, bodies, workers, threads, concurrency, duration, env):
+    """
+    Запускает дашборд под gunicorn с настройками gunicorn.conf.py и заданным
+    числом воркеров и потоков в каталоге workdir, измеряет задержку запросов
+    и память сервера после нагрузки.
+    """
+    repo = os.path.dirname(os.path.abspath(__file__))
+    port = _free_port()
+    url = f'http://127.0.0.1:{port}'
+    command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(repo, 'gunicorn.conf.py'),
+               '--pythonpath', repo, '-w', str(workers), '--threads', str(threads),
+               '-b', f'127.0.0.1:{port}', 'dashboard:server']
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.perf_counter() + 120
+        while True:
+            try:
+                with urllib.request.urlopen(f'{url}/ready', timeout=5) as response:
+                    response.read()
+                break
+            except OSError:
+                if process.poll() is not None or time.perf_counter() > deadline:
+                    raise RuntimeError(f"gunicorn did not start (workers={workers}, threads={threads})")
+                time.sleep(0.2)
+        # Прогрев: первый запрос каждого вида строит графики и заполняет кэш
+        for body in bodies:
+            urllib.request.urlopen(urllib.request.Request(
+                f'{url}/_dash-update-component', data=body, headers={'Content-Type': 'application/json'}),
+                timeout=120).read()
+        result = {'storage': env.get('STORAGE_FORMAT', 'arrow'), 'workers': workers, 'threads': threads,
+                  'concurrency': concurrency}
+        result.update(http_load(url, bodies, concurrency, duration))
+        result.update(gunicorn_memory(process.pid))
+        return result
+    finally:
+        process.terminate()
+        process.wait()
+
+def bench_suite(countries=1000, years=40, missing=0.05, selected=5, repeat=5,
+                grid=((1, 2), (2, 2), (2, 4)), concurrency=8, duration=10.0, storage=('arrow',)):
+    """
+    Полный прогон на синтетических данных: генерация, публикация снимка базы
+    (ddl.publish_snapshot), геттеры etl и колбэки дашборда, нагрузочный тест
+    под gunicorn для каждой пары (воркеры, потоки) из grid и каждого
+    источника данных воркеров из storage ('arrow', 'duckdb').
+    """
+    repo = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as workdir:
+        started = time.perf_counter()
+        csv_path = make_synthetic_csv(os.path.join(workdir, 'synthetic.csv'), countries, years, missing=missing)
+        generate_seconds = time.perf_counter() - started
+        csv_bytes = os.path.getsize(csv_path)
+        db_path = os.path.join(workdir, 'my.db')
+        started = time.perf_counter()
+        # Вместе с базой записывается колоночная копия версии для STORAGE_FORMAT=arrow
+        report = ddl.publish_snapshot(csv_path, db_path, full=True)
+        load_seconds = time.perf_counter() - started
+        conn = duckdb.connect(db_path, read_only=True)
+        loaded_rows = conn.execute("SELECT count(*) FROM Final_cleaned").fetchone()[0]
+        conn.close()
+
+        # Фоновые колбэки выключены, чтобы тяжелые вкладки отвечали графиком;
+        # сводная статистика считается на сервере, чтобы ее можно было замерить
+        env = dict(os.environ, BACKGROUND_CALLBACKS='0', CLIENTSIDE_SUMMARY='0')
+        output = subprocess.run([sys.executable, '-c', SUITE_SCRIPT, repo, str(selected), str(repeat)],
+                                capture_output=True, text=True, check=True, cwd=workdir, env=env)
+        callbacks = json.loads(output.stdout.strip().splitlines()[-1])
+
+        bodies = load_requests(callbacks['available_tabs'], callbacks['countries'], callbacks['year_range'])
+        # Воркеры не перезапускаются по max_requests во время теста: перезапуск
+        # дает выбросы задержки, а замер памяти может не застать воркер
+        load_env = dict(env, GUNICORN_MAX_REQUESTS=os.environ.get('GUNICORN_MAX_REQUESTS', '0'))
+        load_test = [run_gunicorn_load(workdir, bodies, workers, threads, concurrency, duration,
+                                       dict(load_env, STORAGE_FORMAT=source))
+                     for source in storage for workers, threads in grid]
+    return {
+        'dataset': {'countries': countries, 'years': years, 'missing': missing, 'generated_rows': countries * years,
+                    'generate_seconds': generate_seconds, 'csv_bytes': csv_bytes},
+        'loaded_rows': loaded_rows,
+        'rejected_rows': report['rejected'],
+        'load_seconds': load_seconds,
+        'load_rows_per_sec': loaded_rows / load_seconds,
+        'dashboard': callbacks,
+        'load_test': load_test,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_json(path, command, params, results):
+    """
+    Записывает результаты в JSON вместе с коммитом, версией Python и параметрами запуска.
+    """
+    document = {
+        'command': command,
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': params,
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, ensure_ascii=False, default=float)
+
+def _grid(value):
+    workers, threads = value.lower().split('x')
+    return int(workers), int(threads)
+
+def print_suite(results):
+    dataset = results['dataset']
+    print(f"Данные: {dataset['countries']} стран × {dataset['years']} лет ({dataset['generated_rows']} строк), "
+          f"загружено {results['loaded_rows']}, отклонено {results['rejected_rows']}, "
+          f"ddl.publish_snapshot: {results['load_seconds']:.2f} с")
+    dashboard = results['dashboard']
+    print(pd.DataFrame(dashboard['getters']).T.to_string())
+    print(pd.DataFrame(dashboard['callbacks']).T.to_string())
+    print(pd.DataFrame(results['load_test']).to_string(index=False))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    # Общий для всех команд ключ записи результатов
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument('--json', metavar='PATH', help='Записать результаты в JSON')
+
+    def add_command(name, help_text):
+        return commands.add_parser(name, help=help_text, parents=[output])
+
+    ingest = add_command('ingest', 'Загрузка CSV в DuckDB')
+    ingest.add_argument('--scale', type=int, nargs='+', default=[1, 10, 100])
+    ingest.add_argument('--baseline-max-rows', type=int, default=100_000,
+                        help='Не запускать построчную загрузку на данных большего размера')
+
+    filtering = add_command('filter', 'Фильтрация по странам и годам в колбэках')
+    filtering.add_argument('--scale', type=int, nargs='+', default=[10, 100, 1000])
+    filtering.add_argument('--countries', type=int, default=5)
+
+    modes = add_command('modes', 'Режимы данных memory и pushdown')
+    modes.add_argument('--scale', type=int, nargs='+', default=[1, 10, 100])
+    modes.add_argument('--countries', type=int, default=5)
+
+    startup = add_command('startup', 'Время запуска дашборда')
+    startup.add_argument('--repeat', type=int, default=3)
+
+    storage = add_command('storage', 'Загрузка данных из CSV, DuckDB и Arrow')
+    storage.add_argument('--scale', type=int, nargs='+', default=[1, 10, 100])
+
+    dtype_parser = add_command('dtypes', 'Объем данных до и после приведения типов')
+    dtype_parser.add_argument('--scale', type=int, nargs='+', default=[1, 10, 100])
+
+    cube_parser = add_command('cube', 'Средние и суммы по диапазону лет: маска, срезы и префиксные суммы')
+    cube_parser.add_argument('--scale', type=int, nargs='+', default=[1, 10, 100])
+
+    metrics_parser = add_command('metrics', 'Расчет производных показателей по всем странам')
+    metrics_parser.add_argument('--scale', type=int, nargs='+', default=[1, 10, 100])
+
+    search_parser = add_command('search', 'Поиск стран: весь список в браузере и индекс на сервере')
+    search_parser.add_argument('--scale', type=int, nargs='+', default=[1, 10, 100, 200])
+
+    add_command('session', 'Запросы к серверу за сценарий работы пользователя')
+
+    suite = add_command('suite', 'Синтетические данные: загрузка, геттеры etl, колбэки и нагрузка под gunicorn')
+    suite.add_argument('--countries', type=int, default=1000)
+    suite.add_argument('--years', type=int, default=40)
+    suite.add_argument('--missing', type=float, default=0.05, help='Доля пропущенных значений показателей')
+    suite.add_argument('--selected', type=int, default=5, help='Сколько стран выбрано в колбэках')
+    suite.add_argument('--repeat', type=int, default=5)
+    suite.add_argument('--grid', type=_grid, nargs='+', default=[(1, 2), (2, 2), (2, 4)],
+                       help='Воркеры и потоки gunicorn, например 1x2 2x4')
+    suite.add_argument('--concurrency', type=int, default=8, help='Одновременных клиентов нагрузочного теста')
+    suite.add_argument('--duration', type=float, default=10.0, help='Длительность нагрузки на каждую настройку, с')
+    suite.add_argument('--storage', nargs='+', choices=['arrow', 'duckdb'], default=['arrow'],
+                       help='Источник данных воркеров (STORAGE_FORMAT)')
+
+    args = parser.parse_args()
+    if args.command == 'ingest':
+        results = bench_ingest(args.scale, args.baseline_max_rows)
+        print(pd.DataFrame(results).to_string(index=False))
+    elif args.command == 'filter':
+        results = bench_filter(args.scale, args.countries)
+        print(pd.DataFrame(results).to_string(index=False))
+    elif args.command == 'modes':
+        results = bench_modes(args.scale, args.countries)
+        print(pd.DataFrame(results).T.to_string(header=False))
+    elif args.command == 'startup':
+        results = bench_startup(args.repeat)
+        print(pd.DataFrame(results).to_string(index=False))
+    elif args.command == 'storage':
+        results = bench_storage(args.scale)
+        print(pd.DataFrame(results).T.to_string(header=False))
+    elif args.command == 'dtypes':
+        results = bench_dtypes(args.scale)
+        print(pd.DataFrame(results).to_string(index=False))
+    elif args.command == 'cube':
+        results = bench_cube(args.scale)
+        print(pd.DataFrame(results).T.to_string(header=False))
+    elif args.command == 'metrics':
+        results = bench_metrics(args.scale)
+        print(pd.DataFrame(results).to_string(index=False))
+    elif args.command == 'search':
+        results = bench_search(args.scale)
+        print(pd.DataFrame(results).to_string(index=False))
+    elif args.command == 'session':
+        results = bench_session()
+        print(pd.DataFrame(results).to_string(index=False))
+    elif args.command == 'suite':
+        results = bench_suite(args.countries, args.years, args.missing, args.selected, args.repeat,
+                              args.grid, args.concurrency, args.duration, args.storage)
+        print_suite(results)
+
+    if args.json:
+        params = {name: value for name, value in vars(args).items() if name not in ('command', 'json')}
+        write_json(args.json, args.command, params, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Этот модуль содержит кэш построенных графиков и сводной статистики дашборда.
+
+Ключ нормализуется (отсортированный список стран, диапазон лет в границах
+данных, вкладка) и включает версию данных, поэтому после загрузки новых
+данных старые записи больше не используются. Основной уровень — LRU в памяти
+процесса с ограничением по числу записей и объему; дополнительно можно
+включить общий для всех воркеров дисковый уровень (пакет diskcache).
+"""
+
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+try:
+    import diskcache
+except ImportError:  # дисковый уровень необязателен
+    diskcache = None
+
+# Настройки по умолчанию, переопределяются переменными окружения
+MAX_ENTRIES = int(os.environ.get('FIGURE_CACHE_ENTRIES', 256))
+MAX_BYTES = int(os.environ.get('FIGURE_CACHE_BYTES', 256 * 1024 * 1024))
+CACHE_DIR = os.environ.get('FIGURE_CACHE_DIR')
+
+def make_key(kind, countries, year_range, year_bounds=None):
+    """
+    Строит нормализованный ключ кэша.
+
+    Args:
+        kind (str): Что кэшируется, например 'tab-1' или 'summary'.
+        countries (list): Выбранные страны в любом порядке.
+        year_range (list): Диапазон лет [начало, конец].
+        year_bounds (tuple): Минимальный и максимальный год в данных.
+
+    Returns:
+        tuple: Ключ (kind, страны, начало, конец).
+    """
+    start, end = int(year_range[0]), int(year_range[1])
+    if year_bounds is not None:
+        start = max(start, year_bounds[0])
+        end = min(end, year_bounds[1])
+    return (kind, tuple(sorted(set(countries or []))), start, end)
+
+class FigureCache:
+    """
+    LRU-кэш с ограничением по числу записей и объему в байтах.
+
+    Args:
+        max_entries (int): Максимальное число записей в памяти.
+        max_bytes (int): Максимальный суммарный объем записей в памяти.
+        directory (str): Каталог общего дискового кэша; None — только память.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, directory=CACHE_DIR):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.version = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Ключ -> [блокировка, число ожидающих] для вычислений в get_or_compute
+        self._inflight = {}
+        self._disk = diskcache.Cache(directory, size_limit=max_bytes) if directory and diskcache else None
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def set_version(self, version):
+        """
+        Задает версию данных. При смене версии записи в памяти удаляются.
+        """
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self._bytes = 0
+                self.version = version
+
+    def get(self, key, version=None):
+        """
+        Возвращает значение по ключу или None.
+
+        Args:
+            key (tuple): Ключ из make_key.
+            version: Версия данных, из которых построено значение;
+                None — текущая версия кэша.
+        """
+        full_key = (self.version if version is None else version, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is not None:
+                self._entries.move_to_end(full_key)
+                self._stats['hits'] += 1
+                return entry[0]
+        if self._disk is not None:
+            payload = self._disk.get(repr(full_key))
+            if payload is not None:
+                value = pickle.loads(payload)
+                self._store(full_key, value, len(payload))
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                return value
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, key, value, version=None):
+        """
+        Сохраняет значение, вытесняя давно не использованные записи.
+        """
+        full_key = (self.version if version is None else version, key)
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._store(full_key, value, len(payload))
+        if self._disk is not None:
+            self._disk.set(repr(full_key), payload)
+
+    def _store(self, full_key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(full_key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[full_key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats['evictions'] += 1
+
+    def get_or_compute(self, key, compute, version=None):
+        """
+        Возвращает значение из кэша или вычисляет и сохраняет его.
+        Одновременные запросы с одинаковым ключом выполняют вычисление
+        один раз: остальные потоки ждут и получают его результат.
+        """
+        value = self.get(key, version)
+        if value is not None:
+            return value
+        full_key = (self.version if version is None else version, key)
+        with self._lock:
+            inflight = self._inflight.setdefault(full_key, [threading.Lock(), 0])
+            inflight[1] += 1
+        try:
+            with inflight[0]:
+                with self._lock:
+                    entry = self._entries.get(full_key)
+                if entry is not None:
+                    return entry[0]
+                value = compute()
+                self.set(key, value, version)
+                return value
+        finally:
+            with self._lock:
+                inflight[1] -= 1
+                if not inflight[1]:
+                    del self._inflight[full_key]
+
+    def stats(self):
+        """
+        Возвращает счетчики попаданий и промахов, число записей и объем.
+        """
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['disk_hits'] + self._stats['misses']
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_entries=self.max_entries,
+                max_bytes=self.max_bytes,
+                hit_rate=(lookups - self._stats['misses']) / lookups if lookups else 0.0,
+                disk=self._disk is not None,
+                version=self.version,
+            )
@@ -0,0 +1,169 @@
+"""
+Этот модуль содержит колоночное хранилище снимков таблицы Final_cleaned.
+
+При публикации снимка базы (ddl.publish_snapshot) данные выгружаются
+в каталог версии данных рядом с базой (my.db.columnar/v<версия>/):
+- final_cleaned.arrow — несжатый файл Arrow IPC из одного пакета строк,
+  упорядоченных по (Entity, Year). Файл отображается в память (mmap),
+  и числовые массивы читаются без копирования, поэтому воркеры gunicorn
+  делят одну копию данных в страничном кэше ОС вместо собственного
+  DataFrame в каждом процессе;
+- parquet/Year=<год>/ — набор Parquet, разбитый по годам: при чтении
+  выборки файлы лишних лет не открываются.
+
+Entity и Code хранятся со словарным кодированием, Year — int16,
+показатели — float32, No_of_Internet_Users — int32 (значения ограничены
+при загрузке, см. ddl.MAX_INTERNET_USERS). Пропуски в вещественных
+столбцах записываются как NaN: у массива без битовой маски пропусков
+NumPy-представление не требует копирования.
+
+Пример запуска (выгрузить текущую версию базы):
+    python columnar.py --db my.db
+"""
+
+import argparse
+import os
+import shutil
+
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+# Путь к базе данных
+DB_PATH = 'my.db'
+
+ARROW_FILE = 'final_cleaned.arrow'
+PARQUET_DIR = 'parquet'
+
+# Типы столбцов в колоночном хранилище; прочие столбцы сохраняются как есть
+SCHEMA = pa.schema([
+    ('Entity', pa.dictionary(pa.int32(), pa.string())),
+    ('Code', pa.dictionary(pa.int32(), pa.string())),
+    ('Year', pa.int16()),
+    ('Cellular_Subscription', pa.float32()),
+    ('Internet_Users_Percent', pa.float32()),
+    ('No_of_Internet_Users', pa.int32()),
+    ('Broadband_Subscription', pa.float32()),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([('Year', pa.int16())]), flavor='hive')
+
+def snapshot_dir(db_path=DB_PATH, version=0):
+    """
+    Возвращает каталог колоночной копии данных указанной версии.
+    """
+    return os.path.join(f"{db_path}.columnar", f"v{version}")
+
+def to_storage_schema(table):
+    """
+    Приводит таблицу к типам колоночного хранилища и упорядочивает строки
+    по (Entity, Year). Словарь Entity получается отсортированным.
+    """
+    table = table.sort_by([('Entity', 'ascending'), ('Year', 'ascending')]).combine_chunks()
+    types = {field.name: field.type for field in SCHEMA}
+    arrays = []
+    for name in table.column_names:
+        column = table[name]
+        target = types.get(name)
+        if target is None:
+            arrays.append(column)
+        elif pa.types.is_dictionary(target):
+            arrays.append(pc.dictionary_encode(column.cast(target.value_type)))
+        elif pa.types.is_floating(target):
+            arrays.append(column.cast(target).fill_null(float('nan')))
+        else:
+            arrays.append(column.cast(target))
+    return pa.Table.from_arrays(arrays, names=table.column_names).combine_chunks()
+
+def export_snapshot(conn, directory):
+    """
+    Выгружает Final_cleaned из соединения DuckDB в каталог directory.
+
+    Каталог заполняется во временном каталоге рядом и переименовывается
+    целиком, поэтому читатели не видят частично записанных файлов.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Соединение с базой.
+        directory (str): Каталог версии данных (см. snapshot_dir).
+
+    Returns:
+        pa.Table: Выгруженная таблица.
+    """
+    table = to_storage_schema(conn.execute("SELECT * FROM Final_cleaned").arrow())
+    temp_dir = f"{directory}.tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+
+    with pa.OSFile(os.path.join(temp_dir, ARROW_FILE), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=max(len(table), 1))
+    ds.write_dataset(table, os.path.join(temp_dir, PARQUET_DIR), format='parquet',
+                     partitioning=PARTITIONING, existing_data_behavior='overwrite_or_ignore')
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(temp_dir, directory)
+    return table
+
+def remove_old_snapshots(db_path=DB_PATH, keep=2):
+    """
+    Удаляет колоночные копии, кроме keep последних версий. Процессы,
+    отобразившие удаленный файл в память, продолжают его читать.
+    """
+    root = f"{db_path}.columnar"
+    if not os.path.isdir(root):
+        return
+    versions = sorted(int(name[1:]) for name in os.listdir(root)
+                      if name.startswith('v') and name[1:].isdigit())
+    for version in versions[:-keep]:
+        shutil.rmtree(snapshot_dir(db_path, version), ignore_errors=True)
+
+def read_table(directory):
+    """
+    Отображает final_cleaned.arrow в память и возвращает таблицу,
+    буферы которой ссылаются на отображенный файл.
+    """
+    source = pa.memory_map(os.path.join(directory, ARROW_FILE), 'r')
+    return pa.ipc.open_file(source).read_all()
+
+def read_partitions(directory, entities=None, year_range=None, columns=None):
+    """
+    Читает строки из набора Parquet, открывая только партиции нужных лет.
+
+    Args:
+        directory (str): Каталог версии данных.
+        entities (list): Страны; None — все.
+        year_range (list): Диапазон лет [начало, конец]; None — все годы.
+        columns (list): Нужные столбцы помимо Entity и Year; None — все.
+
+    Returns:
+        pa.Table: Строки, упорядоченные по (Entity, Year).
+    """
+    dataset = ds.dataset(os.path.join(directory, PARQUET_DIR), format='parquet', partitioning=PARTITIONING)
+    condition = None
+    if year_range is not None:
+        condition = (ds.field('Year') >= int(year_range[0])) & (ds.field('Year') <= int(year_range[1]))
+    if entities is not None:
+        entity_condition = ds.field('Entity').isin(list(entities))
+        condition = entity_condition if condition is None else condition & entity_condition
+    if columns is not None:
+        columns = list(dict.fromkeys(['Entity', 'Year'] + list(columns)))
+    table = dataset.to_table(columns=columns, filter=condition)
+    # Партиции читаются по годам; словарные столбцы Arrow не сортирует,
+    # поэтому порядок строк вычисляется по декодированным названиям
+    keys = pa.table({'Entity': table['Entity'].cast(pa.string()), 'Year': table['Year']})
+    return table.take(pc.sort_indices(keys, sort_keys=[('Entity', 'ascending'), ('Year', 'ascending')]))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Выгрузка Final_cleaned в колоночное хранилище')
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    conn = duckdb.connect(args.db, read_only=True)
+    try:
+        version = conn.execute("SELECT coalesce(max(version), 0) FROM etl_watermark").fetchone()[0]
+        directory = snapshot_dir(args.db, version)
+        table = export_snapshot(conn, directory)
+    finally:
+        conn.close()
+    print(f"Выгружено {len(table)} строк версии {version} в {directory}")
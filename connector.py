@@ -1,23 +1,248 @@
 """
 Этот модуль обеспечивает подключение к базе данных DuckDB.
+
+Для веб-приложения используется общий на процесс менеджер соединений:
+одна открытая база (при необходимости только для чтения), курсоры для
+каждого потока, ограниченный пул с тайм-аутом ожидания и метрики.
 """
 
-import duckdb
 import os
+import threading
+import time
+from contextlib import contextmanager
+
+import duckdb
+# DuckDB импортирует pandas лениво при первом .df(); одновременный первый
+# вызов из нескольких потоков может зависнуть на блокировке импорта
+import pandas  # noqa: F401
 
-def get_connection(db_path='my.db'):
+DB_PATH = 'my.db'
+
+# Настройки пула по умолчанию, переопределяются переменными окружения
+POOL_SIZE = int(os.environ.get('DUCKDB_POOL_SIZE', 4))
+CHECKOUT_TIMEOUT = float(os.environ.get('DUCKDB_CHECKOUT_TIMEOUT', 10))
+READ_ONLY = os.environ.get('DUCKDB_READ_ONLY', '0') == '1'
+
+def get_connection(db_path=DB_PATH):
     """
-    Устанавливает соединение с базой данных DuckDB.
-    
+    Устанавливает отдельное соединение с базой данных DuckDB.
+
+    Используется скриптами загрузки, которым нужна запись. Веб-приложению
+    следует использовать connection().
+
     Args:
         db_path (str): Путь к файлу базы данных. По умолчанию 'my.db'.
-    
+
     Returns:
         duckdb.DuckDBPyConnection: Объект соединения с базой данных.
     """
-    if not os.path.exists(db_path):
-        # Если файл не существует, создаем новую базу данных
-        conn = duckdb.connect(db_path)
-        conn.close()
-    
-    return duckdb.connect(db_path)
\ No newline at end of file
+    return duckdb.connect(db_path)
+
+class PoolTimeout(TimeoutError):
+    """
+    Не удалось получить соединение из пула за отведенное время.
+    """
+
+class _Database:
+    """
+    Открытая база данных одного поколения и счетчик выданных курсоров.
+    """
+
+    def __init__(self, db_path, read_only):
+        self.connection = duckdb.connect(db_path, read_only=read_only)
+        self.active = 0
+        self.retired = False
+        self.closed = False
+
+    def close_if_idle(self):
+        if self.retired and self.active == 0 and not self.closed:
+            self.connection.close()
+            self.closed = True
+
+class ConnectionManager:
+    """
+    Менеджер соединений с одной базой DuckDB на процесс.
+
+    Каждый поток получает собственный курсор от общей открытой базы,
+    число одновременно выданных курсоров ограничено pool_size.
+    После reopen() новые запросы идут к заново открытой базе, а уже
+    выполняющиеся дорабатывают на старой, которая закрывается после них.
+
+    Args:
+        db_path (str): Путь к файлу базы данных.
+        read_only (bool): Открывать базу только для чтения.
+        pool_size (int): Максимальное число одновременно выданных курсоров.
+        checkout_timeout (float): Сколько секунд ждать свободного курсора.
+    """
+
+    def __init__(self, db_path=DB_PATH, read_only=READ_ONLY, pool_size=POOL_SIZE,
+                 checkout_timeout=CHECKOUT_TIMEOUT):
+        self.db_path = db_path
+        self.read_only = read_only
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Вызывается также после fork: унаследованные дескрипторы не используются
+        self._pid = os.getpid()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._local = threading.local()
+        self._database = None
+        self._metrics = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'checkout_wait_seconds_total': 0.0,
+            'checkout_wait_seconds_max': 0.0,
+            'queries': 0,
+            'query_seconds_total': 0.0,
+            'query_seconds_max': 0.0,
+            'reopens': 0,
+        }
+
+    def _current_database(self):
+        with self._lock:
+            if self._database is None:
+                self._database = _Database(self.db_path, self.read_only)
+            self._database.active += 1
+            return self._database
+
+    def _record(self, prefix, seconds):
+        with self._lock:
+            self._metrics[f'{prefix}_seconds_total'] += seconds
+            self._metrics[f'{prefix}_seconds_max'] = max(self._metrics[f'{prefix}_seconds_max'], seconds)
+
+    def _record_query(self, seconds):
+        self._record('query', seconds)
+        with self._lock:
+            self._metrics['queries'] += 1
+        for observer in _query_observers:
+            observer(seconds)
+
+    @contextmanager
+    def connection(self):
+        """
+        Выдает курсор текущего потока на время блока with.
+
+        Raises:
+            PoolTimeout: Если все курсоры заняты дольше checkout_timeout.
+        """
+        if self._pid != os.getpid():
+            self._reset()
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self._metrics['timeouts'] += 1
+            raise PoolTimeout(f"Нет свободного соединения с {self.db_path} за {self.checkout_timeout} с")
+        self._record('checkout_wait', time.perf_counter() - started)
+        database = None
+        try:
+            database = self._current_database()
+            cursors = getattr(self._local, 'cursors', None)
+            if cursors is None or cursors[0] is not database:
+                # Курсор прежнего поколения закрываем, пока его база еще открыта
+                if cursors is not None and not cursors[0].closed:
+                    cursors[1].close()
+                cursors = self._local.cursors = (database, database.connection.cursor())
+            with self._lock:
+                self._metrics['checkouts'] += 1
+            yield cursors[1]
+        finally:
+            if database is not None:
+                with self._lock:
+                    database.active -= 1
+                    database.close_if_idle()
+            self._slots.release()
+
+    def query_df(self, sql, params=None):
+        """
+        Выполняет запрос и возвращает результат как DataFrame, учитывая время запроса.
+        """
+        with self.connection() as conn:
+            started = time.perf_counter()
+            df = conn.execute(sql, params or []).df()
+            seconds = time.perf_counter() - started
+        self._record_query(seconds)
+        return df
+
+    def query_arrow(self, sql, params=None):
+        """
+        Выполняет запрос и возвращает результат как pyarrow.Table, учитывая время запроса.
+        """
+        with self.connection() as conn:
+            started = time.perf_counter()
+            table = conn.execute(sql, params or []).arrow()
+            seconds = time.perf_counter() - started
+        self._record_query(seconds)
+        return table
+
+    def reopen(self):
+        """
+        Переоткрывает базу, например после того как ETL заменил файл.
+        """
+        with self._lock:
+            database, self._database = self._database, None
+            self._metrics['reopens'] += 1
+            if database is not None:
+                database.retired = True
+                database.close_if_idle()
+
+    def metrics(self):
+        """
+        Возвращает копию счетчиков пула: число выдач, тайм-аутов, время ожидания и запросов.
+        """
+        with self._lock:
+            return dict(self._metrics, pool_size=self.pool_size, read_only=self.read_only)
+
+_manager = None
+_manager_lock = threading.Lock()
+
+# Функции, получающие время выполнения каждого запроса (см. add_query_observer)
+_query_observers = []
+
+def add_query_observer(observer):
+    """
+    Подключает функцию, которая получает время выполнения каждого запроса, с,
+    например для гистограммы в instrumentation.py.
+    """
+    _query_observers.append(observer)
+
+def configure(db_path=DB_PATH, read_only=READ_ONLY, pool_size=POOL_SIZE, checkout_timeout=CHECKOUT_TIMEOUT):
+    """
+    Задает параметры общего менеджера соединений процесса.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.reopen()
+        _manager = ConnectionManager(db_path, read_only, pool_size, checkout_timeout)
+    return _manager
+
+def get_manager():
+    """
+    Возвращает общий менеджер соединений процесса, создавая его при первом обращении.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ConnectionManager()
+        return _manager
+
+def connection():
+    """
+    Выдает курсор общего менеджера на время блока with.
+    """
+    return get_manager().connection()
+
+def query_df(sql, params=None):
+    """
+    Выполняет запрос через общий менеджер и возвращает DataFrame.
+    """
+    return get_manager().query_df(sql, params)
+
+def query_arrow(sql, params=None):
+    """
+    Выполняет запрос через общий менеджер и возвращает pyarrow.Table.
+    """
+    return get_manager().query_arrow(sql, params)
@@ -0,0 +1,155 @@
+"""
+Этот модуль содержит индекс префиксных сумм для агрегатов по диапазону лет.
+
+Для каждого показателя хранятся накопленные по годам суммы значений
+и число непустых значений в матрицах страна × год, с нулевым столбцом
+в начале. Сумма показателя страны за годы [начало, конец] — разность двух
+элементов строки, поэтому сумма, число значений и среднее по набору стран
+за любой диапазон лет вычисляются за O(число стран) без обращения к строкам
+таблицы. Отдельно накапливается число строк страны: страна входит
+в результат aggregate, только если у нее есть строки в диапазоне (как при
+группировке отфильтрованных строк).
+
+Индекс строится при загрузке хранилища (EntityStore.build_cube);
+при переключении на новую версию данных он строится заново.
+"""
+
+import numpy as np
+import pandas as pd
+
+def _prefix(matrix, dtype):
+    prefix = np.zeros((matrix.shape[0], matrix.shape[1] + 1), dtype=dtype)
+    np.cumsum(matrix, axis=1, out=prefix[:, 1:])
+    return prefix
+
+class PrefixCube:
+    """
+    Накопленные по годам суммы и число значений показателей по странам.
+
+    Args:
+        entities (list): Названия стран; codes — номера в этом списке.
+        codes (np.ndarray): Номер страны для каждой строки.
+        years (np.ndarray): Год каждой строки; пара (страна, год) уникальна.
+        columns (dict): Показатель -> значения строк (NaN — пропуск).
+        year_min (int): Первый год индекса.
+        year_max (int): Последний год индекса.
+    """
+
+    def __init__(self, entities, codes, years, columns, year_min, year_max):
+        self.entities = list(entities)
+        self._entity_index = {name: i for i, name in enumerate(self.entities)}
+        self.year_min = int(year_min)
+        self.year_max = int(year_max)
+        sums, counts, rows = self._matrices(len(self.entities), codes, years, columns, self.year_min, self.year_max)
+        self._rows = _prefix(rows, np.int32)
+        self._sums = {column: _prefix(matrix, np.float64) for column, matrix in sums.items()}
+        self._counts = {column: _prefix(matrix, np.int32) for column, matrix in counts.items()}
+
+    @staticmethod
+    def _matrices(n_entities, codes, years, columns, year_min, year_max):
+        codes = np.asarray(codes, dtype=np.int64)
+        positions = np.asarray(years, dtype=np.int64) - year_min
+        shape = (n_entities, max(year_max - year_min + 1, 0))
+        rows = np.zeros(shape, dtype=np.int32)
+        rows[codes, positions] = 1
+        sums, counts = {}, {}
+        for column, values in columns.items():
+            values = np.asarray(values, dtype=np.float64)
+            valid = ~np.isnan(values)
+            sums[column] = np.zeros(shape)
+            sums[column][codes[valid], positions[valid]] = values[valid]
+            counts[column] = np.zeros(shape, dtype=np.int32)
+            counts[column][codes[valid], positions[valid]] = 1
+        return sums, counts, rows
+
+    @property
+    def columns(self):
+        return set(self._sums)
+
+    @property
+    def nbytes(self):
+        arrays = [self._rows] + list(self._sums.values()) + list(self._counts.values())
+        return sum(array.nbytes for array in arrays)
+
+    def covers(self, columns):
+        """
+        Проверяет, есть ли в индексе все указанные показатели.
+        """
+        return all(column in self._sums for column in columns)
+
+    def _select(self, entities, year_range):
+        # Номера стран без повторов и границы диапазона лет в накопленных суммах
+        codes = [self._entity_index[name] for name in dict.fromkeys(entities or []) if name in self._entity_index]
+        lo = min(max(int(year_range[0]) - self.year_min, 0), self._rows.shape[1] - 1)
+        hi = min(max(int(year_range[1]) - self.year_min + 1, 0), self._rows.shape[1] - 1)
+        return np.asarray(codes, dtype=np.int64), lo, max(hi, lo)
+
+    @staticmethod
+    def _range(prefix, codes, lo, hi):
+        return prefix[codes, hi] - prefix[codes, lo]
+
+    def totals(self, entities, year_range, columns):
+        """
+        Возвращает суммы и число непустых значений по каждой стране.
+
+        Returns:
+            tuple: (названия стран, {показатель: (суммы, число значений)}).
+        """
+        codes, lo, hi = self._select(entities, year_range)
+        return ([self.entities[code] for code in codes],
+                {column: (self._range(self._sums[column], codes, lo, hi),
+                          self._range(self._counts[column], codes, lo, hi))
+                 for column in columns})
+
+    def sum(self, entities, year_range, columns):
+        """
+        Возвращает суммы показателей по выбранным странам и годам.
+        """
+        _, totals = self.totals(entities, year_range, columns)
+        return {column: float(sums.sum()) for column, (sums, _) in totals.items()}
+
+    def count(self, entities, year_range, columns):
+        """
+        Возвращает число непустых значений показателей по выбранным странам и годам.
+        """
+        _, totals = self.totals(entities, year_range, columns)
+        return {column: int(counts.sum()) for column, (_, counts) in totals.items()}
+
+    def mean(self, entities, year_range, columns):
+        """
+        Возвращает средние значения показателей (NaN, если значений нет),
+        как np.nanmean по выбранным строкам.
+        """
+        _, totals = self.totals(entities, year_range, columns)
+        means = {}
+        for column, (sums, counts) in totals.items():
+            count = int(counts.sum())
+            means[column] = float(sums.sum()) / count if count else float('nan')
+        return means
+
+    def aggregate(self, entities, year_range, aggregations):
+        """
+        Агрегирует показатели по странам за диапазон лет.
+
+        Args:
+            aggregations (dict): Показатель -> 'sum' или 'mean'.
+
+        Returns:
+            pd.DataFrame: По строке на страну, у которой есть строки в диапазоне,
+            в порядке названий: Entity и агрегированные показатели.
+        """
+        codes, lo, hi = self._select(entities, year_range)
+        codes = codes[self._range(self._rows, codes, lo, hi) > 0]
+        codes = np.array(sorted(codes, key=self.entities.__getitem__), dtype=np.int64)
+        data = {'Entity': [self.entities[code] for code in codes]}
+        for column, how in aggregations.items():
+            sums = self._range(self._sums[column], codes, lo, hi)
+            if how == 'sum':
+                data[column] = sums
+            elif how == 'mean':
+                counts = self._range(self._counts[column], codes, lo, hi)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    data[column] = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+            else:
+                raise ValueError(f"Unsupported aggregation '{how}' for column '{column}'")
+        return pd.DataFrame(data)
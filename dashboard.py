@@ -1,14 +1,31 @@
 import os
 import sys
+import json
 import logging
+import math
+import threading
+import time
+from collections import Counter
 import duckdb
-import pandas as pd
 import dash
+import flask
+import numpy as np
 from dash import dcc, html
-from dash.dependencies import Input, Output, State
-import plotly.express as px
-import plotly.graph_objs as go
-from dash_iconify import DashIconify
+from dash.dependencies import ClientsideFunction, Input, Output, State
+
+import columnar
+import connector
+import ddl
+import dtypes
+import etl
+import instrumentation
+import jobs
+import metrics
+import payload
+import search
+import tabs
+from cache import FigureCache, make_key
+from store import DuckDBStore, EntityStore
 
 # Настройка логирования
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
@@ -16,48 +33,314 @@ logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 # Путь к базе данных
 DB_PATH = 'my.db'
 
+# Режим работы с данными: 'memory' — Final_cleaned загружается в память
+# каждого воркера, 'pushdown' — фильтрация и агрегация выполняются в DuckDB
+DATA_MODE = os.environ.get('DATA_MODE', 'memory')
+
+# Источник данных режима 'memory': 'duckdb' — чтение таблицы из базы
+# в память процесса, 'arrow' — отображение в память колоночной копии
+# версии данных (columnar.py), общей для всех воркеров
+STORAGE_FORMAT = os.environ.get('STORAGE_FORMAT', 'duckdb')
+
+# Сводная статистика считается в браузере по значениям выбранных стран:
+# значения каждой страны передаются один раз, при первом ее выборе;
+# '0' — каждый расчет выполняет сервер. В режиме 'pushdown' статистику
+# всегда считает сервер, чтобы воркер не читал строки стран целиком
+CLIENTSIDE_SUMMARY = os.environ.get('CLIENTSIDE_SUMMARY', '1') == '1' and DATA_MODE != 'pushdown'
+# Сколько последних показанных вкладок браузер хранит и показывает без запроса к серверу
+CLIENT_TAB_CACHE_ENTRIES = int(os.environ.get('CLIENT_TAB_CACHE_ENTRIES', 20))
+# '0' — не строить индекс префиксных сумм (cube.py) для сводной статистики
+# и вкладок с агрегатами по странам. В режиме 'pushdown' индекс не строится:
+# он занимает в памяти воркера столько же, сколько сами строки
+PREFIX_CUBE = os.environ.get('PREFIX_CUBE', '1') == '1' and DATA_MODE != 'pushdown'
+# Знаков после запятой в данных сводной статистики для браузера
+CLIENTSIDE_DIGITS = 4
+# '1' — список стран не передается целиком: при вводе в выпадающем списке
+# сервер возвращает COUNTRY_SEARCH_LIMIT лучших совпадений (search.py)
+COUNTRY_SEARCH = os.environ.get('COUNTRY_SEARCH', '0') == '1'
+COUNTRY_SEARCH_LIMIT = int(os.environ.get('COUNTRY_SEARCH_LIMIT', search.DEFAULT_LIMIT))
+
+# Показатели сводной статистики
+SUMMARY_COLUMNS = ['Internet_Users_Percent', 'Cellular_Subscription', 'Broadband_Subscription']
+
+# Выбор по умолчанию при открытии страницы
+DEFAULT_COUNTRIES = ['Afghanistan']
+DEFAULT_START_YEAR = 2000
+
+def _missing_tables(conn):
+    """
+    Возвращает таблицы дашборда, которых нет в базе: Final_cleaned и сводные.
+    """
+    return [table for table in ('Final_cleaned', *ddl.SUMMARY_TABLES)
+            if not conn.execute("SELECT count(*) FROM duckdb_tables() WHERE table_name = ?", [table]).fetchone()[0]]
+
 def initialize_db():
     try:
-        logging.info("Database file exists, checking for table")
-        
+        # Обычно таблицы уже есть, и база открывается только для чтения:
+        # соединение для записи не получит блокировку файла, пока базу
+        # держит другой процесс. Для записи база открывается, только если
+        # таблицы нужно создать
+        if os.path.exists(DB_PATH):
+            logging.info("Database file exists, checking for table")
+            conn = duckdb.connect(DB_PATH, read_only=True)
+            try:
+                missing = _missing_tables(conn)
+                if 'Final_cleaned' not in missing:
+                    result = conn.execute("SELECT COUNT(*) FROM Final_cleaned").fetchone()
+                    logging.info(f"Table 'Final_cleaned' exists and contains {result[0]} rows")
+            finally:
+                conn.close()
+            if not missing:
+                return
+
         conn = duckdb.connect(DB_PATH)
-        
         try:
-            result = conn.execute("SELECT COUNT(*) FROM Final_cleaned").fetchone()
-            logging.info(f"Table 'Final_cleaned' exists and contains {result[0]} rows")
-        except duckdb.CatalogException:
-            logging.info("Table 'Final_cleaned' does not exist. Creating it.")
-            csv_path = '/mnt/data/final_db.csv'
-            if not os.path.exists(csv_path):
-                logging.error(f"CSV file '{csv_path}' not found")
-                raise FileNotFoundError(f"CSV file '{csv_path}' not found")
-            df = pd.read_csv(csv_path)
-            conn.execute('CREATE TABLE Final_cleaned AS SELECT * FROM df')
-            logging.info("Table 'Final_cleaned' created and populated")
-        
-        conn.close()
+            missing = _missing_tables(conn)
+            if 'Final_cleaned' in missing:
+                logging.info("Table 'Final_cleaned' does not exist. Creating it.")
+                csv_path = '/mnt/data/final_db.csv'
+                if not os.path.exists(csv_path):
+                    logging.error(f"CSV file '{csv_path}' not found")
+                    raise FileNotFoundError(f"CSV file '{csv_path}' not found")
+                conn.execute('CREATE TABLE Final_cleaned AS SELECT * FROM read_csv_auto(?)', [csv_path])
+                logging.info("Table 'Final_cleaned' created and populated")
+
+            # Сводные таблицы для вкладок 5–8 строятся при загрузке данных (ddl.py);
+            # для баз, созданных без них, строим их один раз здесь
+            missing = [table for table in missing if table in ddl.SUMMARY_TABLES]
+            if missing:
+                logging.info(f"Building summary tables: {', '.join(missing)}")
+                ddl.refresh_summaries(conn)
+        finally:
+            conn.close()
     except Exception as e:
         logging.error(f"Error initializing database: {e}")
         raise
 
 def get_data_from_db():
     try:
-        conn = duckdb.connect(DB_PATH)
-        df = conn.execute("SELECT * FROM Final_cleaned").fetchdf()
-        conn.close()
-        return df
+        df = connector.query_df("SELECT * FROM Final_cleaned")
+        compact = dtypes.optimize_frame(df)
+        report = dtypes.memory_report(df, compact)
+        logging.info(f"Final_cleaned in memory: {report['before_bytes']} -> {report['after_bytes']} bytes "
+                     f"after dtype optimization ({report['ratio']:.1f}x)")
+        return compact
     except Exception as e:
         logging.error(f"Error getting data from database: {e}")
         raise
 
-# Инициализируем базу данных
-initialize_db()
+def load_store(version):
+    if DATA_MODE == 'pushdown':
+        return DuckDBStore()
+
+    if STORAGE_FORMAT == 'arrow':
+        directory = columnar.snapshot_dir(DB_PATH, version)
+        if os.path.isdir(directory):
+            return EntityStore.from_arrow(columnar.read_table(directory))
+        logging.warning(f"No columnar snapshot in '{directory}', reading data from the database")
+
+    # Получаем данные в компактных типах (Year — int16, см. dtypes.py)
+    df = get_data_from_db()
+
+    # Индекс по (страна, год) для фильтрации в колбэках
+    return EntityStore(df)
+
+# Текущий снимок данных процесса: (хранилище, версия данных). Снимок
+# заменяется целиком одним присваиванием, поэтому колбэк, взявший его
+# в начале, до конца работает с согласованной парой, даже если в это
+# время процесс переключился на новую версию
+_snapshot = None
+_warm_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_ready = threading.Event()
+
+# Отметка файла-указателя версии (mtime, inode) и прочитанная из него версия
+_published = (None, None)
+# Версия из файла-указателя, на которую процесс уже переключался
+_applied_version = None
+
+# Кэш графиков и сводной статистики; записи привязаны к версии данных
+figure_cache = FigureCache()
+
+# Объем и время сериализации графиков по вкладкам
+payload_stats = payload.PayloadStats()
+
+def _open_snapshot():
+    version = etl.get_data_version()[0]
+    store = load_store(version)
+
+    # Вкладки без нужных столбцов в данных отключаются
+    tabs.validate_tabs({
+        'store': store.column_names,
+        'metrics': metrics.available_columns(store.column_names),
+        **{table: etl.get_table_columns(table) for table in ddl.SUMMARY_TABLES},
+    })
+
+    if PREFIX_CUBE:
+        # Средние сводной статистики и суммы вкладок с агрегатами считаются
+        # по накопленным суммам, без обращения к строкам
+        columns = set(SUMMARY_COLUMNS)
+        for spec in tabs.TABS.values():
+            if spec.source == 'store' and spec.aggregate and spec.available:
+                columns.update(spec.aggregate)
+        store.build_cube(sorted(columns & store.column_names))
+    return store, version
+
+def warm():
+    """
+    Инициализирует базу данных и загружает данные дашборда.
+    Повторные вызовы ничего не делают.
+
+    Returns:
+        EntityStore | DuckDBStore: Хранилище данных.
+    """
+    global _snapshot, _applied_version
+    with _warm_lock:
+        if _ready.is_set():
+            return _snapshot[0]
+        started = time.perf_counter()
+
+        # Инициализируем базу данных
+        initialize_db()
+
+        # Веб-приложение только читает базу: общий менеджер соединений процесса
+        # открывает ее в режиме read-only, чтобы не конфликтовать с загрузкой данных
+        connector.configure(DB_PATH, read_only=True)
+
+        _applied_version = published_version()
+        _snapshot = _open_snapshot()
+        store, version = _snapshot
+        figure_cache.set_version(version)
+        prepare_metrics(store, version)
+        prepare_search(store, version)
+        _ready.set()
+        logging.info(f"Data mode '{DATA_MODE}': {len(store)} rows, {store.nbytes} bytes in memory, "
+                     f"version {version}, warmed in {time.perf_counter() - started:.2f}s")
+    return store
+
+def published_version():
+    """
+    Возвращает версию последнего опубликованного снимка базы (ddl.publish_snapshot)
+    или None. Файл-указатель перечитывается, только если изменилась его отметка,
+    поэтому проверку можно выполнять на каждый запрос.
+    """
+    global _published
+    try:
+        stat = os.stat(ddl.version_path(DB_PATH))
+    except FileNotFoundError:
+        return None
+    stamp = (stat.st_mtime_ns, stat.st_ino)
+    if _published[0] != stamp:
+        _published = (stamp, ddl.read_published_version(DB_PATH))
+    return _published[1]
+
+def reload_data():
+    """
+    Переключает процесс на опубликованный снимок базы, если с прошлого
+    переключения опубликована новая версия. Пока один поток загружает новый снимок,
+    остальные запросы обслуживаются старым. Если снимок не удалось открыть,
+    процесс остается на старом снимке и пробует снова при следующем запросе.
 
-# Получаем данные
-df = get_data_from_db()
+    Returns:
+        tuple: Текущий снимок (хранилище, версия данных).
+    """
+    global _snapshot, _applied_version
+    if not _ready.is_set():
+        warm()
+    if not _reload_lock.acquire(blocking=False):
+        return _snapshot
+    try:
+        published = published_version()
+        if published is None or published == _applied_version:
+            return _snapshot
+        started = time.perf_counter()
+        try:
+            # Открытые соединения дочитывают старый файл и закрываются,
+            # когда завершатся выполняющиеся на них запросы
+            connector.get_manager().reopen()
+            snapshot = _open_snapshot()
+            store, version = snapshot
+            prepare_metrics(store, version)
+            prepare_search(store, version)
+        except Exception:
+            logging.exception(f"Failed to switch to published data version {published}, "
+                              f"keeping version {_snapshot[1]}")
+            return _snapshot
+        _snapshot = snapshot
+        _applied_version = published
+        figure_cache.set_version(version)
+        logging.info(f"Switched to data version {version}: {len(store)} rows "
+                     f"in {time.perf_counter() - started:.2f}s")
+        return _snapshot
+    finally:
+        _reload_lock.release()
+
+def get_snapshot():
+    """
+    Возвращает текущий снимок (хранилище, версия данных), загружая данные
+    при первом обращении и переключаясь на новый опубликованный снимок.
+    """
+    if not _ready.is_set():
+        warm()
+    published = published_version()
+    if published is not None and published != _applied_version:
+        return reload_data()
+    return _snapshot
+
+def get_store():
+    """
+    Возвращает хранилище данных текущего снимка.
+    """
+    return get_snapshot()[0]
+
+# Производные показатели (metrics.py) текущего снимка
+metrics_cache = metrics.MetricsCache()
+
+def prepare_metrics(store, version):
+    """
+    Считает производные показатели снимка, если они нужны доступным вкладкам.
+    Вызывается при загрузке снимка: под gunicorn показатели считаются
+    в мастере, и воркеры, в том числе перезапущенные, получают их готовыми.
+    В режиме pushdown показатели заранее не считаются.
+    """
+    if DATA_MODE == 'pushdown':
+        return
+    if any(spec.source == 'metrics' and spec.available for spec in tabs.TABS.values()):
+        _metrics_store(store, version)
+
+def _metrics_store(store, version):
+    if isinstance(store, DuckDBStore):
+        # Показатели выбранных стран считает запрос к DuckDB
+        return metrics.DuckDBMetrics(store.table)
+    return metrics_cache.get(version, lambda: store.filter(store.entity_names(), [store.year_min, store.year_max]))
+
+# Поисковый индекс стран (search.py) текущего снимка
+search_cache = search.SearchIndexCache()
 
-# Преобразование типов данных для удобства работы с дашбордом
-df['Year'] = df['Year'].astype(int)
+def prepare_search(store, version):
+    """
+    Строит поисковый индекс стран снимка, если выпадающий список работает
+    через поиск на сервере; под gunicorn индекс строится в мастере.
+    """
+    if COUNTRY_SEARCH:
+        search_cache.get(version, store.entity_summary)
+
+def get_metrics_data(selected_countries, year_range, columns=None):
+    """
+    Возвращает производные показатели выбранных стран и лет. Показатели
+    считаются по всем строкам снимка один раз на версию данных, в режиме
+    pushdown — запросом к DuckDB на каждую выборку.
+    """
+    store, version = get_snapshot()
+    return _metrics_store(store, version).filter(selected_countries, year_range, columns)
+
+# Источники данных вкладок помимо store
+TAB_SOURCES = {
+    'metrics': get_metrics_data,
+    'digital_divide': etl.get_digital_divide_data,
+    'internet_growth': etl.get_internet_growth_data,
+    'mobile_vs_broadband': etl.get_mobile_vs_broadband_data,
+}
 
 # Создание экземпляра Dash
 app = dash.Dash(__name__, external_stylesheets=[
@@ -203,188 +486,567 @@ app.index_string = '''
 </html>
 '''
 
-# Обновленный макет приложения
-app.layout = html.Div([
-    html.Div([
-        html.H1("Глобальные телекоммуникационные тренды", 
-                style={'textAlign': 'center', 'fontSize': '32px', 'fontWeight': '600', 'marginBottom': '30px'}),
-        
+def country_options(store, version, selected=(), search_value=''):
+    """
+    Варианты выпадающего списка стран. При COUNTRY_SEARCH — выбранные страны
+    и лучшие совпадения с search_value (без запроса — страны с самыми
+    свежими данными), иначе все страны.
+    """
+    if not COUNTRY_SEARCH:
+        return [{'label': country, 'value': country} for country in store.entity_names()]
+    found = search_cache.get(version, store.entity_summary).search(search_value, COUNTRY_SEARCH_LIMIT)
+    return [{'label': country, 'value': country} for country in dict.fromkeys([*(selected or []), *found])]
+
+def year_marks(store):
+    return {str(year): str(year) for year in range(store.year_min, store.year_max+1, 5)}
+
+def _summary_rows(store, entities, year_min, year_max):
+    frame = store.filter(entities, [year_min, year_max], SUMMARY_COLUMNS)
+    positions = frame['Year'].to_numpy(dtype=np.int64) - year_min
+    values = [np.round(frame[column].to_numpy(dtype=np.float64, na_value=np.nan), CLIENTSIDE_DIGITS).tolist()
+              for column in SUMMARY_COLUMNS]
+    # Страны без данных тоже попадают в ответ, чтобы браузер не запрашивал их снова
+    rows = dict.fromkeys(entities)
+    for i, name in enumerate(frame['Entity'].astype(object)):
+        if rows[name] is None:
+            rows[name] = [[None] * (year_max - year_min + 1) for _ in SUMMARY_COLUMNS]
+        for row, column in zip(rows[name], values):
+            row[positions[i]] = None if math.isnan(column[i]) else column[i]
+    return rows
+
+def summary_dataset(store, version, entities, year_bounds=None):
+    """
+    Готовит данные для расчета сводной статистики в браузере: значения
+    показателей выбранных стран по годам (None, где данных нет). Результат
+    кэшируется по версии данных.
+
+    Args:
+        entities (list): Страны, значения которых нужны браузеру.
+        year_bounds (list): Годы [первый, последний], к которым привязаны
+            значения в браузере; None — границы данных снимка.
+
+    Returns:
+        dict: year_min, year_max, columns и rows: страна -> по списку
+        значений на показатель (None — у страны нет данных).
+    """
+    entities = sorted(set(entities or []))
+    year_min, year_max = year_bounds or (store.year_min, store.year_max)
+    key = make_key('summary-rows', entities, [year_min, year_max])
+    rows = figure_cache.get_or_compute(key, lambda: _summary_rows(store, entities, year_min, year_max), version)
+    return {'year_min': year_min, 'year_max': year_max, 'columns': SUMMARY_COLUMNS, 'rows': rows}
+
+def tab_request(tab, countries, year_range, version):
+    """
+    Запрос вкладки в том виде, в каком его формирует браузер (assets/dashboard.js).
+    Ключ совпадает с ключом клиентского кэша вкладок.
+    """
+    key = json.dumps([tab, sorted(set(countries or [])), year_range[0], year_range[1], version],
+                     separators=(',', ':'), ensure_ascii=False)
+    return {'tab': tab, 'countries': countries, 'years': year_range, 'key': key}
+
+# Обновленный макет приложения строится при первом запросе страницы
+def serve_layout():
+    from dash_iconify import DashIconify
+
+    store, version = get_snapshot()
+    year_range = [DEFAULT_START_YEAR, store.year_max]
+    return html.Div([
         html.Div([
+            html.H1("Глобальные телекоммуникационные тренды", 
+                    style={'textAlign': 'center', 'fontSize': '32px', 'fontWeight': '600', 'marginBottom': '30px'}),
+        
             html.Div([
-                html.Label("Выберите страны:", style={'marginBottom': '10px', 'fontWeight': '500'}),
-                dcc.Dropdown(
-                    id='country-dropdown',
-                    options=[{'label': country, 'value': country} for country in df['Entity'].unique()],
-                    value=['Afghanistan'],
-                    multi=True,
-                    className='dropdown'
-                ),
-            ], style={'width': '48%', 'display': 'inline-block'}),
+                html.Div([
+                    html.Label("Выберите страны:", style={'marginBottom': '10px', 'fontWeight': '500'}),
+                    dcc.Dropdown(
+                        id='country-dropdown',
+                        options=country_options(store, version, DEFAULT_COUNTRIES),
+                        value=DEFAULT_COUNTRIES,
+                        multi=True,
+                        className='dropdown'
+                    ),
+                ], style={'width': '48%', 'display': 'inline-block'}),
             
-            html.Div([
-                html.Label("Выберите диапазон лет:", style={'marginBottom': '10px', 'fontWeight': '500'}),
-                dcc.RangeSlider(
-                    id='year-slider',
-                    min=df['Year'].min(),
-                    max=df['Year'].max(),
-                    value=[2000, df['Year'].max()],
-                    marks={str(year): str(year) for year in range(df['Year'].min(), df['Year'].max()+1, 5)},
-                    step=None,
-                    className='range-slider'
-                ),
-            ], style={'width': '48%', 'display': 'inline-block', 'float': 'right'})
-        ], style={'marginBottom': '30px'}),
+                html.Div([
+                    html.Label("Выберите диапазон лет:", style={'marginBottom': '10px', 'fontWeight': '500'}),
+                    dcc.RangeSlider(
+                        id='year-slider',
+                        min=store.year_min,
+                        max=store.year_max,
+                        value=year_range,
+                        marks=year_marks(store),
+                        step=None,
+                        className='range-slider'
+                    ),
+                ], style={'width': '48%', 'display': 'inline-block', 'float': 'right'})
+            ], style={'marginBottom': '30px'}),
         
-        html.Div(id='summary-stats', className='summary-card'),
+            html.Div([
+                html.H4("Сводная статистика"),
+                html.P(id='summary-internet'),
+                html.P(id='summary-mobile'),
+                html.P(id='summary-broadband')
+            ], id='summary-stats', className='summary-card'),
+            dcc.Store(id='summary-data',
+                      data=summary_dataset(store, version, DEFAULT_COUNTRIES) if CLIENTSIDE_SUMMARY else None),
+            dcc.Store(id='summary-request'),
         
-        html.Div([
-            html.Div("Географическое распределение пользователей интернета", id='tab-1', className='menu-item', n_clicks=0),
-            html.Div("Сравнение городского и сельского населения", id='tab-2', className='menu-item', n_clicks=0),
-            html.Div("Сравнение скорости интернета", id='tab-3', className='menu-item', n_clicks=0),
-            html.Div("Анализ затрат на интернет", id='tab-4', className='menu-item', n_clicks=0),
-                        html.Div("Цифровой разрыв", id='tab-5', className='menu-item', n_clicks=0),
-            html.Div("Темпы роста интернет-проникновения", id='tab-6', className='menu-item', n_clicks=0),
-            html.Div("Сравнение мобильной связи и ШПД", id='tab-7', className='menu-item', n_clicks=0),
-            html.Div("Телекоммуникационные тренды", id='tab-8', className='menu-item', n_clicks=0),
-            html.Div("Рост пользователей интернета по годам", id='tab-9', className='menu-item', n_clicks=0),
-            html.Div("Сравнение мобильной связи и ШПД по странам", id='tab-10', className='menu-item', n_clicks=0),
-        ], style={'display': 'flex', 'justifyContent': 'space-between', 'marginBottom': '20px'}),
+            html.Div([
+                html.Div(spec.title, id=spec.tab_id, className='menu-item', n_clicks=0)
+                for spec in tabs.TABS.values()
+            ], style={'display': 'flex', 'justifyContent': 'space-between', 'marginBottom': '20px'}),
         
-        html.Div(id='tab-content', className='card'),
+            html.Div(id='tab-content', className='card'),
+            dcc.Store(id='tab-state'),
+            dcc.Store(id='tab-request', data=tab_request('tab-1', DEFAULT_COUNTRIES, year_range, version)),
+            dcc.Store(id='tab-cache', data={'limit': CLIENT_TAB_CACHE_ENTRIES, 'order': [], 'entries': {}}),
+            dcc.Store(id='heavy-request'),
+            dcc.Store(id='data-version', data=version),
         
-        html.Div([
-            html.Button("Обновить данные", id='refresh-button', className='button'),
             html.Div([
-                DashIconify(icon="mdi:information", width=20, height=20, style={'marginLeft': '10px', 'verticalAlign': 'middle'}),
-                html.Span("Инфо", className="tooltiptext")
-            ], className="tooltip")
-        ], style={'textAlign': 'center', 'marginTop': '30px'}),
+                html.Button("Обновить данные", id='refresh-button', className='button'),
+                html.Div([
+                    DashIconify(icon="mdi:information", width=20, height=20, style={'marginLeft': '10px', 'verticalAlign': 'middle'}),
+                    html.Span("Инфо", className="tooltiptext")
+                ], className="tooltip"),
+                html.Div(id='refresh-status', style={'marginTop': '10px', 'fontSize': '14px'})
+            ], style={'textAlign': 'center', 'marginTop': '30px'}),
 
-        html.Div("Авторы: Ниёзов Анушервон и Давронов Мустафо", className='authors')
-    ], className='container')
-])
+            html.Div("Авторы: Ниёзов Анушервон и Давронов Мустафо", className='authors')
+        ], className='container')
+    ])
 
-@app.callback(
-    Output('summary-stats', 'children'),
-    [Input('country-dropdown', 'value'),
-     Input('year-slider', 'value')]
-)
-def update_summary_stats(selected_countries, year_range):
-    filtered_df = df[(df['Entity'].isin(selected_countries)) & 
-                     (df['Year'].between(year_range[0], year_range[1]))]
-    
-    avg_internet_users = filtered_df['Internet_Users_Percent'].mean()
-    avg_mobile_subs = filtered_df['Cellular_Subscription'].mean()
-    avg_broadband_subs = filtered_df['Broadband_Subscription'].mean()
+app.layout = serve_layout
+
+if CLIENTSIDE_SUMMARY:
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='summaryStats'),
+        [Output('summary-internet', 'children'),
+         Output('summary-mobile', 'children'),
+         Output('summary-broadband', 'children')],
+        [Input('country-dropdown', 'value'),
+         Input('year-slider', 'value'),
+         Input('summary-data', 'data')]
+    )
+
+    # Значения стран, которых еще нет в summary-data, запрашиваются у сервера
+    app.clientside_callback(
+        ClientsideFunction(namespace='dashboard', function_name='missingSummaryRows'),
+        Output('summary-request', 'data'),
+        [Input('country-dropdown', 'value')],
+        [State('summary-data', 'data')]
+    )
+
+    @app.callback(
+        Output('summary-data', 'data', allow_duplicate=True),
+        [Input('summary-request', 'data')],
+        prevent_initial_call=True
+    )
+    def load_summary_rows(request):
+        """
+        Дополняет summary-data значениями запрошенных стран в тех же границах лет.
+        """
+        if not request or not request.get('entities'):
+            raise dash.exceptions.PreventUpdate
+        store, version = get_snapshot()
+        with instrumentation.span('summary'):
+            dataset = summary_dataset(store, version, request['entities'],
+                                      [request['year_min'], request['year_max']])
+        patch = dash.Patch()
+        for name, row in dataset['rows'].items():
+            patch['rows'][name] = row
+        return patch
+else:
+    @app.callback(
+        [Output('summary-internet', 'children'),
+         Output('summary-mobile', 'children'),
+         Output('summary-broadband', 'children')],
+        [Input('country-dropdown', 'value'),
+         Input('year-slider', 'value'),
+         Input('data-version', 'data')]
+    )
+    def update_summary_stats(selected_countries, year_range, shown_version=None):
+        store, version = get_snapshot()
+        key = make_key('summary', selected_countries, year_range, (store.year_min, store.year_max))
+        with instrumentation.span('summary'):
+            avg_internet_users, avg_mobile_subs, avg_broadband_subs = figure_cache.get_or_compute(
+                key, lambda: compute_summary_stats(store, selected_countries, year_range), version)
+
+        return [
+            f"Средний процент интернет-пользователей: {avg_internet_users:.2f}%",
+            f"Среднее количество мобильных подписок: {avg_mobile_subs:.2f}",
+            f"Среднее количество широкополосных подписок: {avg_broadband_subs:.2f}"
+        ]
+
+if COUNTRY_SEARCH:
+    @app.callback(
+        Output('country-dropdown', 'options', allow_duplicate=True),
+        [Input('country-dropdown', 'search_value')],
+        [State('country-dropdown', 'value')],
+        prevent_initial_call=True
+    )
+    def search_countries(search_value, selected_countries):
+        """
+        Возвращает выбранные страны и лучшие совпадения с введенным текстом:
+        выбранные страны остаются в вариантах, иначе список их сбросит.
+        """
+        if search_value is None:
+            raise dash.exceptions.PreventUpdate
+        store, version = get_snapshot()
+        with instrumentation.span('search'):
+            return country_options(store, version, selected_countries, search_value)
+
+def compute_summary_stats(store, selected_countries, year_range):
+    means = store.mean(selected_countries, year_range, SUMMARY_COLUMNS)
     
-    return html.Div([
-        html.H4("Сводная статистика"),
-        html.P(f"Средний процент интернет-пользователей: {avg_internet_users:.2f}%"),
-        html.P(f"Среднее количество мобильных подписок: {avg_mobile_subs:.2f}"),
-        html.P(f"Среднее количество широкополосных подписок: {avg_broadband_subs:.2f}")
-    ])
+    avg_internet_users = means['Internet_Users_Percent']
+    avg_mobile_subs = means['Cellular_Subscription']
+    avg_broadband_subs = means['Broadband_Subscription']
+    return avg_internet_users, avg_mobile_subs, avg_broadband_subs
 
-@app.callback(
-    Output('tab-content', 'children'),
-    [Input(f'tab-{i}', 'n_clicks') for i in range(1, 11)],
+# Переключение вкладок обрабатывает браузер: вкладку, уже показанную при том же
+# выборе стран, лет и версии данных, он берет из клиентского кэша, иначе
+# отправляет запрос в tab-request
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='routeTab'),
+    [Output('tab-content', 'children', allow_duplicate=True),
+     Output('tab-state', 'data', allow_duplicate=True),
+     Output('tab-request', 'data')],
+    [Input(tab_id, 'n_clicks') for tab_id in tabs.TABS] + [Input('data-version', 'data')],
     [State('country-dropdown', 'value'),
-     State('year-slider', 'value')]
+     State('year-slider', 'value'),
+     State('tab-state', 'data'),
+     State('tab-cache', 'data')],
+    prevent_initial_call=True
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='rememberTab'),
+    Output('tab-cache', 'data'),
+    [Input('tab-content', 'children')],
+    [State('tab-state', 'data'),
+     State('tab-cache', 'data')],
+    prevent_initial_call=True
 )
-def update_content(*args):
-    ctx = dash.callback_context
-    if not ctx.triggered:
-        button_id = 'tab-1'
+
+@app.callback(
+    [Output('tab-content', 'children'),
+     Output('tab-state', 'data'),
+     Output('heavy-request', 'data')],
+    [Input('tab-request', 'data')],
+    [State('tab-state', 'data')]
+)
+def update_content(request, shown):
+    button_id = request['tab']
+    selected_countries = request['countries']
+    year_range = request['years']
+    state = {'tab': button_id, 'key': request.get('key')}
+
+    spec = tabs.get_tab(button_id)
+    if not spec.available:
+        return [
+            html.P(f"Нет данных для этой вкладки: в наборе данных нет столбцов {', '.join(spec.missing_columns)}.",
+                   style={'fontSize': '14px', 'color': colors['accent']})
+        ], state, dash.no_update
+
+    store, version = get_snapshot()
+    key = make_key(button_id, selected_countries, year_range, (store.year_min, store.year_max))
+    if spec.heavy and jobs.is_heavy(selected_countries, year_range):
+        cached = figure_cache.get(key, version)
+        if cached is None:
+            cached = jobs.get_result(repr((version, key)))
+            if cached is None:
+                # Большая выборка тяжелой вкладки строится фоновым колбэком
+                # render_heavy_tab, воркер в это время обслуживает других
+                job = {'tab': button_id, 'countries': selected_countries, 'years': year_range,
+                       'requested': time.time()}
+                return [
+                    html.Progress(id='heavy-progress', value='0', max=str(jobs.STEPS), style={'width': '100%'}),
+                    html.Div(id='heavy-content')
+                ], state, job
+            figure_cache.set(key, cached, version)
     else:
-        button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    
-    selected_countries = args[-2]
-    year_range = args[-1]
-    
-    filtered_df = df[(df['Entity'].isin(selected_countries)) & 
-                     (df['Year'].between(year_range[0], year_range[1]))]
-
-    # Создаем стильный фон для графиков
-    layout = go.Layout(
-        plot_bgcolor=colors['card_background'],
-        paper_bgcolor=colors['background'],
-        font=dict(family='"SF Pro Display", -apple-system, BlinkMacSystemFont, sans-serif', color=colors['text']),
-        margin=dict(l=40, r=40, t=40, b=40),
-        hovermode='closest',
-        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
-        xaxis=dict(showgrid=True, gridcolor='rgba(200,200,200,0.4)', zeroline=False),
-        yaxis=dict(showgrid=True, gridcolor='rgba(200,200,200,0.4)', zeroline=False),
-    )
+        cached = figure_cache.get_or_compute(
+            key, lambda: render_tab(button_id, selected_countries, year_range, store), version)
+    figure, description = cached
+    payload_stats.expect(button_id)
 
-    if button_id == 'tab-1':
-        fig = px.choropleth(filtered_df, locations="Entity", locationmode="country names",
-                            color="Internet_Users_Percent", hover_name="Entity", 
-                            animation_frame="Year", title="Географическое распределение пользователей интернета",
-                            color_continuous_scale=px.colors.sequential.Viridis)
-        description = "Визуализация плотности интернет-пользователей по странам."
-    elif button_id == 'tab-2':
-        fig = px.bar(filtered_df, x='Entity', y='Urban_Rate', color='Entity', 
-                     title='Сравнение городского и сельского населения')
-        description = "Столбчатая диаграмма, показывающая интернет-проникновение в городских и сельских районах."
-    elif button_id == 'tab-3':
-        fig = px.line(filtered_df, x='Entity', y='Avg_Speed_Mbps', color='Entity', 
-                      title='Сравнение скорости интернета')
-        description = "Линейный график, показывающий среднюю скорость интернета в разных странах."
-    elif button_id == 'tab-4':
-        fig = px.bar(filtered_df, x='Entity', y='Avg_Price_1GB', color='Entity', 
-                     title='Анализ затрат на интернет')
-        description = "Столбчатая диаграмма, показывающая среднюю стоимость 1 ГБ интернета в разных странах."
-    elif button_id == 'tab-5':
-        fig = px.line(filtered_df, x='Year', y='Internet_Users_Percent', color='Entity', 
-                      title='Цифровой разрыв')
-        description = "Этот график показывает разницу в доступе к интернету между разными странами с течением времени."
-    elif button_id == 'tab-6':
-        fig = px.line(filtered_df, x='Year', y='Internet_Users_Percent', color='Entity', 
-                      title='Темпы роста интернет-проникновения')
-        description = "Здесь отображены темпы роста интернет-проникновения в выбранных странах."
-    elif button_id == 'tab-7':
-        fig = go.Figure()
-        for country in filtered_df['Entity'].unique():
-            country_df = filtered_df[filtered_df['Entity'] == country]
-            fig.add_trace(go.Scatter(
-                x=country_df['Year'],
-                y=country_df['Cellular_Subscription'],
-                mode='lines',
-                name=f'{country} - Мобильная связь'
-            ))
-            fig.add_trace(go.Scatter(
-                x=country_df['Year'],
-                y=country_df['Broadband_Subscription'],
-                mode='lines',
-                name=f'{country} - ШПД',
-                line=dict(dash='dash')  # Здесь мы добавляем пунктирную линию для ШПД
-            ))
-        fig.update_layout(title='Сравнение мобильной связи и ШПД',
-                          xaxis_title='Год',
-                          yaxis_title='Подписки',
-                          layout=layout)
-        description = "Сравнение распространения мобильной связи и широкополосного интернета в выбранных странах. Линия для ШПД сделана пунктирной."
-
-    elif button_id == 'tab-8':
-        fig = px.line(filtered_df, x='Year', y='Broadband_Subscription', color='Entity', 
-                      title='Телекоммуникационные тренды')
-        description = "Общие тенденции в телекоммуникационном секторе для выбранных стран."
-    elif button_id == 'tab-9':
-        fig = px.histogram(filtered_df, x='Year', y='Internet_Users_Percent', color='Entity', 
-                           title='Рост пользователей интернета по годам', barmode='group')
-        description = "Гистограмма, отображающая рост числа интернет-пользователей по годам."
-    elif button_id == 'tab-10':
-        fig = px.pie(filtered_df, values='Cellular_Subscription', names='Entity', 
-                     title='Сравнение мобильной связи и ШПД по странам')
-        description = "Круговая диаграмма, показывающая соотношение мобильной связи и широкополосного доступа по странам."
-    
-    fig.update_layout(layout)
-    
+    # Та же вкладка уже на странице: отправляем только изменения
+    if payload.USE_PATCH and shown and shown.get('tab') == button_id and not spec.heavy:
+        return payload.figure_patch(figure, description), state, dash.no_update
+
+    return tab_children(figure, description), state, dash.no_update
+
+def tab_children(figure, description):
     return [
-        dcc.Graph(figure=fig),
+        dcc.Graph(figure=figure),
         html.P(description, style={'marginTop': '10px', 'fontSize': '14px', 'color': colors['secondary']})
     ]
 
+def render_tab(button_id, selected_countries, year_range, store, progress=None):
+    """
+    Строит график вкладки и готовит его к отправке.
+
+    Args:
+        progress (callable): Вызывается с номером выполненного этапа (1..jobs.STEPS).
+
+    Returns:
+        tuple: (figure, description) — словарь фигуры и описание.
+    """
+    step = progress or (lambda done: None)
+    figure, description = build_tab_figure(button_id, selected_countries, year_range, store)
+    step(1)
+    with instrumentation.span('compact', tab=button_id):
+        payload.compact_figure(figure)
+    step(2)
+    return figure, description
+
+if jobs.ENABLED:
+    @app.callback(
+        Output('heavy-content', 'children'),
+        Input('heavy-request', 'data'),
+        background=True,
+        manager=jobs.get_manager(),
+        progress=[Output('heavy-progress', 'value'), Output('heavy-progress', 'max')],
+        running=[(Output('heavy-progress', 'style'), {'width': '100%'}, {'display': 'none'})],
+        cancel=[Input(tab_id, 'n_clicks') for tab_id in tabs.TABS],
+        interval=500,
+        prevent_initial_call=True
+    )
+    def render_heavy_tab(set_progress, request):
+        """
+        Строит тяжелую вкладку в фоновом процессе. Задание отменяется,
+        если пользователь открыл другую вкладку.
+        """
+        if not request:
+            raise dash.exceptions.PreventUpdate
+        button_id, selected_countries, year_range = request['tab'], request['countries'], request['years']
+        store, version = get_snapshot()
+        key = make_key(button_id, selected_countries, year_range, (store.year_min, store.year_max))
+        figure, description = jobs.single_flight(repr((version, key)), lambda: render_tab(
+            button_id, selected_countries, year_range, store,
+            lambda done: set_progress((str(done), str(jobs.STEPS)))))
+        return tab_children(figure, description)
+
+@app.callback(
+    [Output('data-version', 'data'),
+     Output('refresh-status', 'children'),
+     Output('country-dropdown', 'options'),
+     Output('year-slider', 'min'),
+     Output('year-slider', 'max'),
+     Output('year-slider', 'marks'),
+     Output('summary-data', 'data')],
+    [Input('refresh-button', 'n_clicks')],
+    [State('data-version', 'data'),
+     State('country-dropdown', 'value')],
+    prevent_initial_call=True
+)
+def refresh_data(n_clicks, shown_version, selected_countries=None):
+    """
+    Переключает процесс на последний опубликованный снимок базы. Графики
+    и статистика на странице перестраиваются, только если версия данных
+    отличается от показанной.
+    """
+    store, version = reload_data()
+    if version == shown_version:
+        return dash.no_update, f"Данные актуальны (версия {version})", dash.no_update, \
+            dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    return version, f"Загружена версия данных {version}", country_options(store, version, selected_countries), \
+        store.year_min, store.year_max, year_marks(store), \
+        summary_dataset(store, version, selected_countries) if CLIENTSIDE_SUMMARY else dash.no_update
+
+def load_tab_data(spec, selected_countries, year_range, store=None):
+    """
+    Загружает только объявленные вкладкой столбцы выбранных стран и лет.
+    """
+    if spec.source == 'store':
+        if store is None:
+            store = get_store()
+        if spec.aggregate:
+            return store.aggregate(selected_countries, year_range, spec.aggregate)
+        return store.filter(selected_countries, year_range, spec.columns)
+    return TAB_SOURCES[spec.source](selected_countries, year_range, spec.columns)
+
+def build_tab_figure(button_id, selected_countries, year_range, store=None):
+    """
+    Строит график вкладки и возвращает его в виде словаря вместе с описанием.
+    """
+    # plotly импортируется при построении первого графика, а не при запуске
+    import plotly.graph_objs as go
+
+    spec = tabs.get_tab(button_id)
+    with instrumentation.span('filter', tab=button_id):
+        data = load_tab_data(spec, selected_countries, year_range, store)
+    with instrumentation.span('figure', tab=button_id):
+        fig = spec.build(data)
+
+        # Создаем стильный фон для графиков
+        layout = go.Layout(
+            plot_bgcolor=colors['card_background'],
+            paper_bgcolor=colors['background'],
+            font=dict(family='"SF Pro Display", -apple-system, BlinkMacSystemFont, sans-serif', color=colors['text']),
+            margin=dict(l=40, r=40, t=40, b=40),
+            hovermode='closest',
+            legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+            xaxis=dict(showgrid=True, gridcolor='rgba(200,200,200,0.4)', zeroline=False),
+            yaxis=dict(showgrid=True, gridcolor='rgba(200,200,200,0.4)', zeroline=False),
+        )
+        fig.update_layout(layout)
+        figure = fig.to_dict()
+
+    return figure, spec.description
+
+@server.route('/ready')
+def ready():
+    """
+    Проверка готовности процесса: режим данных, число строк и версия данных.
+    Dash строит макет при первом запросе, поэтому данные к этому моменту загружены.
+    """
+    store, version = get_snapshot()
+    return flask.jsonify(ready=True, mode=DATA_MODE, rows=len(store), version=version,
+                         published_version=published_version())
+
+# Число запросов колбэков к серверу по выходам колбэка; запросы
+# к незарегистрированным выходам считаются вместе под ключом 'unknown'
+callback_requests = Counter()
+_callback_requests_lock = threading.Lock()
+
+@server.before_request
+def count_callback_request():
+    if flask.request.method == 'POST' and flask.request.path.endswith('/_dash-update-component'):
+        body = flask.request.get_json(silent=True)
+        output = body.get('output') if isinstance(body, dict) else None
+        with _callback_requests_lock:
+            callback_requests[output if output in app.callback_map else 'unknown'] += 1
+
+@server.route('/callback-stats')
+def callback_stats():
+    """
+    Число запросов колбэков к серверу по выходам колбэка.
+    """
+    with _callback_requests_lock:
+        return flask.jsonify(dict(callback_requests))
+
+@server.route('/cache-stats')
+def cache_stats():
+    """
+    Счетчики кэша графиков для подбора его размера.
+    """
+    return flask.jsonify(figure_cache.stats())
+
+@server.route('/payload-stats')
+def payload_stats_view():
+    """
+    Объем и время сериализации графиков по вкладкам.
+    """
+    return flask.jsonify(payload_stats.stats())
+
+# Время и объем ответов всех HTTP-запросов, время запросов к DuckDB
+server.before_request(instrumentation.start_request)
+server.after_request(instrumentation.finish_request)
+
+@server.after_request
+def measure_figure_response(response):
+    """
+    Записывает объем ответа с графиком вкладки и время его сериализации Dash
+    (регистрируется после finish_request и выполняется раньше него, поэтому
+    этап попадает в лог медленных запросов).
+    """
+    measured = payload_stats.measure_response(response)
+    if measured is not None:
+        tab, _, seconds = measured
+        instrumentation.observe('dashboard_span_seconds', seconds, span='serialize', tab=tab)
+        flask.g.setdefault('spans', []).append(('serialize', seconds))
+    return response
+instrumentation.set_callback_outputs(app.callback_map)
+connector.add_query_observer(
+    lambda seconds: instrumentation.observe('dashboard_duckdb_query_seconds', seconds))
+
+# Счетчики пула DuckDB: (ключ метрик connector, имя метрики, тип, описание)
+DUCKDB_METRICS = [
+    ('queries', 'dashboard_duckdb_queries_total', 'counter', 'Число запросов к DuckDB'),
+    ('checkouts', 'dashboard_duckdb_checkouts_total', 'counter', 'Число выдач курсоров пула'),
+    ('timeouts', 'dashboard_duckdb_checkout_timeouts_total', 'counter', 'Число тайм-аутов ожидания курсора'),
+    ('checkout_wait_seconds_total', 'dashboard_duckdb_checkout_wait_seconds_total', 'counter',
+     'Суммарное время ожидания курсора, с'),
+    ('reopens', 'dashboard_duckdb_reopens_total', 'counter', 'Число переоткрытий базы'),
+    ('pool_size', 'dashboard_duckdb_pool_size', 'gauge', 'Размер пула курсоров'),
+]
+
+def collect_stats():
+    """
+    Переводит счетчики пула DuckDB, кэша графиков, объема графиков
+    и запросов колбэков в метрики для /metrics.
+    """
+    pool = connector.get_manager().metrics()
+    collected = [(name, kind, text, [({}, pool[key])]) for key, name, kind, text in DUCKDB_METRICS]
+
+    cache = figure_cache.stats()
+    collected += [
+        ('dashboard_figure_cache_lookups_total', 'counter', 'Обращения к кэшу графиков по результату',
+         [({'result': result}, cache[result]) for result in ('hits', 'disk_hits', 'misses')]),
+        ('dashboard_figure_cache_evictions_total', 'counter', 'Число вытесненных записей кэша графиков',
+         [({}, cache['evictions'])]),
+        ('dashboard_figure_cache_hit_ratio', 'gauge', 'Доля попаданий в кэш графиков', [({}, cache['hit_rate'])]),
+        ('dashboard_figure_cache_entries', 'gauge', 'Число записей кэша графиков', [({}, cache['entries'])]),
+        ('dashboard_figure_cache_bytes', 'gauge', 'Объем кэша графиков, байт', [({}, cache['bytes'])]),
+    ]
+
+    figures = payload_stats.stats()
+    collected += [
+        ('dashboard_figure_responses_total', 'counter', 'Число отправленных графиков по вкладкам',
+         [({'tab': tab}, stats['responses']) for tab, stats in figures.items()]),
+        ('dashboard_figure_bytes_total', 'counter', 'Объем отправленных графиков по вкладкам, байт',
+         [({'tab': tab}, stats['bytes_total']) for tab, stats in figures.items()]),
+        ('dashboard_figure_bytes_max', 'gauge', 'Наибольший объем графика по вкладкам, байт',
+         [({'tab': tab}, stats['bytes_max']) for tab, stats in figures.items()]),
+    ]
+
+    requests = Counter()
+    with _callback_requests_lock:
+        for output, count in callback_requests.items():
+            requests[instrumentation.callback_label(output)] += count
+    collected.append(('dashboard_callback_requests_total', 'counter', 'Число запросов колбэков по выходам',
+                      [({'output': output}, count) for output, count in requests.items()]))
+
+    if _ready.is_set():
+        store, version = get_snapshot()
+        collected += [
+            ('dashboard_data_version', 'gauge', 'Загруженная версия данных', [({}, version)]),
+            ('dashboard_data_rows', 'gauge', 'Число строк в хранилище', [({'mode': DATA_MODE}, len(store))]),
+        ]
+    return collected
+
+instrumentation.REGISTRY.register_collector(collect_stats)
+
+@server.route('/metrics')
+def metrics_view():
+    """
+    Метрики процесса в текстовом формате Prometheus.
+    """
+    return flask.Response(instrumentation.REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+if instrumentation.PROFILER_ENABLED:
+    profiler = instrumentation.SamplingProfiler()
+
+    @server.route('/profile', methods=['GET', 'POST'])
+    def profile_view():
+        """
+        Выборочный профилировщик (PROFILER=1). POST с action=start, stop
+        или reset управляет сбором стеков, GET возвращает стеки в свернутом
+        формате (limit — число самых частых стеков).
+        """
+        if flask.request.method == 'POST':
+            action = flask.request.values.get('action')
+            if action not in ('start', 'stop', 'reset'):
+                return flask.jsonify(error="action must be start, stop or reset"), 400
+            getattr(profiler, action)()
+            return flask.jsonify(profiler.stats())
+        limit = flask.request.args.get('limit', type=int)
+        return flask.Response(profiler.collapsed(limit), mimetype='text/plain; charset=utf-8')
+
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 8000))
+    warm()
     app.run_server(debug=False, host='0.0.0.0', port=port)
 
@@ -1,9 +1,36 @@
-import pandas as pd
+import argparse
+import hashlib
+import os
+import shutil
+import time
 import duckdb
 
+import columnar
+
+# Путь к базе данных
+DB_PATH = 'my.db'
+
+# Верхняя граница для No_of_Internet_Users (предел INTEGER)
+MAX_INTERNET_USERS = 2147483647
+
+# Соответствие столбцов исходного файла столбцам таблицы Final_cleaned
+SOURCE_COLUMNS = {
+    'Entity': 'Entity',
+    'Code': 'Code',
+    'Year': 'Year',
+    'Cellular Subscription': 'Cellular_Subscription',
+    'Internet Users(%)': 'Internet_Users_Percent',
+    'No. of Internet Users': 'No_of_Internet_Users',
+    'Broadband Subscription': 'Broadband_Subscription',
+}
+
+TABLE_COLUMNS = list(SOURCE_COLUMNS.values())
+
 # Функция для создания таблиц
-def create_tables():
-    conn = duckdb.connect('my.db')
+def create_tables(db_path=DB_PATH):
+    conn = duckdb.connect(db_path)
+    created = not conn.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = 'Final_cleaned'").fetchone()[0]
     conn.execute("""
     CREATE TABLE IF NOT EXISTS Final_cleaned (
         Entity VARCHAR,
@@ -15,61 +42,566 @@ def create_tables():
         Broadband_Subscription FLOAT
     )
     """)
+    # Служебные таблицы инкрементальной загрузки
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS etl_files (
+        path VARCHAR PRIMARY KEY,
+        content_hash VARCHAR,
+        loaded_at TIMESTAMP
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS etl_partitions (
+        Year BIGINT PRIMARY KEY,
+        fingerprint VARCHAR,
+        row_count BIGINT,
+        loaded_at TIMESTAMP
+    )
+    """)
+    # Отпечатки годов, записанные последней загрузкой каждого файла
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS etl_file_partitions (
+        path VARCHAR,
+        Year BIGINT,
+        fingerprint VARCHAR,
+        PRIMARY KEY (path, Year)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS etl_watermark (
+        version BIGINT,
+        loaded_at TIMESTAMP,
+        source VARCHAR,
+        mode VARCHAR,
+        rows_inserted BIGINT,
+        rows_updated BIGINT,
+        rows_deleted BIGINT,
+        partitions_changed BIGINT
+    )
+    """)
+    _create_summary_tables(conn)
     conn.close()
-    print("Таблица создана успешно")
+    if created:
+        print("Таблица создана успешно")
+
+# Агрегаты, не являющиеся странами, не участвуют в расчете глобальной медианы
+AGGREGATE_CODES = ('Region', 'OWID_WRL')
+
+# Сводные таблицы для etl.get_* и вкладок 5–8 дашборда
+SUMMARY_TABLES = ('digital_divide', 'internet_growth', 'mobile_vs_broadband')
+
+def _create_summary_tables(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS digital_divide (
+        Entity VARCHAR,
+        Code VARCHAR,
+        Year BIGINT,
+        Internet_Users_Percent FLOAT,
+        Global_Median_Percent FLOAT,
+        Gap_To_Median FLOAT
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS internet_growth (
+        Entity VARCHAR,
+        Code VARCHAR,
+        Year BIGINT,
+        Internet_Users_Percent FLOAT,
+        No_of_Internet_Users BIGINT,
+        Percent_Change_YoY FLOAT,
+        Users_Growth_YoY FLOAT
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS mobile_vs_broadband (
+        Entity VARCHAR,
+        Code VARCHAR,
+        Year BIGINT,
+        Cellular_Subscription FLOAT,
+        Broadband_Subscription FLOAT,
+        Mobile_To_Broadband_Ratio FLOAT
+    )
+    """)
+
+def refresh_summaries(conn, years=None):
+    """
+    Пересчитывает сводные таблицы digital_divide, internet_growth
+    и mobile_vs_broadband из Final_cleaned.
+
+    Для digital_divide и mobile_vs_broadband достаточно пересчитать
+    измененные годы, для internet_growth — также следующие за ними,
+    так как прирост считается относительно предыдущего года.
+
+    Args:
+        conn (duckdb.DuckDBPyConnection): Соединение с базой данных.
+        years (list): Измененные годы; None — полный пересчет.
+    """
+    _create_summary_tables(conn)
+    if years is None:
+        affected = growth_affected = "TRUE"
+        for table in SUMMARY_TABLES:
+            conn.execute(f"DELETE FROM {table}")
+    else:
+        years = sorted({int(year) for year in years})
+        if not years:
+            return
+        affected = f"Year IN ({', '.join(map(str, years))})"
+        growth_affected = f"Year IN ({', '.join(str(y) for year in years for y in (year, year + 1))})"
+        conn.execute(f"DELETE FROM digital_divide WHERE {affected}")
+        conn.execute(f"DELETE FROM internet_growth WHERE {growth_affected}")
+        conn.execute(f"DELETE FROM mobile_vs_broadband WHERE {affected}")
+
+    aggregates = ', '.join(f"'{code}'" for code in AGGREGATE_CODES)
+    conn.execute(f"""
+    INSERT INTO digital_divide
+    SELECT f.Entity, f.Code, f.Year, f.Internet_Users_Percent,
+           m.median_percent, f.Internet_Users_Percent - m.median_percent
+    FROM (SELECT * FROM Final_cleaned WHERE {affected}) f
+    LEFT JOIN (
+        SELECT Year, median(Internet_Users_Percent) AS median_percent
+        FROM Final_cleaned
+        WHERE {affected} AND coalesce(Code, '') NOT IN ({aggregates})
+        GROUP BY Year
+    ) m ON m.Year = f.Year
+    """)
+    conn.execute(f"""
+    INSERT INTO internet_growth
+    SELECT f.Entity, f.Code, f.Year, f.Internet_Users_Percent, f.No_of_Internet_Users,
+           f.Internet_Users_Percent - p.Internet_Users_Percent,
+           CASE WHEN p.No_of_Internet_Users > 0
+                THEN (f.No_of_Internet_Users - p.No_of_Internet_Users) * 100.0 / p.No_of_Internet_Users
+           END
+    FROM (SELECT * FROM Final_cleaned WHERE {growth_affected}) f
+    LEFT JOIN Final_cleaned p ON p.Entity = f.Entity AND p.Year = f.Year - 1
+    """)
+    conn.execute(f"""
+    INSERT INTO mobile_vs_broadband
+    SELECT Entity, Code, Year, Cellular_Subscription, Broadband_Subscription,
+           CASE WHEN Broadband_Subscription > 0 THEN Cellular_Subscription / Broadband_Subscription END
+    FROM Final_cleaned
+    WHERE {affected}
+    """)
+
+def _scan_expression(file_path):
+    """
+    Возвращает табличное выражение DuckDB для чтения исходного файла.
+
+    CSV читается целиком как VARCHAR, чтобы ошибки приведения типов
+    определялись для каждой строки отдельно, а не прерывали загрузку.
+    """
+    path = str(file_path).replace("'", "''")
+    if str(file_path).lower().endswith('.parquet'):
+        return f"read_parquet('{path}')"
+    return f"read_csv_auto('{path}', header=true, all_varchar=true)"
+
+def _stage_source(conn, file_path):
+    """
+    Читает исходный файл средствами DuckDB во временную таблицу staged_source
+    с приведенными типами и флагом ошибки для каждой строки.
+
+    Принимает как исходные названия столбцов ("Internet Users(%)"),
+    так и названия столбцов таблицы ("Internet_Users_Percent").
+    """
+    conn.execute("DROP TABLE IF EXISTS raw_source")
+    conn.execute(f"CREATE TEMP TABLE raw_source AS SELECT * FROM {_scan_expression(file_path)}")
+    available = {row[0] for row in conn.execute("DESCRIBE raw_source").fetchall()}
+
+    def source(column):
+        name = next(src for src, target in SOURCE_COLUMNS.items() if target == column)
+        if name not in available:
+            name = column
+        if name not in available:
+            raise ValueError(f"В файле {file_path} нет столбца '{column}'")
+        return f'"{name}"'
+
+    entity, code = source('Entity'), source('Code')
+    year = source('Year')
+    cellular = source('Cellular_Subscription')
+    internet = source('Internet_Users_Percent')
+    users = source('No_of_Internet_Users')
+    broadband = source('Broadband_Subscription')
+
+    conn.execute("DROP TABLE IF EXISTS staged_source")
+    conn.execute(f"""
+    CREATE TEMP TABLE staged_source AS
+    SELECT
+        *,
+        -- Ключ (Entity, Year) обязателен. Пустые значения показателей
+        -- загружаются как NULL, отклоняются только непустые значения,
+        -- которые не удалось привести к числу
+        CASE
+            WHEN Entity IS NULL THEN 'Entity: пустое значение'
+            WHEN Year IS NULL THEN 'Year: ' || coalesce(raw_year, 'NULL')
+            WHEN raw_cellular IS NOT NULL AND Cellular_Subscription IS NULL
+                THEN 'Cellular_Subscription: ' || raw_cellular
+            WHEN raw_internet IS NOT NULL AND Internet_Users_Percent IS NULL
+                THEN 'Internet_Users_Percent: ' || raw_internet
+            WHEN raw_users IS NOT NULL AND No_of_Internet_Users IS NULL
+                THEN 'No_of_Internet_Users: ' || raw_users
+            WHEN raw_broadband IS NOT NULL AND Broadband_Subscription IS NULL
+                THEN 'Broadband_Subscription: ' || raw_broadband
+        END AS reject_reason
+    FROM (
+        SELECT
+            nullif(trim(CAST({entity} AS VARCHAR)), '') AS Entity,
+            nullif(trim(CAST({code} AS VARCHAR)), '') AS Code,
+            -- Дробный год отклоняется, а не округляется
+            CASE WHEN TRY_CAST({year} AS DOUBLE) = floor(TRY_CAST({year} AS DOUBLE))
+                THEN TRY_CAST(TRY_CAST({year} AS DOUBLE) AS BIGINT) END AS Year,
+            TRY_CAST({cellular} AS DOUBLE) AS Cellular_Subscription,
+            TRY_CAST({internet} AS DOUBLE) AS Internet_Users_Percent,
+            -- least пропускает NULL, поэтому пустое значение проверяется отдельно
+            CASE WHEN TRY_CAST(TRY_CAST({users} AS DOUBLE) AS BIGINT) IS NOT NULL
+                THEN least(TRY_CAST(TRY_CAST({users} AS DOUBLE) AS BIGINT), {MAX_INTERNET_USERS})
+            END AS No_of_Internet_Users,
+            TRY_CAST({broadband} AS DOUBLE) AS Broadband_Subscription,
+            nullif(trim(CAST({year} AS VARCHAR)), '') AS raw_year,
+            nullif(trim(CAST({cellular} AS VARCHAR)), '') AS raw_cellular,
+            nullif(trim(CAST({internet} AS VARCHAR)), '') AS raw_internet,
+            nullif(trim(CAST({users} AS VARCHAR)), '') AS raw_users,
+            nullif(trim(CAST({broadband} AS VARCHAR)), '') AS raw_broadband
+        FROM raw_source
+    )
+    """)
+    conn.execute("DROP TABLE raw_source")
 
 # Функция для загрузки данных
-def load_data(file_path):
-    data = pd.read_csv(file_path)
-    print(f"Загруженные данные из {file_path}:")
-    print(data.head())  # Вывод первых строк данных для проверки
-
-    # Вывод типов данных DataFrame
-    print("Типы данных DataFrame до преобразования:")
-    print(data.dtypes)
-
-    # Приведение типов данных в DataFrame
-    data['Year'] = data['Year'].astype('int64')
-    data['Cellular Subscription'] = data['Cellular Subscription'].astype('float64')
-    data['Internet Users(%)'] = data['Internet Users(%)'].astype('float64')
-    data['No. of Internet Users'] = data['No. of Internet Users'].astype('int64')
-    data['Broadband Subscription'] = data['Broadband Subscription'].astype('float64')
-
-    # Убедимся, что названия столбцов совпадают с названиями в таблице
-    data = data.rename(columns={
-        "No. of Internet Users": "No_of_Internet_Users",
-        "Cellular Subscription": "Cellular_Subscription",
-        "Internet Users(%)": "Internet_Users_Percent",
-        "Broadband Subscription": "Broadband_Subscription"
-    })
-
-    # Убедимся, что порядок столбцов совпадает с порядком в таблице
-    data = data[['Entity', 'Code', 'Year', 'Cellular_Subscription', 'Internet_Users_Percent', 'No_of_Internet_Users', 'Broadband_Subscription']]
-
-    # Проверка значений, чтобы убедиться, что они находятся в допустимом диапазоне
-    data['No_of_Internet_Users'] = data['No_of_Internet_Users'].apply(lambda x: min(x, 2147483647))
-
-    print("Типы данных после преобразования:")
-    print(data.dtypes)
-
-    conn = duckdb.connect('my.db')
-    conn.register("temp_table", data)
-
-    # Вставка данных построчно
-    for _, row in data.iterrows():
-        try:
+def load_data(file_path, db_path=DB_PATH):
+    """
+    Загружает CSV или Parquet файл в таблицу Final_cleaned одним
+    set-based запросом INSERT ... SELECT.
+
+    Чтение, приведение типов и ограничение No_of_Internet_Users выполняются
+    внутри DuckDB векторно. Строки, которые не удалось привести к типам
+    таблицы, не вставляются и возвращаются в отчете.
+
+    Args:
+        file_path (str): Путь к файлу .csv или .parquet.
+        db_path (str): Путь к файлу базы данных.
+
+    Returns:
+        dict: Отчет о загрузке: loaded, rejected, rejected_rows (DataFrame),
+        seconds и rows_per_sec.
+    """
+    started = time.perf_counter()
+    conn = duckdb.connect(db_path)
+    try:
+        _stage_source(conn, file_path)
+        columns = ', '.join(TABLE_COLUMNS)
+        loaded = conn.execute("SELECT count(*) FROM staged_source WHERE reject_reason IS NULL").fetchone()[0]
+        conn.execute("BEGIN TRANSACTION")
+        conn.execute(f"""
+        INSERT INTO Final_cleaned ({columns})
+        SELECT {columns} FROM staged_source WHERE reject_reason IS NULL
+        """)
+        # После полной загрузки отпечатки партиций недействительны:
+        # следующая инкрементальная загрузка сверит все годы заново
+        conn.execute("DELETE FROM etl_partitions")
+        conn.execute("DELETE FROM etl_files")
+        conn.execute("DELETE FROM etl_file_partitions")
+        refresh_summaries(conn)
+        _record_version(conn, file_path, 'full', loaded, 0, 0, 0)
+        conn.execute("COMMIT")
+        rejected_rows = conn.execute("""
+        SELECT Entity, Code, raw_year AS Year, reject_reason
+        FROM staged_source WHERE reject_reason IS NOT NULL
+        """).df()
+        conn.execute("DROP TABLE staged_source")
+    finally:
+        conn.close()
+
+    seconds = time.perf_counter() - started
+    report = {
+        'loaded': int(loaded),
+        'rejected': len(rejected_rows),
+        'rejected_rows': rejected_rows,
+        'seconds': seconds,
+        'rows_per_sec': (loaded + len(rejected_rows)) / seconds if seconds else float('inf'),
+    }
+    print(f"Данные из {file_path} загружены в таблицу Final_cleaned: "
+          f"{report['loaded']} строк за {seconds:.2f} с ({report['rows_per_sec']:.0f} строк/с)")
+    if report['rejected']:
+        print(f"Отклонено строк: {report['rejected']}")
+        print(rejected_rows.head(10).to_string(index=False))
+    return report
+
+def file_fingerprint(file_path, chunk_size=1 << 20):
+    """
+    Возвращает SHA-256 содержимого файла.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _record_version(conn, source, mode, inserted, updated, deleted, partitions):
+    conn.execute("""
+    INSERT INTO etl_watermark
+    SELECT coalesce(max(version), 0) + 1, current_timestamp, ?, ?, ?, ?, ?, ?
+    FROM etl_watermark
+    """, [str(source), mode, inserted, updated, deleted, partitions])
+
+def load_incremental(file_path, db_path=DB_PATH, sync=False):
+    """
+    Инкрементально и идемпотентно загружает файл в таблицу Final_cleaned.
+
+    Ключ строки — (Entity, Year): Code не уникален для агрегированных
+    регионов ("Region"). Для каждого года вычисляется отпечаток партиции,
+    и сверяются только годы с новым отпечатком: новые и измененные строки
+    заменяются (upsert), остальные строки таблицы не затрагиваются, поэтому
+    файл может содержать только изменения. При sync=True файл считается
+    полным снимком своих годов: строки этих годов, которых нет в файле,
+    удаляются. Годы, отсутствующие в файле, не затрагиваются. Версия данных
+    в etl_watermark увеличивается, только если данные действительно изменились.
+
+    Если несколько файлов содержат одни и те же годы, в таблице остаются
+    строки файла, загруженного последним. Без sync файл не читается, если
+    его хэш не изменился с прошлой загрузки и ни один его год не был
+    с тех пор перезаписан другим файлом: повторная загрузка файла A после
+    файла B с теми же годами возвращает строки A.
+
+    Args:
+        file_path (str): Путь к файлу .csv или .parquet.
+        db_path (str): Путь к файлу базы данных.
+        sync (bool): Удалять строки годов файла, которых в нем нет.
+
+    Returns:
+        dict: Отчет о загрузке: skipped, inserted, updated, deleted,
+        partitions_changed, rejected, version и seconds.
+    """
+    started = time.perf_counter()
+    content_hash = file_fingerprint(file_path)
+    path = os.path.abspath(file_path)
+    report = {'skipped': False, 'inserted': 0, 'updated': 0, 'deleted': 0,
+              'partitions_changed': 0, 'rejected': 0}
+
+    conn = duckdb.connect(db_path)
+    try:
+        known = conn.execute("SELECT content_hash FROM etl_files WHERE path = ?", [path]).fetchone()
+        if not sync and known and known[0] == content_hash and not _overwritten_years(conn, path):
+            report['skipped'] = True
+        else:
+            _stage_source(conn, file_path)
+            report['rejected'] = conn.execute(
+                "SELECT count(*) FROM staged_source WHERE reject_reason IS NOT NULL").fetchone()[0]
+            _merge_staged(conn, file_path, report, path, sync)
+            conn.execute("DROP TABLE staged_source")
+            conn.execute("INSERT OR REPLACE INTO etl_files VALUES (?, ?, current_timestamp)", [path, content_hash])
+        report['version'] = conn.execute("SELECT coalesce(max(version), 0) FROM etl_watermark").fetchone()[0]
+    finally:
+        conn.close()
+
+    report['seconds'] = time.perf_counter() - started
+    if report['skipped']:
+        print(f"Файл {file_path} не изменился, загрузка пропущена")
+    else:
+        print(f"Инкрементальная загрузка {file_path}: годов изменено {report['partitions_changed']}, "
+              f"добавлено {report['inserted']}, обновлено {report['updated']}, удалено {report['deleted']}, "
+              f"отклонено {report['rejected']} за {report['seconds']:.2f} с")
+    return report
+
+def _overwritten_years(conn, path):
+    """
+    Число годов файла path, отпечаток которых в etl_partitions больше не совпадает
+    с записанным его последней загрузкой (год перезаписал другой файл).
+    """
+    return conn.execute("""
+    SELECT count(*) FROM etl_file_partitions f
+    LEFT JOIN etl_partitions p ON p.Year = f.Year
+    WHERE f.path = ? AND p.fingerprint IS DISTINCT FROM f.fingerprint
+    """, [path]).fetchone()[0]
+
+def _merge_staged(conn, source, report, path, sync=False):
+    """
+    Сливает staged_source с Final_cleaned по измененным партициям (годам)
+    и запоминает отпечатки годов файла path. При sync=True из измененных
+    годов удаляются строки, которых нет в файле.
+    """
+    columns = ', '.join(TABLE_COLUMNS)
+    # Приводим к типам таблицы, чтобы сравнение со старыми строками было точным
+    conn.execute("DROP TABLE IF EXISTS incoming")
+    conn.execute("""
+    CREATE TEMP TABLE incoming AS
+    SELECT
+        Entity, Code, Year,
+        CAST(Cellular_Subscription AS FLOAT) AS Cellular_Subscription,
+        CAST(Internet_Users_Percent AS FLOAT) AS Internet_Users_Percent,
+        No_of_Internet_Users,
+        CAST(Broadband_Subscription AS FLOAT) AS Broadband_Subscription
+    FROM staged_source
+    WHERE reject_reason IS NULL
+    QUALIFY row_number() OVER (PARTITION BY Entity, Year) = 1
+    """)
+    conn.execute("DROP TABLE IF EXISTS incoming_partitions")
+    conn.execute(f"""
+    CREATE TEMP TABLE incoming_partitions AS
+    SELECT Year, CAST(bit_xor(hash({columns})) AS VARCHAR) AS fingerprint, count(*) AS row_count
+    FROM incoming
+    GROUP BY Year
+    """)
+    conn.execute("DROP TABLE IF EXISTS changed_years")
+    # При синхронизации сверяется и год с прежним отпечатком, если в таблице
+    # другое число строк: их могли добавить загрузки только изменений
+    conn.execute(f"""
+    CREATE TEMP TABLE changed_years AS
+    SELECT i.Year
+    FROM incoming_partitions i
+    LEFT JOIN etl_partitions p ON p.Year = i.Year
+    LEFT JOIN (SELECT Year, count(*) AS row_count FROM Final_cleaned GROUP BY Year) t ON t.Year = i.Year
+    WHERE p.fingerprint IS DISTINCT FROM i.fingerprint
+       OR ({'TRUE' if sync else 'FALSE'} AND t.row_count IS DISTINCT FROM i.row_count)
+    """)
+    report['partitions_changed'] = conn.execute("SELECT count(*) FROM changed_years").fetchone()[0]
+    if report['partitions_changed']:
+        conn.execute("BEGIN TRANSACTION")
+        conn.execute("DROP TABLE IF EXISTS current_rows")
+        conn.execute(f"""
+        CREATE TEMP TABLE current_rows AS
+        SELECT {columns} FROM Final_cleaned WHERE Year IN (SELECT Year FROM changed_years)
+        """)
+        # Новые и измененные строки, а также ключи, продублированные прежними
+        # полными загрузками
+        conn.execute("DROP TABLE IF EXISTS delta")
+        conn.execute(f"""
+        CREATE TEMP TABLE delta AS
+        (SELECT {columns} FROM incoming WHERE Year IN (SELECT Year FROM changed_years)
+         EXCEPT
+         SELECT {columns} FROM current_rows)
+        UNION
+        SELECT i.* FROM incoming i
+        JOIN (SELECT Entity, Year FROM current_rows GROUP BY Entity, Year HAVING count(*) > 1) d
+          ON d.Entity = i.Entity AND d.Year = i.Year
+        """)
+        report['updated'] = conn.execute("""
+        SELECT count(*) FROM delta d
+        WHERE EXISTS (SELECT 1 FROM current_rows c WHERE c.Entity = d.Entity AND c.Year = d.Year)
+        """).fetchone()[0]
+        report['inserted'] = conn.execute("SELECT count(*) FROM delta").fetchone()[0] - report['updated']
+        conn.execute("""
+        DELETE FROM Final_cleaned f USING delta d
+        WHERE f.Entity = d.Entity AND f.Year = d.Year
+        """)
+        if sync:
+            report['deleted'] = conn.execute("""
+            SELECT count(*) FROM (SELECT DISTINCT Entity, Year FROM current_rows) c
+            WHERE NOT EXISTS (SELECT 1 FROM incoming i WHERE i.Entity = c.Entity AND i.Year = c.Year)
+            """).fetchone()[0]
             conn.execute("""
-            INSERT INTO Final_cleaned (Entity, Code, Year, Cellular_Subscription, Internet_Users_Percent, No_of_Internet_Users, Broadband_Subscription)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, row.tolist())
-        except duckdb.ConversionException as e:
-            print(f"Ошибка вставки строки: {row}")
-            print(f"Ошибка: {e}")
+            DELETE FROM Final_cleaned f
+            WHERE f.Year IN (SELECT Year FROM changed_years)
+              AND NOT EXISTS (SELECT 1 FROM incoming i WHERE i.Entity = f.Entity AND i.Year = f.Year)
+            """)
+        conn.execute(f"INSERT INTO Final_cleaned ({columns}) SELECT {columns} FROM delta")
+        conn.execute("""
+        INSERT OR REPLACE INTO etl_partitions
+        SELECT i.Year, i.fingerprint, i.row_count, current_timestamp
+        FROM incoming_partitions i JOIN changed_years c ON c.Year = i.Year
+        """)
+        refresh_summaries(conn, [row[0] for row in conn.execute("SELECT Year FROM changed_years").fetchall()])
+        if report['inserted'] or report['updated'] or report['deleted']:
+            _record_version(conn, source, 'sync' if sync else 'incremental', report['inserted'], report['updated'],
+                            report['deleted'], report['partitions_changed'])
+        conn.execute("COMMIT")
+        conn.execute("DROP TABLE current_rows")
+        conn.execute("DROP TABLE delta")
+    conn.execute("DELETE FROM etl_file_partitions WHERE path = ?", [path])
+    conn.execute("INSERT INTO etl_file_partitions SELECT ?, Year, fingerprint FROM incoming_partitions", [path])
+    conn.execute("DROP TABLE incoming")
+    conn.execute("DROP TABLE incoming_partitions")
+    conn.execute("DROP TABLE changed_years")
 
-    conn.close()
-    print("Данные успешно загружены в таблицу Final_cleaned")
+def version_path(db_path=DB_PATH):
+    """
+    Возвращает путь к файлу-указателю с версией опубликованного снимка базы.
+    """
+    return f"{db_path}.version"
+
+def read_published_version(db_path=DB_PATH):
+    """
+    Возвращает версию данных опубликованного снимка или None, если снимки
+    еще не публиковались.
+    """
+    try:
+        with open(version_path(db_path)) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _write_published_version(db_path, version):
+    temp_path = f"{version_path(db_path)}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(str(version))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, version_path(db_path))
+
+def publish_snapshot(file_path, db_path=DB_PATH, full=False, sync=False):
+    """
+    Загружает файл в новый снимок базы и атомарно подменяет им рабочую базу.
+
+    Снимок создается копией рабочего файла рядом с ним (db_path + '.next'),
+    загрузка идет в копию, затем файл переименовывается в db_path
+    и обновляется файл-указатель версии. Рядом записывается колоночная
+    копия версии (columnar.py). Процессы дашборда, открывшие
+    базу только для чтения, не мешают загрузке: открытые соединения
+    дочитывают старый файл, новые открывают новый. Загрузки в одну базу
+    не должны выполняться одновременно.
+
+    Args:
+        file_path (str): Путь к файлу .csv или .parquet.
+        db_path (str): Путь к рабочему файлу базы данных.
+        full (bool): Полная загрузка (load_data) вместо инкрементальной.
+        sync (bool): Инкрементальная загрузка файла как полного снимка его
+            годов (см. load_incremental).
+
+    Returns:
+        dict: Отчет загрузки, дополненный published и version.
+    """
+    next_path = f"{db_path}.next"
+    for leftover in (next_path, f"{next_path}.wal"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    if os.path.exists(db_path):
+        shutil.copyfile(db_path, next_path)
+        if os.path.exists(f"{db_path}.wal"):
+            shutil.copyfile(f"{db_path}.wal", f"{next_path}.wal")
+
+    create_tables(next_path)
+    report = load_data(file_path, next_path) if full else load_incremental(file_path, next_path, sync)
+    if report.get('skipped'):
+        for leftover in (next_path, f"{next_path}.wal"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        report['published'] = False
+        print(f"Снимок базы {db_path} без изменений, публикация пропущена")
+        return report
+
+    conn = duckdb.connect(next_path)
+    try:
+        version = conn.execute("SELECT coalesce(max(version), 0) FROM etl_watermark").fetchone()[0]
+        conn.execute("CHECKPOINT")
+        # Колоночная копия версии записывается до публикации, чтобы процессы,
+        # увидевшие новую версию, сразу нашли ее файлы
+        columnar.export_snapshot(conn, columnar.snapshot_dir(db_path, version))
+    finally:
+        conn.close()
+    os.replace(next_path, db_path)
+    _write_published_version(db_path, version)
+    columnar.remove_old_snapshots(db_path)
+    report['published'] = True
+    report['version'] = version
+    print(f"Снимок базы {db_path} опубликован, версия данных {version}")
+    return report
 
-# Выполнение функций
-create_tables()
-load_data('source/Final_cleaned.csv')
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Загрузка данных в базу DuckDB')
+    parser.add_argument('file', nargs='?', default='source/Final_cleaned.csv')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--full', action='store_true',
+                        help='Дописать весь файл без сверки с уже загруженными данными')
+    parser.add_argument('--sync', action='store_true',
+                        help='Считать файл полным снимком его годов: удалить строки этих годов, которых нет в файле')
+    args = parser.parse_args()
 
+    publish_snapshot(args.file, args.db, full=args.full, sync=args.sync)
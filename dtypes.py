@@ -0,0 +1,111 @@
+"""
+Этот модуль приводит DataFrame, прочитанные из DuckDB, к компактным типам.
+
+DuckDB отдает строки как объекты Python, а BIGINT — как int64. Для столбцов
+из COLUMN_DTYPES тип задан схемой: Entity и Code — category, Year — int16,
+показатели — float32, число пользователей — Int32 с поддержкой пропусков
+(значения ограничены при загрузке, см. ddl.MAX_INTERNET_USERS). Тип
+остальных столбцов подбирается по значениям: строки с небольшим числом
+различных значений — category, целые — наименьший подходящий тип,
+float64 — float32, если относительная погрешность не превышает FLOAT32_RTOL.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+# Типы столбцов таблиц дашборда
+COLUMN_DTYPES = {
+    'Entity': 'category',
+    'Code': 'category',
+    'Year': 'int16',
+    'Cellular_Subscription': 'float32',
+    'Internet_Users_Percent': 'float32',
+    'No_of_Internet_Users': 'Int32',
+    'Broadband_Subscription': 'float32',
+}
+
+# Допустимая относительная погрешность при переходе с float64 на float32
+FLOAT32_RTOL = 1e-6
+
+# Строковый столбец становится category, если различных значений не больше этой доли строк
+CATEGORY_MAX_RATIO = 0.5
+
+def _fits_integer(series, dtype):
+    info = np.iinfo(np.dtype(dtype.lower()))
+    values = series.dropna()
+    return values.empty or (values.min() >= info.min and values.max() <= info.max)
+
+def _fits_float32(series):
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    finite = values[np.isfinite(values)]
+    if finite.size and np.abs(finite).max() > np.finfo(np.float32).max:
+        return False
+    return bool(np.allclose(finite, finite.astype(np.float32), rtol=FLOAT32_RTOL, atol=0))
+
+def _schema_dtype(series, dtype):
+    if dtype == 'category':
+        return dtype
+    if dtype.lower().startswith('int'):
+        if not pd.api.types.is_numeric_dtype(series) or not _fits_integer(series, dtype):
+            return None
+        # Целые с пропусками хранятся в типе с поддержкой пропусков (Int16, Int32)
+        return dtype.capitalize() if series.isna().any() else dtype
+    if dtype == 'float32':
+        return dtype if pd.api.types.is_numeric_dtype(series) and _fits_float32(series) else None
+    return dtype
+
+def _inferred_dtype(series):
+    if series.dtype == object:
+        if len(series) and series.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(series):
+            return 'category'
+        return None
+    if pd.api.types.is_integer_dtype(series):
+        for dtype in ('int8', 'int16', 'int32'):
+            if _fits_integer(series, dtype):
+                return dtype.capitalize() if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) else dtype
+        return None
+    if series.dtype == np.float64 and _fits_float32(series):
+        return 'float32'
+    return None
+
+def optimize_frame(df, schema=COLUMN_DTYPES):
+    """
+    Возвращает копию DataFrame с компактными типами столбцов.
+
+    Args:
+        df (pd.DataFrame): Данные, прочитанные из базы.
+        schema (dict): Столбец -> тип; для остальных столбцов тип подбирается.
+
+    Returns:
+        pd.DataFrame: Данные с компактными типами.
+    """
+    types = {}
+    for column in df.columns:
+        series = df[column]
+        if column in schema:
+            dtype = _schema_dtype(series, schema[column])
+            if dtype is None:
+                logging.warning(f"Column '{column}' does not fit {schema[column]}, keeping {series.dtype}")
+        else:
+            dtype = _inferred_dtype(series)
+        if dtype is not None and str(series.dtype) != dtype:
+            types[column] = dtype
+    return df.astype(types) if types else df
+
+def memory_report(before, after):
+    """
+    Сравнивает объем DataFrame в памяти до и после optimize_frame.
+
+    Returns:
+        dict: before_bytes, after_bytes, ratio и типы столбцов после приведения.
+    """
+    before_bytes = int(before.memory_usage(deep=True).sum())
+    after_bytes = int(after.memory_usage(deep=True).sum())
+    return {
+        'before_bytes': before_bytes,
+        'after_bytes': after_bytes,
+        'ratio': before_bytes / after_bytes if after_bytes else float('inf'),
+        'dtypes': {column: str(dtype) for column, dtype in after.dtypes.items()},
+    }
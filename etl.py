@@ -1,42 +1,140 @@
 """
 Этот модуль отвечает за извлечение данных из базы данных и создание DataFrame для визуализации.
+
+DataFrame возвращаются в компактных типах (см. dtypes.py): Entity и Code —
+category, Year — int16, показатели — float32.
 """
 
+import os
+
+import duckdb
 import pandas as pd
-from connector import get_connection
 
-def get_digital_divide_data():
+import columnar
+import connector
+from connector import query_df
+from dtypes import optimize_frame
+from metrics import MetricsCache
+
+# Производные показатели (metrics.py) текущей версии данных
+_metrics_cache = MetricsCache()
+
+def _query_summary(table, countries=None, year_range=None, columns=None):
     """
-    Извлекает данные о цифровом разрыве.
+    Читает сводную таблицу с необязательными фильтрами по странам и годам
+    и выбором столбцов.
     """
-    conn = get_connection()
-    df = conn.execute("SELECT * FROM digital_divide").df()
-    conn.close()
-    return df
+    conditions, params = [], []
+    if countries is not None:
+        conditions.append("list_contains(?, Entity)")
+        params.append(list(countries))
+    if year_range is not None:
+        conditions.append("Year BETWEEN ? AND ?")
+        params.extend([int(year_range[0]), int(year_range[1])])
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    select = "*" if columns is None else ', '.join(dict.fromkeys(['Entity', 'Year'] + list(columns)))
+    return optimize_frame(query_df(f"SELECT {select} FROM {table}{where} ORDER BY Entity, Year", params))
 
-def get_internet_growth_data():
+def get_digital_divide_data(countries=None, year_range=None, columns=None):
     """
-    Извлекает данные о темпах роста интернет-проникновения.
+    Извлекает данные о цифровом разрыве: процент интернет-пользователей
+    и отставание от глобальной медианы по годам.
+
+    Args:
+        countries (list): Список стран; None — все страны.
+        year_range (list): Диапазон лет [начало, конец]; None — все годы.
+        columns (list): Нужные столбцы помимо Entity и Year; None — все.
+    """
+    return _query_summary('digital_divide', countries, year_range, columns)
+
+def get_internet_growth_data(countries=None, year_range=None, columns=None):
     """
-    conn = get_connection()
-    df = conn.execute("SELECT * FROM internet_growth").df()
-    conn.close()
-    return df
+    Извлекает данные о темпах роста интернет-проникновения (прирост к предыдущему году).
 
-def get_mobile_vs_broadband_data():
+    Args:
+        countries (list): Список стран; None — все страны.
+        year_range (list): Диапазон лет [начало, конец]; None — все годы.
+        columns (list): Нужные столбцы помимо Entity и Year; None — все.
+    """
+    return _query_summary('internet_growth', countries, year_range, columns)
+
+def get_mobile_vs_broadband_data(countries=None, year_range=None, columns=None):
     """
     Извлекает данные для сравнения развития мобильной связи и широкополосного интернета.
+
+    Args:
+        countries (list): Список стран; None — все страны.
+        year_range (list): Диапазон лет [начало, конец]; None — все годы.
+        columns (list): Нужные столбцы помимо Entity и Year; None — все.
+    """
+    return _query_summary('mobile_vs_broadband', countries, year_range, columns)
+
+def get_derived_metrics(countries=None, year_range=None, columns=None):
+    """
+    Извлекает производные показатели (metrics.py): темпы роста, CAGR,
+    отставание от медианы, индекс Джини, отношение мобильных подписок
+    к широкополосным. Показатели считаются по всей Final_cleaned один раз
+    на версию данных.
+
+    Args:
+        countries (list): Список стран; None — все страны.
+        year_range (list): Диапазон лет [начало, конец]; None — все годы.
+        columns (list): Нужные столбцы помимо Entity и Year; None — все.
+    """
+    store = _metrics_cache.get(get_data_version()[0], get_telecom_trends_data)
+    if countries is None:
+        countries = store.entity_names()
+    if year_range is None:
+        year_range = [store.year_min, store.year_max]
+    return store.filter(countries, year_range, columns)
+
+def get_table_columns(table):
+    """
+    Возвращает множество столбцов таблицы; пустое, если таблицы нет.
     """
-    conn = get_connection()
-    df = conn.execute("SELECT * FROM mobile_vs_broadband").df()
-    conn.close()
-    return df
+    df = query_df("SELECT column_name FROM information_schema.columns WHERE table_name = ?", [table])
+    return set(df['column_name'])
 
 def get_telecom_trends_data():
     """
     Извлекает общие данные о телекоммуникационных трендах для прогнозирования.
     """
-    conn = get_connection()
-    df = conn.execute("SELECT * FROM Final_cleaned").df()
-    conn.close()
-    return df
\ No newline at end of file
+    return optimize_frame(query_df("SELECT * FROM Final_cleaned"))
+
+def get_data_version():
+    """
+    Возвращает текущую версию данных из таблицы etl_watermark.
+
+    Версия увеличивается только тогда, когда загрузка действительно изменила
+    Final_cleaned, поэтому по ней можно понять, нужно ли обновлять дашборд.
+
+    Returns:
+        tuple: (version, loaded_at); (0, None), если загрузок еще не было.
+    """
+    try:
+        df = query_df("SELECT version, loaded_at FROM etl_watermark ORDER BY version DESC LIMIT 1")
+    except duckdb.CatalogException:
+        return (0, None)
+    if df.empty:
+        return (0, None)
+    return int(df['version'].iloc[0]), df['loaded_at'].iloc[0]
+
+def get_final_cleaned_data(countries=None, year_range=None, columns=None):
+    """
+    Извлекает строки Final_cleaned. Если для текущей версии данных есть
+    колоночная копия (columnar.py), читаются только Parquet-партиции нужных
+    лет, иначе выполняется запрос к базе.
+
+    Args:
+        countries (list): Список стран; None — все страны.
+        year_range (list): Диапазон лет [начало, конец]; None — все годы.
+        columns (list): Нужные столбцы помимо Entity и Year; None — все.
+    """
+    directory = columnar.snapshot_dir(connector.get_manager().db_path, get_data_version()[0])
+    if os.path.isdir(directory):
+        data = columnar.read_partitions(directory, countries, year_range, columns).to_pandas()
+        # Словари Parquet содержат все страны партиции, а не только выбранные
+        for column in data.select_dtypes('category'):
+            data[column] = data[column].cat.remove_unused_categories()
+        return optimize_frame(data)
+    return _query_summary('Final_cleaned', countries, year_range, columns)
@@ -0,0 +1,66 @@
+"""
+Этот модуль содержит функции построения графиков вкладок дашборда.
+
+Модуль импортируется при первом открытии вкладки (см. tabs.py).
+Каждая функция получает DataFrame только с объявленными для вкладки
+столбцами и возвращает plotly.graph_objs.Figure.
+"""
+
+import plotly.express as px
+
+def internet_map(data):
+    return px.choropleth(data, locations="Entity", locationmode="country names",
+                         color="Internet_Users_Percent", hover_name="Entity",
+                         animation_frame="Year", title="Географическое распределение пользователей интернета",
+                         color_continuous_scale=px.colors.sequential.Viridis)
+
+def urban_rate(data):
+    return px.bar(data, x='Entity', y='Urban_Rate', color='Entity',
+                  title='Сравнение городского и сельского населения')
+
+def internet_speed(data):
+    return px.line(data, x='Entity', y='Avg_Speed_Mbps', color='Entity',
+                   title='Сравнение скорости интернета')
+
+def internet_price(data):
+    return px.bar(data, x='Entity', y='Avg_Price_1GB', color='Entity',
+                  title='Анализ затрат на интернет')
+
+def digital_divide(data):
+    fig = px.line(data, x='Year', y='Gap_To_Median', color='Entity',
+                  hover_data=['Internet_Users_Percent', 'Global_Median_Percent', 'Internet_Gini'],
+                  title='Цифровой разрыв')
+    fig.add_hline(y=0, line_dash='dot', line_color='gray')  # глобальная медиана
+    return fig
+
+def internet_growth(data):
+    return px.line(data, x='Year', y='Percent_Change_YoY', color='Entity',
+                   hover_data=['Internet_Users_Percent', 'Users_Growth_YoY', 'Users_CAGR'],
+                   title='Темпы роста интернет-проникновения')
+
+def mobile_vs_broadband(data):
+    # Оба показателя в длинном формате: одна линия на страну и показатель
+    long = data.melt(id_vars=['Entity', 'Year', 'Mobile_To_Broadband_Ratio'],
+                     value_vars=['Cellular_Subscription', 'Broadband_Subscription'],
+                     var_name='Показатель', value_name='Подписки')
+    long['Показатель'] = long['Показатель'].map({'Cellular_Subscription': 'Мобильная связь',
+                                                 'Broadband_Subscription': 'ШПД'})
+    fig = px.line(long, x='Year', y='Подписки', color='Entity', line_dash='Показатель',
+                  line_dash_map={'Мобильная связь': 'solid', 'ШПД': 'dash'},
+                  hover_data=['Mobile_To_Broadband_Ratio'])
+    fig.update_layout(title='Сравнение мобильной связи и ШПД',
+                      xaxis_title='Год',
+                      yaxis_title='Подписки')
+    return fig
+
+def telecom_trends(data):
+    return px.line(data, x='Year', y='Broadband_Subscription', color='Entity',
+                   title='Телекоммуникационные тренды')
+
+def internet_users_by_year(data):
+    return px.histogram(data, x='Year', y='Internet_Users_Percent', color='Entity',
+                        title='Рост пользователей интернета по годам', barmode='group')
+
+def mobile_share(data):
+    return px.pie(data, values='Cellular_Subscription', names='Entity',
+                  title='Сравнение мобильной связи и ШПД по странам')
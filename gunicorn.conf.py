@@ -1,6 +1,53 @@
 import multiprocessing
+import os
 
-workers = 1  # Для начала используем только одного работника
-threads = 2
-timeout = 120
-bind = "0.0.0.0:$PORT"
\ No newline at end of file
+# Колбэки дашборда в основном заняты pandas и Plotly и держат GIL, поэтому
+# параллельность дают процессы: по воркеру на ядро. Потоки gthread
+# перекрывают ожидание DuckDB и сети и отдают быстрые ответы (кэш графиков,
+# статика) без очереди за тяжелыми вкладками
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+
+# Воркер перезапускается после max_requests запросов (со случайным разбросом,
+# чтобы воркеры не перезапускались одновременно) — ограничивает рост памяти
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+# Приложение импортируется и загружает данные один раз в мастере,
+# воркеры получают их после fork уже готовыми, в том числе после перезапуска
+preload_app = True
+
+# Данные читаются из отображенного в память файла Arrow версии данных
+# (columnar.py): страницы файла общие для всех воркеров, и число воркеров
+# не умножает объем данных в памяти
+os.environ.setdefault('STORAGE_FORMAT', 'arrow')
+
+def when_ready(server):
+    import connector
+    import dashboard
+
+    dashboard.warm()
+    # Соединения DuckDB мастера не наследуются воркерами: после fork
+    # менеджер соединений открывает базу заново
+    connector.get_manager().reopen()
+
+def pre_fork(server, worker):
+    import connector
+    import dashboard
+
+    # Если с запуска опубликована новая версия данных, мастер переключается
+    # на нее до fork, и перезапущенный воркер не загружает ее заново
+    snapshot = dashboard.get_snapshot()
+    if snapshot is not getattr(server, 'dashboard_snapshot', snapshot):
+        connector.get_manager().reopen()
+    server.dashboard_snapshot = snapshot
+
+def post_worker_init(worker):
+    import dashboard
+
+    dashboard.warm()
@@ -1,3 +0,0 @@
-workers = 1
-threads = 2
-timeout = 120
\ No newline at end of file
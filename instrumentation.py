@@ -0,0 +1,312 @@
+"""
+Этот модуль содержит метрики производительности дашборда.
+
+Registry хранит гистограммы и счетчики процесса и отдает их в текстовом
+формате Prometheus (адрес /metrics, см. dashboard.py). Счетчики других
+модулей (пул DuckDB, кэш графиков, объем графиков) подключаются
+функциями-сборщиками и читаются в момент запроса метрик.
+
+span() измеряет этап обработки запроса (фильтрация, построение графика,
+сериализация) с метками, например номером вкладки. Этапы текущего
+HTTP-запроса запоминаются, и медленный запрос выводится в лог с разбивкой
+по этапам.
+
+SamplingProfiler — выборочный профилировщик: фоновый поток с заданным
+интервалом снимает стеки всех потоков процесса и считает одинаковые стеки.
+Результат выдается в свернутом формате (collapsed stacks), который
+принимают flamegraph.pl и speedscope.
+
+Метрики собираются в каждом процессе отдельно: под gunicorn каждый
+воркер отдает свои значения. Фоновые колбэки (jobs.py) выполняются
+в отдельных процессах, их этапы сюда не попадают.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import flask
+
+# Настройки по умолчанию, переопределяются переменными окружения
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 1.0))
+PROFILER_ENABLED = os.environ.get('PROFILER', '0') == '1'
+PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL_MS', 5)) / 1000
+
+# Границы корзин гистограмм: время, с, и объем, байт
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float) and math.isnan(value):
+        return 'NaN'
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Registry:
+    """
+    Гистограммы и счетчики процесса в формате Prometheus.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+
+    def histogram(self, name, help_text, buckets=TIME_BUCKETS):
+        """
+        Объявляет гистограмму с границами корзин buckets.
+        """
+        with self._lock:
+            self._metrics.setdefault(name, {'type': 'histogram', 'help': help_text,
+                                            'buckets': tuple(buckets), 'series': {}})
+
+    def counter(self, name, help_text):
+        """
+        Объявляет счетчик.
+        """
+        with self._lock:
+            self._metrics.setdefault(name, {'type': 'counter', 'help': help_text, 'series': {}})
+
+    def observe(self, name, value, **labels):
+        """
+        Записывает значение в гистограмму.
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            metric = self._metrics[name]
+            series = metric['series'].get(key)
+            if series is None:
+                series = metric['series'][key] = {'buckets': [0] * len(metric['buckets']), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(metric['buckets']):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def inc(self, name, value=1, **labels):
+        """
+        Увеличивает счетчик.
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._metrics[name]['series']
+            series[key] = series.get(key, 0) + value
+
+    def register_collector(self, collect):
+        """
+        Подключает функцию-сборщик. Она вызывается при каждом запросе метрик
+        и возвращает список (имя, тип, описание, [(метки, значение)]),
+        где тип — 'counter' или 'gauge', метки — словарь.
+        """
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        """
+        Возвращает все метрики в текстовом формате Prometheus.
+        """
+        lines = []
+        with self._lock:
+            metrics = [(name, dict(metric, series=dict(metric['series']))) for name, metric in self._metrics.items()]
+            histograms = {name: {key: dict(series, buckets=list(series['buckets']))
+                                 for key, series in metric['series'].items()}
+                          for name, metric in metrics if metric['type'] == 'histogram'}
+            collectors = list(self._collectors)
+        for name, metric in metrics:
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            if metric['type'] == 'counter':
+                for key, value in sorted(metric['series'].items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+                continue
+            for key, series in sorted(histograms[name].items()):
+                for bound, count in zip(metric['buckets'], series['buckets']):
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', _format_value(float(bound))),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series['count']}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(series['sum'])}")
+                lines.append(f"{name}_count{_format_labels(key)} {series['count']}")
+        for collect in collectors:
+            for name, metric_type, help_text, samples in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+# Метрики процесса
+REGISTRY = Registry()
+REGISTRY.histogram('dashboard_span_seconds', 'Время этапов обработки запроса по этапам и вкладкам, с')
+REGISTRY.histogram('dashboard_http_request_seconds', 'Время обработки HTTP-запросов, с')
+REGISTRY.histogram('dashboard_http_response_bytes', 'Объем ответов HTTP, байт', SIZE_BUCKETS)
+REGISTRY.histogram('dashboard_duckdb_query_seconds', 'Время выполнения запросов к DuckDB, с')
+REGISTRY.counter('dashboard_slow_requests_total', 'Число запросов дольше SLOW_REQUEST_SECONDS')
+
+def observe(name, value, **labels):
+    """
+    Записывает значение в гистограмму REGISTRY.
+    """
+    REGISTRY.observe(name, value, **labels)
+
+@contextmanager
+def span(name, **labels):
+    """
+    Измеряет этап обработки запроса и записывает время в dashboard_span_seconds.
+    Внутри HTTP-запроса этап также запоминается для лога медленных запросов.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        REGISTRY.observe('dashboard_span_seconds', seconds, span=name, **labels)
+        if flask.has_request_context():
+            flask.g.setdefault('spans', []).append((name, seconds))
+
+# Выходы зарегистрированных колбэков Dash (app.callback_map, см. set_callback_outputs)
+_callback_outputs = {}
+
+def set_callback_outputs(outputs):
+    """
+    Задает выходы зарегистрированных колбэков Dash, например app.callback_map.
+    Метку маршрута по выходу получают только они: запросы с другими выходами
+    записываются под меткой 'unknown', чтобы клиент не мог создать
+    произвольное число рядов метрик.
+    """
+    global _callback_outputs
+    _callback_outputs = outputs
+
+def callback_label(output):
+    """
+    Метка колбэка Dash по его выходу: первый выход, например
+    'tab-content.children', или 'unknown' для незарегистрированного выхода.
+    """
+    if not isinstance(output, str) or output not in _callback_outputs:
+        return 'unknown'
+    return output.strip('.').split('...')[0].split('@')[0] or 'unknown'
+
+def request_route():
+    """
+    Метка маршрута текущего запроса: шаблон правила Flask, а для колбэков
+    Dash — метка колбэка (callback_label).
+    """
+    request = flask.request
+    if request.path.endswith('/_dash-update-component'):
+        body = request.get_json(silent=True)
+        return callback_label(body.get('output') if isinstance(body, dict) else None)
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def start_request():
+    """
+    Отмечает начало HTTP-запроса (before_request).
+    """
+    flask.g.instrumentation_started = time.perf_counter()
+
+def finish_request(response):
+    """
+    Записывает время и объем ответа HTTP-запроса (after_request) и выводит
+    в лог медленные запросы с разбивкой по этапам.
+    """
+    started = flask.g.get('instrumentation_started')
+    if started is None:
+        return response
+    seconds = time.perf_counter() - started
+    route = request_route()
+    labels = {'route': route, 'method': flask.request.method, 'status': str(response.status_code)}
+    REGISTRY.observe('dashboard_http_request_seconds', seconds, **labels)
+    if not response.direct_passthrough and not response.is_streamed:
+        REGISTRY.observe('dashboard_http_response_bytes', len(response.get_data()), route=route)
+    if seconds >= SLOW_REQUEST_SECONDS:
+        REGISTRY.inc('dashboard_slow_requests_total', route=route)
+        spans = ' '.join(f"{name}={value:.3f}s" for name, value in flask.g.get('spans', []))
+        flask.current_app.logger.warning(
+            f"Slow request {flask.request.method} {route}: {seconds:.3f}s {spans}".rstrip())
+    return response
+
+class SamplingProfiler:
+    """
+    Выборочный профилировщик стеков всех потоков процесса.
+
+    Args:
+        interval (float): Интервал между снимками стеков, с.
+    """
+
+    def __init__(self, interval=PROFILER_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stacks = Counter()
+        self._samples = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Запускает сбор стеков; повторный вызов ничего не делает.
+        """
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Останавливает сбор стеков; собранные стеки сохраняются.
+        """
+        thread = self._thread
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self._samples += 1
+
+    def collapsed(self, limit=None):
+        """
+        Возвращает стеки в свернутом формате: "кадр;кадр;... число" по строке на стек.
+        """
+        with self._lock:
+            return ''.join(f"{stack} {count}\n" for stack, count in self._stacks.most_common(limit))
+
+    def stats(self):
+        with self._lock:
+            return {'running': self.running, 'samples': self._samples, 'stacks': len(self._stacks),
+                    'interval_seconds': self.interval}
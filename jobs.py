@@ -0,0 +1,114 @@
+"""
+Этот модуль содержит фоновое построение тяжелых вкладок дашборда.
+
+Тяжелые вкладки (TabSpec.heavy) при большой выборке строятся фоновыми
+колбэками Dash в отдельных процессах (DiskcacheManager), а не в потоке
+воркера gunicorn. Результаты заданий хранятся в общем дисковом кэше:
+одинаковые задания, запущенные одновременно в разных процессах, выполняются
+один раз — остальные ждут первое и берут его результат.
+
+Фоновые колбэки требуют пакетов diskcache, multiprocess и psutil
+(pip install "dash[diskcache]"). Без них или при BACKGROUND_CALLBACKS=0
+тяжелые вкладки строятся синхронно, как остальные.
+"""
+
+import os
+import tempfile
+import time
+
+try:
+    import diskcache
+    import multiprocess  # noqa: F401  # нужен DiskcacheManager для запуска процессов
+    import psutil
+    from dash import DiskcacheManager
+except ImportError:  # фоновые колбэки необязательны
+    diskcache = None
+
+# Настройки по умолчанию, переопределяются переменными окружения
+CACHE_DIR = os.environ.get('BACKGROUND_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'dashboard-jobs'))
+MIN_ROWS = int(os.environ.get('BACKGROUND_MIN_ROWS', 1000))
+RESULT_EXPIRE = int(os.environ.get('BACKGROUND_RESULT_EXPIRE', 3600))
+ENABLED = diskcache is not None and os.environ.get('BACKGROUND_CALLBACKS', '1') == '1'
+
+# Сколько секунд задание может держать блокировку ключа
+LOCK_EXPIRE = 300
+
+# Этапы построения вкладки для индикатора прогресса: построение графика
+# и сжатие фигуры (dashboard.render_tab); объем ответа измеряется уже
+# после отправки графика и отдельным этапом не считается
+STEPS = 2
+
+_cache = None
+_manager = None
+
+def get_cache():
+    """
+    Возвращает общий для процессов дисковый кэш заданий.
+    """
+    global _cache
+    if _cache is None:
+        _cache = diskcache.Cache(CACHE_DIR)
+    return _cache
+
+def get_manager():
+    """
+    Возвращает менеджер фоновых колбэков Dash или None, если они выключены.
+    """
+    global _manager
+    if ENABLED and _manager is None:
+        _manager = DiskcacheManager(get_cache(), expire=RESULT_EXPIRE)
+    return _manager
+
+def is_heavy(countries, year_range):
+    """
+    Оценивает размер выборки: строить ли вкладку в фоне.
+    """
+    rows = len(countries or []) * (int(year_range[1]) - int(year_range[0]) + 1)
+    return ENABLED and rows >= MIN_ROWS
+
+def get_result(key):
+    """
+    Возвращает готовый результат задания или None.
+    """
+    return get_cache().get(('result', key))
+
+def _alive(pid):
+    try:
+        return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+def _acquire(cache, lock_key):
+    # Блокировку удерживает процесс задания; если он завершен (например,
+    # задание отменено), блокировка снимается
+    while not cache.add(lock_key, os.getpid(), expire=LOCK_EXPIRE):
+        owner = cache.get(lock_key)
+        if owner is not None and not _alive(owner):
+            cache.delete(lock_key)
+            continue
+        time.sleep(0.05)
+
+def single_flight(key, compute):
+    """
+    Возвращает результат задания из общего кэша или вычисляет его.
+    Пока один процесс вычисляет результат, остальные с тем же ключом ждут.
+
+    Args:
+        key (str): Ключ задания (версия данных и ключ кэша графиков).
+        compute (callable): Вычисление результата.
+    """
+    cache = get_cache()
+    result = cache.get(('result', key))
+    if result is not None:
+        return result
+    lock_key = ('lock', key)
+    _acquire(cache, lock_key)
+    try:
+        result = cache.get(('result', key))
+        if result is None:
+            result = compute()
+            cache.set(('result', key), result, expire=RESULT_EXPIRE)
+    finally:
+        if cache.get(lock_key) == os.getpid():
+            cache.delete(lock_key)
+    return result
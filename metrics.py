@@ -0,0 +1,275 @@
+"""
+Этот модуль содержит расчет производных показателей по всем странам сразу.
+
+Строки Final_cleaned раскладываются в матрицы страна × год, и каждый
+показатель вычисляется операциями NumPy над целой матрицей, без циклов
+по странам:
+- Percent_Change_YoY — изменение процента интернет-пользователей к предыдущему
+  году, п.п.; Users_Growth_YoY — прирост числа пользователей, %;
+- Users_CAGR — среднегодовой темп роста числа пользователей за последние
+  CAGR_YEARS лет, %;
+- Global_Median_Percent и Gap_To_Median — медиана процента интернет-пользователей
+  по странам за год и отставание от нее, п.п. (в данных нет разбиения стран
+  на регионы, поэтому медиана только глобальная);
+- Internet_Gini — коэффициент Джини процента интернет-пользователей по странам
+  за год (0 — доступ одинаков, 1 — максимальный разрыв);
+- Mobile_To_Broadband_Ratio — отношение мобильных подписок к широкополосным.
+
+Как и в сводных таблицах ddl.refresh_summaries, предыдущий год — ровно
+год - 1, а агрегаты ddl.AGGREGATE_CODES не участвуют в медиане и индексе Джини.
+Результат расчета хранится по версии данных в MetricsCache.
+
+В режиме pushdown (DuckDBMetrics) те же показатели считает запрос
+к DuckDB, и только для выбранных
+стран и лет, поэтому строки всех стран в память процесса не загружаются.
+"""
+
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import connector
+from ddl import AGGREGATE_CODES
+from dtypes import optimize_frame
+from store import EntityStore
+
+# За сколько последних лет считается Users_CAGR
+CAGR_YEARS = 5
+
+# Столбцы, из которых считаются показатели
+BASE_COLUMNS = ['Internet_Users_Percent', 'No_of_Internet_Users', 'Cellular_Subscription', 'Broadband_Subscription']
+
+# Производные показатели
+METRIC_COLUMNS = ['Percent_Change_YoY', 'Users_Growth_YoY', 'Users_CAGR', 'Global_Median_Percent',
+                  'Gap_To_Median', 'Internet_Gini', 'Mobile_To_Broadband_Ratio']
+
+def panel(frame, columns):
+    """
+    Раскладывает строки в матрицы страна × год.
+
+    Args:
+        frame (pd.DataFrame): Строки со столбцами Entity, Year и columns;
+            пара (Entity, Year) уникальна.
+        columns (list): Числовые столбцы.
+
+    Returns:
+        tuple: (названия стран, годы, {столбец: матрица}); NaN там, где
+        строки или значения нет.
+    """
+    entity = pd.Categorical(frame['Entity']).remove_unused_categories()
+    years = frame['Year'].to_numpy(dtype=np.int64)
+    year_min = int(years.min()) if len(years) else 0
+    year_max = int(years.max()) if len(years) else -1
+    shape = (len(entity.categories), year_max - year_min + 1)
+    matrices = {}
+    for column in columns:
+        matrix = np.full(shape, np.nan)
+        matrix[entity.codes, years - year_min] = frame[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        matrices[column] = matrix
+    return np.asarray(entity.categories, dtype=object), np.arange(year_min, year_max + 1), matrices
+
+def _shift(matrix, periods):
+    # Значение того же показателя periods лет назад
+    shifted = np.full(matrix.shape, np.nan)
+    if periods < matrix.shape[1]:
+        shifted[:, periods:] = matrix[:, :matrix.shape[1] - periods]
+    return shifted
+
+def yoy_change(matrix):
+    """
+    Изменение к предыдущему году в единицах показателя.
+    """
+    return matrix - _shift(matrix, 1)
+
+def yoy_growth(matrix):
+    """
+    Прирост к предыдущему году, %; NaN, если прошлое значение не положительно.
+    """
+    previous = _shift(matrix, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(previous > 0, (matrix - previous) * 100.0 / previous, np.nan)
+
+def cagr(matrix, periods=CAGR_YEARS):
+    """
+    Среднегодовой темп роста за последние periods лет на каждый год, %.
+    """
+    base = _shift(matrix, periods)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where((base > 0) & (matrix >= 0), (np.power(matrix / base, 1.0 / periods) - 1) * 100, np.nan)
+
+def median_by_year(matrix, include):
+    """
+    Медиана по странам за каждый год среди строк include.
+    """
+    values = np.where(include[:, None], matrix, np.nan)
+    with warnings.catch_warnings():
+        # Год без значений дает NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmedian(values, axis=0) if values.shape[0] else np.full(matrix.shape[1], np.nan)
+
+def gini_by_year(matrix, include):
+    """
+    Коэффициент Джини по странам за каждый год среди строк include
+    (NaN, если значений меньше двух или их сумма равна нулю).
+    """
+    values = np.sort(np.where(include[:, None], matrix, np.nan), axis=0)  # NaN в конце столбца
+    counts = (~np.isnan(values)).sum(axis=0)
+    ranks = np.arange(1, values.shape[0] + 1)[:, None]
+    totals = np.nansum(values, axis=0)
+    weighted = np.nansum(values * ranks, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gini = 2 * weighted / (counts * totals) - (counts + 1) / counts
+    return np.where((counts > 1) & (totals > 0), gini, np.nan)
+
+def ratio(numerator, denominator):
+    """
+    Отношение матриц; NaN, где знаменатель не положителен.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+def compute_metrics(frame, cagr_years=CAGR_YEARS):
+    """
+    Вычисляет производные показатели для всех стран и лет.
+
+    Args:
+        frame (pd.DataFrame): Строки Final_cleaned со столбцами Entity, Code,
+            Year и BASE_COLUMNS.
+        cagr_years (int): За сколько последних лет считать Users_CAGR.
+
+    Returns:
+        pd.DataFrame: По строке на (Entity, Year) исходных данных: Entity, Code,
+        Year, BASE_COLUMNS и производные показатели, упорядочено по (Entity, Year).
+    """
+    entities, years, matrices = panel(frame, BASE_COLUMNS)
+    percent = matrices['Internet_Users_Percent']
+    users = matrices['No_of_Internet_Users']
+
+    codes = frame.groupby('Entity', observed=True, sort=True)['Code'].first()
+    include = ~pd.Series(codes.reindex(entities).astype(object)).isin(AGGREGATE_CODES).to_numpy()
+    median = median_by_year(percent, include)
+    derived = {
+        'Percent_Change_YoY': yoy_change(percent),
+        'Users_Growth_YoY': yoy_growth(users),
+        'Users_CAGR': cagr(users, cagr_years),
+        'Global_Median_Percent': np.broadcast_to(median, percent.shape),
+        'Gap_To_Median': percent - median,
+        'Internet_Gini': np.broadcast_to(gini_by_year(percent, include), percent.shape),
+        'Mobile_To_Broadband_Ratio': ratio(matrices['Cellular_Subscription'], matrices['Broadband_Subscription']),
+    }
+
+    # Значения берутся только в ячейках, для которых есть строки
+    entity_codes = pd.Categorical(frame['Entity'], categories=entities).codes
+    positions = frame['Year'].to_numpy(dtype=np.int64) - (years[0] if len(years) else 0)
+    result = frame[['Entity', 'Code', 'Year'] + BASE_COLUMNS].reset_index(drop=True)
+    for column, matrix in derived.items():
+        result[column] = matrix[entity_codes, positions]
+    return optimize_frame(result.sort_values(['Entity', 'Year'], kind='stable', ignore_index=True))
+
+def available_columns(columns):
+    """
+    Производные показатели, которые можно посчитать по столбцам источника.
+    """
+    if not {'Entity', 'Code', 'Year', *BASE_COLUMNS} <= set(columns):
+        return set()
+    return {'Entity', 'Code', 'Year', *BASE_COLUMNS, *METRIC_COLUMNS}
+
+class MetricsCache:
+    """
+    Производные показатели последней запрошенной версии данных. Показатели
+    считаются один раз на версию и хранятся в EntityStore для выборки
+    по странам и годам срезами.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._store = None
+
+    def get(self, version, load):
+        """
+        Возвращает хранилище показателей версии version, при необходимости
+        вычисляя их по строкам, которые возвращает load().
+        """
+        with self._lock:
+            if self._store is None or self._version != version:
+                self._store = EntityStore(compute_metrics(load()))
+                self._version = version
+            return self._store
+
+class DuckDBMetrics:
+    """
+    Производные показатели, которые считаются запросом к таблице DuckDB
+    при каждой выборке. Медиана и индекс Джини по странам за год
+    считаются по всей таблице, остальные показатели — только по строкам
+    выбранных стран. Интерфейс выборки тот же, что у хранилища MetricsCache.
+
+    Args:
+        table (str): Таблица со строками Final_cleaned.
+        cagr_years (int): За сколько последних лет считать Users_CAGR.
+    """
+
+    def __init__(self, table='Final_cleaned', cagr_years=CAGR_YEARS):
+        self.table = table
+        self.cagr_years = int(cagr_years)
+
+    def _query(self, columns):
+        aggregates = ', '.join(f"'{code}'" for code in AGGREGATE_CODES)
+        expressions = {
+            'Entity': 'f.Entity',
+            'Code': 'f.Code',
+            'Year': 'f.Year',
+            **{column: f'f.{column}' for column in BASE_COLUMNS},
+            'Percent_Change_YoY': 'f.Internet_Users_Percent - p.Internet_Users_Percent',
+            'Users_Growth_YoY': ('CASE WHEN p.No_of_Internet_Users > 0 THEN (f.No_of_Internet_Users - '
+                                 'p.No_of_Internet_Users) * 100.0 / p.No_of_Internet_Users END'),
+            'Users_CAGR': (f'CASE WHEN c.No_of_Internet_Users > 0 AND f.No_of_Internet_Users >= 0 THEN '
+                           f'(power(f.No_of_Internet_Users / c.No_of_Internet_Users, 1.0 / {self.cagr_years}) - 1) '
+                           f'* 100 END'),
+            'Global_Median_Percent': 'y.Median',
+            'Gap_To_Median': 'f.Internet_Users_Percent - y.Median',
+            'Internet_Gini': 'y.Gini',
+            'Mobile_To_Broadband_Ratio': ('CASE WHEN f.Broadband_Subscription > 0 '
+                                          'THEN f.Cellular_Subscription / f.Broadband_Subscription END'),
+        }
+        select = ', '.join(f'{expressions[column]} AS {column}' for column in columns)
+        # Джини по отсортированным значениям года: 2·Σ(v·r) / (n·Σv) − (n + 1) / n
+        return f"""
+        WITH ranked AS (
+            SELECT Year, Internet_Users_Percent AS v,
+                   row_number() OVER (PARTITION BY Year ORDER BY Internet_Users_Percent) AS r
+            FROM {self.table}
+            WHERE Internet_Users_Percent IS NOT NULL AND coalesce(Code, '') NOT IN ({aggregates})
+        ), yearly AS (
+            SELECT Year, median(v) AS Median,
+                   CASE WHEN count(*) > 1 AND sum(v) > 0
+                        THEN 2 * sum(v * r) / (count(*) * sum(v)) - (count(*) + 1) / count(*) END AS Gini
+            FROM ranked GROUP BY Year
+        )
+        SELECT {select}
+        FROM {self.table} f
+        LEFT JOIN {self.table} p ON p.Entity = f.Entity AND p.Year = f.Year - 1
+        LEFT JOIN {self.table} c ON c.Entity = f.Entity AND c.Year = f.Year - {self.cagr_years}
+        LEFT JOIN yearly y ON y.Year = f.Year
+        WHERE list_contains(?, f.Entity) AND f.Year BETWEEN ? AND ?
+        ORDER BY f.Entity, f.Year
+        """
+
+    def filter(self, entities, year_range, columns=None):
+        """
+        Возвращает показатели выбранных стран за диапазон лет.
+
+        Args:
+            entities (list): Названия стран.
+            year_range (list): Диапазон лет [начало, конец] включительно.
+            columns (list): Нужные столбцы помимо Entity и Year; None — все.
+
+        Returns:
+            pd.DataFrame: Entity, Year и столбцы columns, упорядочено по (Entity, Year).
+        """
+        available = ['Code', *BASE_COLUMNS, *METRIC_COLUMNS]
+        columns = available if columns is None else [c for c in columns if c in available]
+        return connector.query_arrow(self._query(['Entity', 'Year'] + columns),
+                                     [list(entities or []), int(year_range[0]), int(year_range[1])]).to_pandas()
@@ -0,0 +1,252 @@
+"""
+Этот модуль уменьшает объем графиков, которые сервер отправляет в браузер.
+
+Преобразования применяются к словарю фигуры (fig.to_dict()):
+- округление чисел с плавающей точкой в данных трасс;
+- общие для всех кадров анимации значения (например, locations) остаются
+  только в исходных трассах, кадры несут лишь меняющиеся значения;
+- длинные временные ряды прореживаются алгоритмом LTTB;
+- при повторном открытии той же вкладки можно отправить dash.Patch
+  без неизменной темы оформления.
+
+Здесь же собираются метрики объема и времени сериализации по вкладкам.
+"""
+
+import os
+import threading
+import time
+
+import flask
+import numpy as np
+from dash import Patch
+
+# Настройки по умолчанию, переопределяются переменными окружения
+FLOAT_DIGITS = int(os.environ.get('PAYLOAD_FLOAT_DIGITS', 3))
+LTTB_THRESHOLD = int(os.environ.get('PAYLOAD_LTTB_THRESHOLD', 1000))
+USE_PATCH = os.environ.get('PAYLOAD_PATCH', '0') == '1'
+
+# Поля трасс с числовыми данными
+DATA_KEYS = ('x', 'y', 'z', 'values', 'customdata', 'lat', 'lon')
+
+def _round_value(value, digits):
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'f':
+            return np.round(value.astype(np.float64), digits)
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_round_value(item, digits) for item in value]
+    if isinstance(value, float):
+        return round(value, digits)
+    return value
+
+def round_floats(figure, digits=FLOAT_DIGITS):
+    """
+    Округляет числа в данных трасс и кадров до digits знаков после запятой.
+    """
+    traces = list(figure.get('data', []))
+    for frame in figure.get('frames', []):
+        traces.extend(frame.get('data', []))
+    for trace in traces:
+        for key in DATA_KEYS:
+            if key in trace:
+                trace[key] = _round_value(trace[key], digits)
+    return figure
+
+def _same(a, b):
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        a, b = np.asarray(a), np.asarray(b)
+        return a.shape == b.shape and a.dtype.kind == b.dtype.kind and bool(np.all(a == b))
+    return a == b
+
+def align_choropleth_frames(figure):
+    """
+    Приводит кадры анимированной карты к общему списку стран.
+
+    В кадрах, где для страны нет данных за год, ее значение становится
+    пустым. После этого locations и подписи одинаковы во всех кадрах
+    и будут отправлены один раз (см. strip_shared_frame_values).
+    """
+    frames = figure.get('frames') or []
+    if not frames or any(trace.get('type') != 'choropleth' for trace in figure['data']):
+        return figure
+    for i, base in enumerate(figure['data']):
+        traces = [base] + [frame['data'][i] for frame in frames if i < len(frame['data'])]
+        locations = list(dict.fromkeys(loc for trace in traces for loc in trace.get('locations', [])))
+        # Подписи для стран, отсутствующих в кадре, берем из других кадров,
+        # чтобы они совпадали во всех кадрах
+        labels = {}
+        for trace in traces:
+            for key in ('hovertext', 'text'):
+                value = trace.get(key)
+                if value is not None and not isinstance(value, str):
+                    for loc, label in zip(trace.get('locations', []), value):
+                        labels.setdefault((key, loc), label)
+        for trace in traces:
+            position = {loc: j for j, loc in enumerate(trace.get('locations', []))}
+            index = np.array([position.get(loc, -1) for loc in locations], dtype=np.int64)
+            present = index >= 0
+            for key in ('z', 'hovertext', 'customdata', 'text'):
+                value = trace.get(key)
+                if value is None or isinstance(value, str):
+                    continue
+                value = np.asarray(value)
+                if value.dtype.kind == 'f' or key == 'z':
+                    aligned = np.full((len(locations),) + value.shape[1:], np.nan)
+                elif key in ('hovertext', 'text'):
+                    aligned = np.array([labels.get((key, loc)) for loc in locations], dtype=object)
+                else:
+                    aligned = np.full((len(locations),) + value.shape[1:], None, dtype=object)
+                aligned[present] = value[index[present]]
+                trace[key] = aligned
+            trace['locations'] = np.array(locations, dtype=object)
+    return figure
+
+def strip_shared_frame_values(figure):
+    """
+    Удаляет из кадров анимации значения, одинаковые в исходной трассе
+    и во всех кадрах: plotly.js сохраняет их при переключении кадров.
+    """
+    frames = figure.get('frames') or []
+    if not frames:
+        return figure
+    for i, base in enumerate(figure['data']):
+        traces = [frame['data'][i] for frame in frames if i < len(frame['data'])]
+        if len(traces) != len(frames):
+            continue
+        shared = [key for key in base if key != 'type'
+                  and all(key in trace and _same(trace[key], base[key]) for trace in traces)]
+        for trace in traces:
+            for key in shared:
+                del trace[key]
+    return figure
+
+def lttb(x, y, threshold):
+    """
+    Прореживает ряд алгоритмом Largest-Triangle-Three-Buckets.
+
+    Args:
+        x (np.ndarray): Значения по оси X (по возрастанию).
+        y (np.ndarray): Значения по оси Y.
+        threshold (int): Сколько точек оставить.
+
+    Returns:
+        np.ndarray: Номера сохраненных точек.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        avg_y = np.nanmean(y[next_start:next_end]) if next_end > next_start else y[-1]
+        area = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.nanargmax(area)) if np.any(~np.isnan(area)) else start
+        selected[i + 1] = previous
+    return selected
+
+def downsample_traces(figure, threshold=LTTB_THRESHOLD):
+    """
+    Прореживает линейные трассы длиннее threshold точек.
+    """
+    for trace in figure.get('data', []):
+        if trace.get('type') not in ('scatter', 'scattergl') or 'markers' in str(trace.get('mode', 'lines')):
+            continue
+        x, y = trace.get('x'), trace.get('y')
+        if x is None or y is None or len(x) <= threshold:
+            continue
+        x = np.asarray(x)
+        if x.dtype.kind not in 'iuf':
+            continue
+        keep = lttb(x, y, threshold)
+        for key in ('x', 'y', 'customdata', 'hovertext', 'text'):
+            value = trace.get(key)
+            if value is not None and not isinstance(value, str) and len(value) == len(x):
+                trace[key] = np.asarray(value)[keep]
+    return figure
+
+def compact_figure(figure):
+    """
+    Применяет все преобразования, уменьшающие объем фигуры.
+    """
+    align_choropleth_frames(figure)
+    strip_shared_frame_values(figure)
+    downsample_traces(figure)
+    round_floats(figure)
+    return figure
+
+def figure_patch(figure, description):
+    """
+    Возвращает dash.Patch для содержимого вкладки, на которой уже показан
+    график: заменяются данные, кадры и макет, кроме темы оформления.
+    """
+    patch = Patch()
+    props = patch[0]['props']['figure']
+    props['data'] = figure.get('data', [])
+    props['frames'] = figure.get('frames', [])
+    for key, value in figure.get('layout', {}).items():
+        if key != 'template':
+            props['layout'][key] = value
+    patch[1]['props']['children'] = description
+    return patch
+
+class PayloadStats:
+    """
+    Метрики объема и времени сериализации графиков по вкладкам.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tabs = {}
+
+    def expect(self, tab):
+        """
+        Отмечает, что ответ текущего HTTP-запроса несет график вкладки tab.
+        Вызывается колбэком перед возвратом графика; объем и время
+        сериализации записывает measure_response по готовому ответу Dash,
+        без повторной сериализации фигуры.
+        """
+        if flask.has_request_context():
+            flask.g.payload_tab = (tab, time.perf_counter())
+
+    def measure_response(self, response):
+        """
+        Записывает объем ответа с графиком и время от возврата графика
+        колбэком до готового ответа (after_request).
+
+        Returns:
+            tuple: (вкладка, объем в байтах, время в секундах) или None,
+            если ответ не несет графика.
+        """
+        mark = flask.g.pop('payload_tab', None)
+        if mark is None or response.direct_passthrough or response.is_streamed:
+            return None
+        tab, ready = mark
+        size, seconds = len(response.get_data()), time.perf_counter() - ready
+        self.record(tab, size, seconds)
+        return tab, size, seconds
+
+    def record(self, tab, size, serialize_seconds=None):
+        with self._lock:
+            stats = self._tabs.setdefault(tab, {
+                'responses': 0, 'bytes_total': 0, 'bytes_max': 0,
+                'serializations': 0, 'serialize_seconds_total': 0.0, 'serialize_seconds_max': 0.0,
+            })
+            stats['responses'] += 1
+            stats['bytes_total'] += size
+            stats['bytes_max'] = max(stats['bytes_max'], size)
+            if serialize_seconds is not None:
+                stats['serializations'] += 1
+                stats['serialize_seconds_total'] += serialize_seconds
+                stats['serialize_seconds_max'] = max(stats['serialize_seconds_max'], serialize_seconds)
+
+    def stats(self):
+        with self._lock:
+            return {tab: dict(stats) for tab, stats in self._tabs.items()}
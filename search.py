@@ -0,0 +1,188 @@
+"""
+Этот модуль содержит поисковый индекс стран для выпадающего списка дашборда.
+
+Индекс строится один раз на версию данных по названиям (Entity) и кодам
+(Code) стран и отвечает на запрос несколькими лучшими совпадениями,
+чтобы браузер не получал и не фильтровал весь список. Совпадения
+упорядочиваются по группам:
+1. код страны, например 'USA' или 'rus';
+2. точное название;
+3. название, начинающееся с запроса;
+4. слово названия, начинающееся с запроса ('korea' -> 'South Korea');
+5. нечеткое совпадение по триграммам (опечатки, пропущенные буквы),
+   по убыванию сходства.
+Внутри группы выше страны с более свежими данными (последний год
+с данными, затем число лет с данными), затем по названию.
+
+Регистр, диакритика и знаки препинания при сравнении не учитываются.
+Начала слов хранятся в отсортированном списке и ищутся двоичным поиском,
+лучшие совпадения среди многих выбираются частичной сортировкой
+по заранее вычисленному рангу страны.
+"""
+
+import bisect
+import threading
+import unicodedata
+
+import numpy as np
+
+# Сколько совпадений возвращает поиск по умолчанию
+DEFAULT_LIMIT = 20
+
+# Минимальное сходство по триграммам (коэффициент Жаккара) для нечеткого совпадения
+FUZZY_THRESHOLD = 0.3
+
+# С какой длины запроса выполняется нечеткий поиск
+FUZZY_MIN_LENGTH = 3
+
+def normalize(text):
+    """
+    Приводит строку к виду для сравнения: нижний регистр, без диакритики,
+    знаки препинания заменены пробелами, пробелы не повторяются.
+    """
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    letters = ''.join(char if char.isalnum() else ' ' for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(letters.casefold().split())
+
+def trigrams(key):
+    """
+    Триграммы нормализованной строки, с пробелами на границах слов.
+    """
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """
+    Поисковый индекс названий и кодов стран.
+
+    Args:
+        entities (list): Названия стран.
+        codes (list): Код каждой страны (None — кода нет); None — без кодов.
+        last_years (list): Последний год с данными каждой страны; None — не учитывать.
+        years (list): Число лет с данными каждой страны; None — не учитывать.
+    """
+
+    def __init__(self, entities, codes=None, last_years=None, years=None):
+        self.entities = np.asarray(list(entities), dtype=object)
+        n = len(self.entities)
+        last_years = np.zeros(n, dtype=np.int64) if last_years is None else np.asarray(last_years, dtype=np.int64)
+        years = np.zeros(n, dtype=np.int64) if years is None else np.asarray(years, dtype=np.int64)
+        keys = [normalize(name) for name in self.entities]
+
+        # Ранг страны: чем свежее данные, тем меньше ранг
+        order = sorted(range(n), key=lambda i: (-last_years[i], -years[i], self.entities[i]))
+        self._by_rank = np.asarray(order, dtype=np.int64)
+        self._rank = np.empty(n, dtype=np.int64)
+        self._rank[self._by_rank] = np.arange(n)
+
+        self._names = {}
+        for i, key in enumerate(keys):
+            self._names.setdefault(key, []).append(i)
+        self._codes = {}
+        for i, code in enumerate(codes if codes is not None else []):
+            if isinstance(code, str) and code:
+                self._codes.setdefault(normalize(code), []).append(i)
+
+        # Окончания названий с начала каждого слова, по алфавиту
+        tokens = []
+        for i, key in enumerate(keys):
+            words = key.split()
+            tokens.extend((' '.join(words[j:]), i, j == 0) for j in range(len(words)))
+        tokens.sort()
+        self._tokens = [token for token, _, _ in tokens]
+        self._token_owner = np.array([owner for _, owner, _ in tokens], dtype=np.int64)
+        self._token_whole = np.array([whole for _, _, whole in tokens], dtype=bool)
+        self._max_words = max((len(key.split()) for key in keys), default=1) or 1
+
+        postings = {}
+        self._gram_counts = np.zeros(n, dtype=np.int64)
+        for i, key in enumerate(keys):
+            grams = trigrams(key)
+            self._gram_counts[i] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self._trigrams = {gram: np.asarray(owners, dtype=np.int64) for gram, owners in postings.items()}
+
+    @classmethod
+    def from_summary(cls, frame):
+        """
+        Строит индекс по сводке стран хранилища (EntityStore.entity_summary).
+        """
+        return cls(frame['Entity'], frame['Code'].where(frame['Code'].notna(), None),
+                   frame['Last_Year'], frame['Years'])
+
+    def __len__(self):
+        return len(self.entities)
+
+    def _top(self, owners, limit):
+        # Страны с наименьшим рангом; одна страна может встречаться
+        # в owners не больше _max_words раз
+        ranks = self._rank[owners]
+        keep = limit * self._max_words
+        if len(ranks) > keep:
+            ranks = np.partition(ranks, keep)[:keep]
+        return self._by_rank[np.unique(ranks)[:limit]]
+
+    def _prefix(self, key):
+        lo = bisect.bisect_left(self._tokens, key)
+        hi = bisect.bisect_left(self._tokens, key + '\uffff', lo)
+        return self._token_owner[lo:hi], self._token_whole[lo:hi]
+
+    def _fuzzy(self, key, limit):
+        grams = [self._trigrams[gram] for gram in trigrams(key) if gram in self._trigrams]
+        if not grams:
+            return []
+        shared = np.bincount(np.concatenate(grams), minlength=len(self.entities))
+        candidates = np.flatnonzero(shared)
+        similarity = shared[candidates] / (len(trigrams(key)) + self._gram_counts[candidates] - shared[candidates])
+        matched = similarity >= FUZZY_THRESHOLD
+        candidates, similarity = candidates[matched], similarity[matched]
+        order = np.lexsort((self._rank[candidates], -similarity))[:limit]
+        return candidates[order]
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        Возвращает до limit названий стран, подходящих под запрос, лучшие первыми.
+        Пустой запрос возвращает страны с самыми свежими данными.
+        """
+        key = normalize(query or '')
+        if not key:
+            return list(self.entities[self._by_rank[:limit]])
+
+        found = {}
+
+        def add(owners):
+            for owner in owners:
+                if len(found) >= limit:
+                    return
+                found.setdefault(int(owner), None)
+
+        add(self._top(np.asarray(self._codes.get(key, []), dtype=np.int64), limit))
+        add(self._top(np.asarray(self._names.get(key, []), dtype=np.int64), limit))
+        owners, whole = self._prefix(key)
+        add(self._top(owners[whole], limit + len(found)))
+        add(self._top(owners[~whole], limit + len(found)))
+        if len(found) < limit and len(key) >= FUZZY_MIN_LENGTH:
+            add(self._fuzzy(key, limit + len(found)))
+        return list(self.entities[list(found)])
+
+class SearchIndexCache:
+    """
+    Поисковый индекс последней запрошенной версии данных.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = None
+
+    def get(self, version, load):
+        """
+        Возвращает индекс версии version, при необходимости строя его
+        по сводке стран, которую возвращает load().
+        """
+        with self._lock:
+            if self._index is None or self._version != version:
+                self._index = SearchIndex.from_summary(load())
+                self._version = version
+            return self._index
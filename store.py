@@ -0,0 +1,284 @@
+"""
+Этот модуль содержит хранилища данных дашборда.
+
+EntityStore держит Final_cleaned в памяти процесса: строки упорядочены
+по (страна, год), для каждой страны известен диапазон строк, поэтому
+выборка по набору стран и диапазону лет — это несколько срезов
+NumPy-массивов без полного прохода по таблице. Хранилище можно создать
+из DataFrame или из отображенного в память файла Arrow (columnar.py).
+
+DuckDBStore с тем же интерфейсом ничего не держит в памяти и передает
+фильтрацию и агрегацию в DuckDB параметризованными запросами.
+
+Средние и суммы по странам за диапазон лет EntityStore берет из индекса
+префиксных сумм (cube.py), если он построен для нужных столбцов (build_cube).
+DuckDBStore индекс не строит: его считает запрос к DuckDB.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import connector
+from cube import PrefixCube
+
+def _column_array(series):
+    # Категориальные столбцы и целые с пропусками (Int32) хранятся
+    # как массивы pandas, остальные — как массивы NumPy
+    if isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+        return series.array
+    return series.to_numpy()
+
+def _as_float(values):
+    if isinstance(values, np.ndarray):
+        return values
+    return values.to_numpy(dtype=np.float64, na_value=np.nan)
+
+class EntityStore:
+    """
+    Компактное хранилище строк Final_cleaned, отсортированных по (Entity, Year).
+
+    Args:
+        df (pd.DataFrame): Данные со столбцами Entity и Year.
+    """
+
+    def __init__(self, df):
+        entity = pd.Categorical(df['Entity']).remove_unused_categories()
+        order = np.lexsort((df['Year'].to_numpy(), entity.codes))
+        self._set_arrays(
+            np.asarray(entity.categories, dtype=object),
+            entity.codes[order],
+            df['Year'].to_numpy()[order],
+            {column: _column_array(df[column])[order] for column in df.columns if column not in ('Entity', 'Year')})
+
+    @classmethod
+    def from_arrow(cls, table):
+        """
+        Создает хранилище из таблицы Arrow в формате columnar.py без копирования
+        числовых массивов: при чтении из отображенного в память файла они
+        ссылаются на страницы файла, общие для всех процессов.
+
+        Args:
+            table (pa.Table): Строки, упорядоченные по (Entity, Year);
+                Entity — словарный столбец с отсортированным словарем.
+        """
+        store = cls.__new__(cls)
+        table = table.combine_chunks()
+        entity = table['Entity'].chunks[0] if table.num_rows else table['Entity'].combine_chunks()
+        codes = entity.indices.to_numpy(zero_copy_only=False)
+        if np.any(np.diff(codes) < 0):
+            raise ValueError("Rows must be ordered by Entity with a sorted Entity dictionary")
+        columns = {}
+        for column in table.column_names:
+            if column in ('Entity', 'Year'):
+                continue
+            array = table[column].chunks[0] if table.num_rows else table[column].combine_chunks()
+            if isinstance(array, pa.DictionaryArray):
+                columns[column] = pd.Categorical.from_codes(
+                    array.indices.to_numpy(zero_copy_only=False), array.dictionary.to_pylist())
+            else:
+                columns[column] = array.to_numpy(zero_copy_only=False)
+        store._set_arrays(
+            np.asarray(entity.dictionary.to_pylist(), dtype=object),
+            codes,
+            table['Year'].combine_chunks().to_numpy(zero_copy_only=False),
+            columns)
+        return store
+
+    def _set_arrays(self, entities, codes, years, columns):
+        self.entities = entities
+        self._entity_index = {name: i for i, name in enumerate(self.entities)}
+        # offsets[i]:offsets[i + 1] — строки страны с кодом i
+        self.offsets = np.searchsorted(codes, np.arange(len(self.entities) + 1))
+        self.years = years
+        self.year_min = int(self.years.min()) if len(self.years) else 0
+        self.year_max = int(self.years.max()) if len(self.years) else 0
+        self._entity_codes = codes
+        self.columns = columns
+        self.cube = None
+
+    def __len__(self):
+        return len(self.years)
+
+    @property
+    def nbytes(self):
+        arrays = [self.years, self._entity_codes, self.offsets] + list(self.columns.values())
+        return sum(array.nbytes for array in arrays) + (self.cube.nbytes if self.cube is not None else 0)
+
+    @property
+    def column_names(self):
+        return {'Entity', 'Year', *self.columns}
+
+    def entity_names(self):
+        return list(self.entities)
+
+    def entity_summary(self):
+        """
+        Возвращает по строке на страну со строками: Entity, Code, Last_Year —
+        последний год с данными и Years — число лет с данными.
+        """
+        counts = np.diff(self.offsets)
+        present = counts > 0
+        first = self.offsets[:-1][present]
+        code = self.columns.get('Code')
+        return pd.DataFrame({
+            'Entity': self.entities[present],
+            'Code': np.asarray(code[first], dtype=object) if code is not None else None,
+            'Last_Year': self.years[first + counts[present] - 1].astype(np.int64),
+            'Years': counts[present],
+        })
+
+    def row_indices(self, entities, year_range):
+        """
+        Возвращает номера строк для выбранных стран и диапазона лет.
+
+        Args:
+            entities (list): Названия стран; неизвестные названия пропускаются.
+            year_range (list): Диапазон лет [начало, конец] включительно.
+
+        Returns:
+            np.ndarray: Номера строк, упорядоченные по стране и году.
+        """
+        ranges = []
+        for name in dict.fromkeys(entities or []):
+            code = self._entity_index.get(name)
+            if code is None:
+                continue
+            start, end = self.offsets[code], self.offsets[code + 1]
+            years = self.years[start:end]
+            lo = start + np.searchsorted(years, year_range[0], side='left')
+            hi = start + np.searchsorted(years, year_range[1], side='right')
+            if hi > lo:
+                ranges.append(np.arange(lo, hi))
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(ranges)
+
+    def filter(self, entities, year_range, columns=None):
+        """
+        Возвращает строки выбранных стран за диапазон лет.
+
+        Args:
+            entities (list): Названия стран.
+            year_range (list): Диапазон лет [начало, конец] включительно.
+            columns (list): Нужные столбцы помимо Entity и Year; None — все.
+
+        Returns:
+            pd.DataFrame: Отфильтрованные данные.
+        """
+        idx = self.row_indices(entities, year_range)
+        data = {
+            'Entity': self.entities[self._entity_codes[idx]],
+            'Year': self.years[idx],
+        }
+        for column in (self.columns if columns is None else columns):
+            if column not in ('Entity', 'Year'):
+                data[column] = self.columns[column][idx]
+        return pd.DataFrame(data)
+
+    def mean(self, entities, year_range, columns):
+        """
+        Возвращает средние значения столбцов по выбранным строкам.
+
+        Returns:
+            dict: Столбец -> среднее (NaN, если строк нет).
+        """
+        if self.cube is not None and self.cube.covers(columns):
+            return self.cube.mean(entities, year_range, columns)
+        idx = self.row_indices(entities, year_range)
+        return {column: float(np.nanmean(_as_float(self.columns[column][idx]))) if len(idx) else float('nan')
+                for column in columns}
+
+    def build_cube(self, columns):
+        """
+        Строит индекс префиксных сумм (cube.py) для числовых столбцов,
+        после чего mean и aggregate по ним не обращаются к строкам.
+
+        Returns:
+            PrefixCube: Построенный индекс.
+        """
+        self.cube = PrefixCube(self.entities, self._entity_codes, self.years,
+                               {column: _as_float(self.columns[column]) for column in columns},
+                               self.year_min, self.year_max)
+        return self.cube
+
+    def aggregate(self, entities, year_range, aggregations):
+        """
+        Агрегирует столбцы по странам за диапазон лет.
+
+        Args:
+            aggregations (dict): Столбец -> 'sum' или 'mean'.
+
+        Returns:
+            pd.DataFrame: По строке на страну: Entity и агрегированные столбцы.
+        """
+        if self.cube is not None and self.cube.covers(aggregations):
+            return self.cube.aggregate(entities, year_range, aggregations)
+        return self.filter(entities, year_range, list(aggregations)).groupby(
+            'Entity', sort=True, as_index=False).agg(aggregations)
+
+class DuckDBStore:
+    """
+    Хранилище с тем же интерфейсом, что у EntityStore, выполняющее
+    фильтрацию и агрегацию запросами к таблице DuckDB.
+
+    Args:
+        table (str): Таблица с данными.
+    """
+
+    def __init__(self, table='Final_cleaned'):
+        self.table = table
+        bounds = connector.query_df(f"SELECT min(Year) AS lo, max(Year) AS hi, count(*) AS n FROM {table}")
+        self.year_min = int(bounds['lo'].iloc[0])
+        self.year_max = int(bounds['hi'].iloc[0])
+        self._rows = int(bounds['n'].iloc[0])
+        columns = connector.query_df(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = ? ORDER BY ordinal_position",
+            [table])
+        self._columns = [column for column in columns['column_name'] if column not in ('Entity', 'Year')]
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def nbytes(self):
+        return 0
+
+    @property
+    def column_names(self):
+        return {'Entity', 'Year', *self._columns}
+
+    def entity_names(self):
+        return list(connector.query_df(f"SELECT DISTINCT Entity FROM {self.table} ORDER BY Entity")['Entity'])
+
+    def entity_summary(self):
+        code = 'min(Code)' if 'Code' in self._columns else 'NULL'
+        return connector.query_df(
+            f"SELECT Entity, {code} AS Code, max(Year) AS Last_Year, count(*) AS Years "
+            f"FROM {self.table} GROUP BY Entity ORDER BY Entity")
+
+    @staticmethod
+    def _where(entities, year_range):
+        return ("list_contains(?, Entity) AND Year BETWEEN ? AND ?",
+                [list(entities or []), int(year_range[0]), int(year_range[1])])
+
+    def filter(self, entities, year_range, columns=None):
+        columns = self._columns if columns is None else [c for c in columns if c not in ('Entity', 'Year')]
+        where, params = self._where(entities, year_range)
+        select = ', '.join(['Entity', 'Year'] + columns)
+        return connector.query_arrow(
+            f"SELECT {select} FROM {self.table} WHERE {where} ORDER BY Entity, Year", params).to_pandas()
+
+    def mean(self, entities, year_range, columns):
+        where, params = self._where(entities, year_range)
+        select = ', '.join(f"avg({column}) AS {column}" for column in columns)
+        row = connector.query_df(f"SELECT {select} FROM {self.table} WHERE {where}", params).iloc[0]
+        return {column: float(row[column]) if pd.notna(row[column]) else float('nan') for column in columns}
+
+    def aggregate(self, entities, year_range, aggregations):
+        where, params = self._where(entities, year_range)
+        functions = {'sum': 'sum', 'mean': 'avg'}
+        select = ', '.join(f"{functions[how]}({column}) AS {column}" for column, how in aggregations.items())
+        return connector.query_arrow(
+            f"SELECT Entity, {select} FROM {self.table} WHERE {where} GROUP BY Entity ORDER BY Entity",
+            params).to_pandas()
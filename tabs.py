@@ -0,0 +1,140 @@
+"""
+Этот модуль содержит реестр вкладок дашборда.
+
+Каждая вкладка объявляет, из какого источника и какие столбцы ей нужны,
+и ссылается на функцию построения графика строкой "модуль:функция".
+Модуль с функцией импортируется при первом открытии вкладки. Вкладки,
+для которых в данных нет нужных столбцов, выявляются при запуске.
+"""
+
+import importlib
+import logging
+
+class TabSpec:
+    """
+    Описание вкладки дашборда.
+
+    Args:
+        tab_id (str): Идентификатор пункта меню, например 'tab-1'.
+        title (str): Название вкладки в меню.
+        builder (str): Функция построения графика в виде "модуль:функция".
+            Функция принимает DataFrame и возвращает plotly.graph_objs.Figure.
+        columns (list): Нужные столбцы помимо Entity и Year.
+        description (str): Пояснение под графиком.
+        source (str): 'store' — данные Final_cleaned из хранилища дашборда,
+            'metrics' — производные показатели (metrics.py), иначе имя
+            сводной таблицы DuckDB.
+        aggregate (dict): Столбец -> 'sum' или 'mean': вкладке нужны не строки,
+            а агрегаты по странам за диапазон лет (только для source='store').
+        heavy (bool): График строится долго; при большой выборке вкладка
+            строится фоновым колбэком (см. jobs.py).
+    """
+
+    def __init__(self, tab_id, title, builder, columns, description, source='store', aggregate=None, heavy=False):
+        self.tab_id = tab_id
+        self.title = title
+        self.builder_path = builder
+        self.columns = list(columns)
+        self.description = description
+        self.source = source
+        self.aggregate = aggregate
+        self.heavy = heavy
+        self.missing_columns = []
+        self._builder = None
+
+    @property
+    def available(self):
+        return not self.missing_columns
+
+    def build(self, data):
+        """
+        Строит график вкладки, импортируя функцию построения при первом вызове.
+        """
+        if self._builder is None:
+            module_name, function_name = self.builder_path.split(':')
+            self._builder = getattr(importlib.import_module(module_name), function_name)
+        return self._builder(data)
+
+TABS = {}
+
+def register_tab(spec):
+    """
+    Добавляет вкладку в реестр.
+    """
+    TABS[spec.tab_id] = spec
+    return spec
+
+def get_tab(tab_id):
+    """
+    Возвращает описание вкладки по идентификатору.
+    """
+    return TABS[tab_id]
+
+def validate_tabs(columns_by_source):
+    """
+    Отмечает вкладки, для которых в источнике нет нужных столбцов.
+
+    Args:
+        columns_by_source (dict): Источник -> множество доступных столбцов.
+
+    Returns:
+        list: Недоступные вкладки.
+    """
+    unavailable = []
+    for spec in TABS.values():
+        available = columns_by_source.get(spec.source, set())
+        spec.missing_columns = [column for column in ['Entity', 'Year'] + spec.columns if column not in available]
+        if spec.missing_columns:
+            logging.warning(f"Tab '{spec.tab_id}' is disabled: missing columns {', '.join(spec.missing_columns)}")
+            unavailable.append(spec)
+    return unavailable
+
+register_tab(TabSpec(
+    'tab-1', "Географическое распределение пользователей интернета", 'figures:internet_map',
+    ['Internet_Users_Percent'],
+    "Визуализация плотности интернет-пользователей по странам.",
+    heavy=True))
+register_tab(TabSpec(
+    'tab-2', "Сравнение городского и сельского населения", 'figures:urban_rate',
+    ['Urban_Rate'],
+    "Столбчатая диаграмма, показывающая интернет-проникновение в городских и сельских районах."))
+register_tab(TabSpec(
+    'tab-3', "Сравнение скорости интернета", 'figures:internet_speed',
+    ['Avg_Speed_Mbps'],
+    "Линейный график, показывающий среднюю скорость интернета в разных странах."))
+register_tab(TabSpec(
+    'tab-4', "Анализ затрат на интернет", 'figures:internet_price',
+    ['Avg_Price_1GB'],
+    "Столбчатая диаграмма, показывающая среднюю стоимость 1 ГБ интернета в разных странах."))
+register_tab(TabSpec(
+    'tab-5', "Цифровой разрыв", 'figures:digital_divide',
+    ['Internet_Users_Percent', 'Global_Median_Percent', 'Gap_To_Median', 'Internet_Gini'],
+    "Отставание выбранных стран от медианы процента интернет-пользователей по всем странам за год, п.п. "
+    "В подсказке — коэффициент Джини по странам за год.",
+    source='metrics'))
+register_tab(TabSpec(
+    'tab-6', "Темпы роста интернет-проникновения", 'figures:internet_growth',
+    ['Internet_Users_Percent', 'Percent_Change_YoY', 'Users_Growth_YoY', 'Users_CAGR'],
+    "Изменение процента интернет-пользователей к предыдущему году, п.п. "
+    "В подсказке — прирост числа пользователей и среднегодовой темп роста за пять лет.",
+    source='metrics'))
+register_tab(TabSpec(
+    'tab-7', "Сравнение мобильной связи и ШПД", 'figures:mobile_vs_broadband',
+    ['Cellular_Subscription', 'Broadband_Subscription', 'Mobile_To_Broadband_Ratio'],
+    "Сравнение распространения мобильной связи и широкополосного интернета в выбранных странах. Линия для ШПД сделана пунктирной.",
+    source='metrics'))
+register_tab(TabSpec(
+    'tab-8', "Телекоммуникационные тренды", 'figures:telecom_trends',
+    ['Broadband_Subscription'],
+    "Общие тенденции в телекоммуникационном секторе для выбранных стран.",
+    source='mobile_vs_broadband'))
+register_tab(TabSpec(
+    'tab-9', "Рост пользователей интернета по годам", 'figures:internet_users_by_year',
+    ['Internet_Users_Percent'],
+    "Гистограмма, отображающая рост числа интернет-пользователей по годам.",
+    heavy=True))
+register_tab(TabSpec(
+    'tab-10', "Сравнение мобильной связи и ШПД по странам", 'figures:mobile_share',
+    ['Cellular_Subscription'],
+    "Круговая диаграмма, показывающая соотношение мобильной связи и широкополосного доступа по странам.",
+    aggregate={'Cellular_Subscription': 'sum'}))
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cube import PrefixCube
+
+COLUMNS = ['Internet_Users_Percent', 'Cellular_Subscription']
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    entities = [f'Country {i}' for i in range(12)]
+    rows = [(entity, year) for entity in entities for year in range(1990, 2021) if rng.random() > 0.2]
+    frame = pd.DataFrame(rows, columns=['Entity', 'Year'])
+    for column in COLUMNS:
+        values = rng.uniform(0, 150, len(frame))
+        values[rng.random(len(frame)) < 0.3] = np.nan
+        frame[column] = values
+    return frame
+
+@pytest.fixture
+def cube(frame):
+    entities = sorted(frame['Entity'].unique())
+    codes = frame['Entity'].map({name: i for i, name in enumerate(entities)}).to_numpy()
+    return PrefixCube(entities, codes, frame['Year'].to_numpy(),
+                      {column: frame[column].to_numpy() for column in COLUMNS},
+                      frame['Year'].min(), frame['Year'].max())
+
+def masked(frame, entities, year_range):
+    mask = frame['Entity'].isin(entities) & frame['Year'].between(*year_range)
+    return frame[mask]
+
+@pytest.mark.parametrize('year_range', [(1990, 2020), (2000, 2005), (2013, 2013), (1980, 1995), (2018, 2030)])
+def test_mean_matches_pandas(frame, cube, year_range):
+    entities = ['Country 1', 'Country 4', 'Country 7', 'Country 4', 'Missing']
+    expected = masked(frame, entities, year_range)[COLUMNS].mean()
+    result = cube.mean(entities, year_range, COLUMNS)
+    for column in COLUMNS:
+        assert result[column] == pytest.approx(expected[column], nan_ok=True)
+
+def test_empty_selection_mean_is_nan(cube):
+    result = cube.mean([], (1990, 2020), COLUMNS)
+    assert all(np.isnan(value) for value in result.values())
+
+@pytest.mark.parametrize('year_range', [(1990, 2020), (2001, 2009), (2015, 2015)])
+def test_aggregate_matches_pandas_groupby(frame, cube, year_range):
+    entities = [f'Country {i}' for i in (0, 2, 3, 5, 8, 11)]
+    expected = (masked(frame, entities, year_range)
+                .groupby('Entity', sort=True)
+                .agg({COLUMNS[0]: 'sum', COLUMNS[1]: 'mean'})
+                .reset_index())
+    result = cube.aggregate(entities, year_range, {COLUMNS[0]: 'sum', COLUMNS[1]: 'mean'})
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+def test_aggregate_rejects_unknown_function(cube):
+    with pytest.raises(ValueError):
+        cube.aggregate(['Country 0'], (1990, 2020), {COLUMNS[0]: 'median'})
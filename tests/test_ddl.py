@@ -0,0 +1,99 @@
+import duckdb
+import pytest
+
+import ddl
+
+HEADER = 'Entity,Code,Year,Cellular Subscription,Internet Users(%),No. of Internet Users,Broadband Subscription\n'
+
+BASE_ROWS = [
+    'Albania,ALB,2010,90,45,1300000,4',
+    'Albania,ALB,2011,95,49,1400000,5',
+    'Brazil,BRA,2010,100,40,78000000,7',
+    'Brazil,BRA,2011,119,45,88000000,9',
+    'Chad,TCD,2010,24,1.7,200000,0.01',
+    'Chad,TCD,2011,31,2.3,270000,0.02',
+]
+
+def write_csv(path, rows):
+    path.write_text(HEADER + ''.join(row + '\n' for row in rows))
+    return str(path)
+
+def fetch(db_path, sql):
+    conn = duckdb.connect(db_path, read_only=True)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'test.db')
+    ddl.create_tables(path)
+    return path
+
+@pytest.fixture
+def loaded_db(tmp_path, db_path):
+    ddl.load_incremental(write_csv(tmp_path / 'base.csv', BASE_ROWS), db_path)
+    return db_path
+
+def test_partial_delta_only_touches_its_keys(tmp_path, loaded_db):
+    delta = write_csv(tmp_path / 'delta.csv', [
+        'Albania,ALB,2010,90,47,1300000,4',
+        'Albania,ALB,2012,98,54,1500000,6',
+    ])
+    report = ddl.load_incremental(delta, loaded_db)
+
+    assert (report['inserted'], report['updated'], report['deleted']) == (1, 1, 0)
+    assert fetch(loaded_db, "SELECT count(*) FROM Final_cleaned") == [(7,)]
+    assert fetch(loaded_db, "SELECT count(*) FROM Final_cleaned WHERE Year = 2010") == [(3,)]
+    assert fetch(loaded_db, "SELECT Internet_Users_Percent FROM Final_cleaned "
+                            "WHERE Entity = 'Albania' AND Year = 2010") == [(47.0,)]
+
+def test_sync_deletes_rows_missing_from_the_file_years(tmp_path, loaded_db):
+    delta = write_csv(tmp_path / 'delta.csv', [
+        'Albania,ALB,2010,90,47,1300000,4',
+    ])
+    report = ddl.load_incremental(delta, loaded_db, sync=True)
+
+    assert report['deleted'] == 2
+    assert fetch(loaded_db, "SELECT Entity FROM Final_cleaned WHERE Year = 2010") == [('Albania',)]
+    assert fetch(loaded_db, "SELECT count(*) FROM Final_cleaned WHERE Year = 2011") == [(3,)]
+
+def test_unchanged_file_is_skipped_until_another_file_overwrites_it(tmp_path, loaded_db):
+    base = str(tmp_path / 'base.csv')
+    assert ddl.load_incremental(base, loaded_db)['skipped']
+
+    other = write_csv(tmp_path / 'other.csv', ['Chad,TCD,2011,31,9.9,270000,0.02'])
+    ddl.load_incremental(other, loaded_db)
+    report = ddl.load_incremental(base, loaded_db)
+
+    assert not report['skipped']
+    assert fetch(loaded_db, "SELECT Internet_Users_Percent FROM Final_cleaned "
+                            "WHERE Entity = 'Chad' AND Year = 2011") == [(pytest.approx(2.3),)]
+
+def test_stage_source_cells(tmp_path, db_path):
+    source = write_csv(tmp_path / 'cells.csv', [
+        'Albania,ALB,2010,90,45,,4',
+        'Brazil,BRA,2010,,40,78000000,',
+        'Chad,TCD,2010.0,24,1.7,200000,0.01',
+        'Denmark,DNK,2010.6,120,88,5000000,38',
+        'Egypt,EGY,2010,abc,21,17000000,2',
+        'Fiji,FJI,2010,90,30,99999999999,1',
+        ',XXX,2010,1,1,1,1',
+    ])
+    report = ddl.load_data(source, db_path)
+
+    assert report['loaded'] == 4
+    reasons = dict(zip(report['rejected_rows']['Entity'].fillna(''), report['rejected_rows']['reject_reason']))
+    assert reasons == {
+        'Denmark': 'Year: 2010.6',
+        'Egypt': 'Cellular_Subscription: abc',
+        '': 'Entity: пустое значение',
+    }
+    rows = dict((row[0], row[1:]) for row in fetch(
+        db_path, "SELECT Entity, Year, Cellular_Subscription, No_of_Internet_Users, Broadband_Subscription "
+                 "FROM Final_cleaned"))
+    assert rows['Albania'][2] is None
+    assert rows['Brazil'][1] is None and rows['Brazil'][3] is None
+    assert rows['Chad'][0] == 2010
+    assert rows['Fiji'][2] == ddl.MAX_INTERNET_USERS
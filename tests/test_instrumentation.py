@@ -0,0 +1,36 @@
+import pytest
+
+import instrumentation
+from instrumentation import Registry, callback_label, set_callback_outputs
+
+def test_histogram_and_counter_render():
+    registry = Registry()
+    registry.histogram('t_seconds', 'Время', buckets=(0.1, 1))
+    registry.counter('t_total', 'Счетчик')
+    registry.observe('t_seconds', 0.05, tab='a"b')
+    registry.observe('t_seconds', 0.5, tab='a"b')
+    registry.inc('t_total')
+    registry.inc('t_total', 2)
+    registry.register_collector(lambda: [('t_gauge', 'gauge', 'Показатель', [({'kind': 'x'}, 3)])])
+
+    lines = registry.render().splitlines()
+    assert '# TYPE t_seconds histogram' in lines
+    assert 't_seconds_bucket{tab="a\\"b",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{tab="a\\"b",le="1.0"} 2' in lines
+    assert 't_seconds_bucket{tab="a\\"b",le="+Inf"} 2' in lines
+    assert 't_seconds_count{tab="a\\"b"} 2' in lines
+    assert 't_total 3' in lines
+    assert 't_gauge{kind="x"} 3' in lines
+
+@pytest.fixture
+def callback_outputs():
+    previous = instrumentation._callback_outputs
+    set_callback_outputs({'tab-content.children': None, '..graph.figure...table.data..': None})
+    yield
+    set_callback_outputs(previous)
+
+def test_callback_label_only_for_registered_outputs(callback_outputs):
+    assert callback_label('tab-content.children') == 'tab-content.children'
+    assert callback_label('..graph.figure...table.data..') == 'graph.figure'
+    assert callback_label('attacker-chosen.children') == 'unknown'
+    assert callback_label(None) == 'unknown'
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from search import SearchIndex, SearchIndexCache, normalize
+
+ENTITIES = ['United States', 'United Kingdom', 'South Korea', 'North Korea', 'Germany',
+            'Curaçao', 'Russia', 'Usbekistan', 'World']
+CODES = ['USA', 'GBR', 'KOR', 'PRK', 'DEU', 'CUW', 'RUS', None, None]
+LAST_YEARS = [2020, 2020, 2020, 2017, 2020, 2015, 2020, 2020, 2020]
+YEARS = [31, 31, 31, 20, 31, 10, 31, 25, 31]
+
+def make_index():
+    return SearchIndex(ENTITIES, CODES, LAST_YEARS, YEARS)
+
+def test_normalize_ignores_case_and_diacritics():
+    assert normalize('  Curaçao ') == normalize('CURACAO')
+
+def test_code_match_comes_first():
+    assert make_index().search('usa')[0] == 'United States'
+    assert make_index().search('rus') == ['Russia']
+
+def test_prefix_before_word_prefix_ranked_by_recency():
+    result = make_index().search('u')
+    # Названия, начинающиеся с запроса, выше совпадений по началу слова
+    assert result[:3] == ['United Kingdom', 'United States', 'Usbekistan']
+
+def test_word_prefix_ranked_by_recency():
+    assert make_index().search('korea') == ['South Korea', 'North Korea']
+
+def test_exact_name_before_prefix():
+    index = SearchIndex(['Niger', 'Nigeria'], last_years=[2000, 2020])
+    assert index.search('niger') == ['Niger', 'Nigeria']
+
+def test_fuzzy_match_for_typos():
+    assert make_index().search('germny')[0] == 'Germany'
+    assert make_index().search('curacao') == ['Curaçao']
+    assert make_index().search('zz') == []
+
+def test_empty_query_returns_most_recent_and_respects_limit():
+    result = make_index().search('', limit=3)
+    assert result == ['Germany', 'Russia', 'South Korea']
+    assert len(make_index().search('', limit=100)) == len(ENTITIES)
+
+def test_cache_rebuilds_only_on_new_version():
+    cache = SearchIndexCache()
+    calls = []
+
+    def load():
+        calls.append(1)
+        return pd.DataFrame({'Entity': ENTITIES, 'Code': CODES, 'Last_Year': LAST_YEARS, 'Years': YEARS})
+
+    first = cache.get(1, load)
+    assert cache.get(1, load) is first
+    assert cache.get(2, load) is not first
+    assert len(calls) == 2
+    assert first.search('usa')[0] == 'United States'